@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+# Compare the cost of ARS430Event (RadarDetection[] DetectionList) with ARS430EventColumns (one
+# array per detection field) at realistic detection counts: building the message from an EventFrame,
+# serializing it, and deserializing it as a plain message and as a numpy_msg.
+# Needs the generated ars430 messages, i.e. a built ROS workspace:
+#   rosrun ars430 event_msgs.py   or   python bench/event_msgs.py [repeats]
+
+###########
+# Imports #
+###########
+import sys
+import timeit
+from io import BytesIO
+
+import roslib; roslib.load_manifest('ars430')
+from rospy.numpy_msg import numpy_msg
+from ars430.msg import ARS430Event, ARS430EventColumns, RadarDetection
+
+import numpy as np
+import ars430_codec
+
+# One event packet holds up to 38 detections; DetInPack (uint8) limits an event to 255
+DETECTION_COUNTS = (1, 8, 38, 128, 255)
+ITERATIONS = 200
+
+FLOAT_COLUMNS = tuple(name for name in ars430_codec.DETECTION_FIELDS if name not in ars430_codec.PDH0_FLAG_FIELDS)
+ARS430EventColumnsNumpy = numpy_msg(ARS430EventColumns)
+
+# An EventFrame with n random detections
+def make_frame(n):
+    frame = ars430_codec.EventFrame()
+    frame.EventType = ars430_codec.Headers.NEAR0.value
+    frame.NofDet = frame.DetInPack = n
+    frame.sourceIP = '192.168.1.2'
+    rng = np.random.RandomState(n)
+    detections = np.zeros(n, dtype=ars430_codec.DETECTION_DTYPE)
+    for name in FLOAT_COLUMNS:
+        detections[name] = rng.uniform(0, 100, n)
+    for name in ars430_codec.PDH0_FLAG_FIELDS:
+        detections[name] = rng.randint(0, 2, n)
+    frame.DetectionList = detections
+    return frame
+
+# Same conversion as ARS430Publisher.ToEventMsg in scripts/ars430.py
+def to_event_msg(frame):
+    msg = ARS430Event()
+    for name in ars430_codec.EventFrame.__slots__:
+        if name != 'DetectionList':
+            setattr(msg, name, getattr(frame, name))
+    msg.DetectionList = [RadarDetection(*row) for row in frame.DetectionList.tolist()]
+    return msg
+
+# Same conversion as ARS430Publisher.ToEventColumnsMsg in scripts/ars430.py
+def to_columns_msg(frame):
+    msg = ARS430EventColumnsNumpy()
+    for name in ars430_codec.EventFrame.__slots__:
+        if name != 'DetectionList':
+            setattr(msg, name, getattr(frame, name))
+    detections = frame.DetectionList
+    for name in FLOAT_COLUMNS:
+        setattr(msg, name, detections[name])
+    for name in ars430_codec.PDH0_FLAG_FIELDS:
+        setattr(msg, name, detections[name].tobytes())
+    return msg
+
+def serialize(msg):
+    buff = BytesIO()
+    msg.serialize(buff)
+    return buff.getvalue()
+
+# Best time of a few repeats, in microseconds per call
+def best_us(func, repeats):
+    return min(timeit.repeat(func, number=ITERATIONS, repeat=repeats)) / ITERATIONS * 1e6
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    row = '%6s %-8s %10s %10s %12s %12s %8s'
+    print(row % ('dets', 'msg', 'build us', 'ser us', 'deser us', 'np deser us', 'bytes'))
+    for n in DETECTION_COUNTS:
+        frame = make_frame(n)
+
+        listMsg = to_event_msg(frame)
+        listData = serialize(listMsg)
+        print(row % (n, 'list',
+                     '%.1f' % best_us(lambda: to_event_msg(frame), repeats),
+                     '%.1f' % best_us(lambda: serialize(listMsg), repeats),
+                     '%.1f' % best_us(lambda: ARS430Event().deserialize(listData), repeats),
+                     '-', len(listData)))
+
+        columnsMsg = to_columns_msg(frame)
+        columnsData = serialize(columnsMsg)
+        # Both forms carry the same detections
+        assert ARS430EventColumnsNumpy().deserialize(columnsData).Range.tolist() == \
+            [d.Range for d in ARS430Event().deserialize(listData).DetectionList]
+        print(row % (n, 'columns',
+                     '%.1f' % best_us(lambda: to_columns_msg(frame), repeats),
+                     '%.1f' % best_us(lambda: serialize(columnsMsg), repeats),
+                     '%.1f' % best_us(lambda: ARS430EventColumns().deserialize(columnsData), repeats),
+                     '%.1f' % best_us(lambda: ARS430EventColumnsNumpy().deserialize(columnsData), repeats),
+                     len(columnsData)))
+
+if __name__ == '__main__':
+    main()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+
+# Microbenchmarks of the decode and assembly hot paths of the ars430 node, run against canned
+# datagrams from ars430_codec.synth with a fixed seed, so every run decodes the same bytes.
+# Every benchmark is timed with timeit, and its best time per call (in microseconds) is kept.
+# Results can be saved as JSON and compared with the results of another commit:
+#   python bench/micro.py --save before.json
+#   (change the code)
+#   python bench/micro.py --compare before.json --threshold 0.10
+# With --compare, the script exits with status 1 if a benchmark got more than --threshold
+# (a fraction) slower, so it can gate a change. Before timing anything, it checks that the batch
+# decode of every event gives the same bytes as the scalar decode. Does not need ROS.
+
+###########
+# Imports #
+###########
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import numpy as np
+import ars430_codec
+from ars430_codec import codec
+from ars430_codec.synth import RadarSimulator, MAX_DETECTIONS_PER_PACKET
+
+# Seed of the canned datagrams
+SEED = 430
+# Detections per event packet for the UnpackEvent benchmarks
+DETECTION_COUNTS = (0, 1, 8, 20, MAX_DETECTIONS_PER_PACKET)
+# Default fraction by which a benchmark may get slower before --compare fails
+THRESHOLD = 0.10
+# Scans assembled per call of the collect benchmarks
+SCANS = 20
+
+# The first event datagram of a scan of a simulator whose NEAR scans have n detections
+def event_datagram(n):
+    return RadarSimulator(n, 0, seed = SEED).scan(0.0)[0]
+
+# The datagrams of SCANS full scans (NEAR0-2, FAR0-1) of one radar
+def scan_datagrams(nearDetections = 100, farDetections = 60):
+    simulator = RadarSimulator(nearDetections, farDetections, seed = SEED)
+    datagrams = []
+    for i in range(SCANS):
+        datagrams += simulator.scan(i * simulator.cycleTime)
+    return datagrams
+
+# Add decoded packets to a new assembler, as handle_datagram in scripts/ars430.py does. The
+# packets are decoded beforehand, so only the assembly is timed.
+def collect_bench(assemblerClass, packets):
+    def run():
+        assembler = assemblerClass()
+        for packet in packets:
+            assembler.add(packet, 0.0)
+    return run
+
+# Return a function which filters the detections of frame with the rules of every kind
+def filter_bench(frame):
+    detectionFilter = ars430_codec.DetectionFilter({
+        'reject_flags': ['FalseDetectionFromSidelobe', 'ClusterNotLocalMax'], 'min_snr': 12.0,
+        'min_rcs': -5.0, 'max_azimuth_variance': 0.02, 'min_azimuth_probability': 0.3})
+    detections = frame.DetectionList
+    def run():
+        frame.DetectionList = detections
+        detectionFilter.apply(frame)
+    return run
+
+# Return a function which fuses two clouds (a NEAR and a FAR scan) of each of the given number of
+# radars into one cloud
+def fusion_bench(frame, radars):
+    points = ars430_codec.CloudArray(frame)
+    transforms = dict((k, ars430_codec.MountTransform(k, 0.0, 0.5, 0.0, 0.0, 0.5 * k)) for k in range(radars))
+    fusion = ars430_codec.FrameFusion(transforms)
+    def run():
+        for k in range(radars):
+            fusion.add(k, points, 0.0)
+            fusion.add(k, points, 0.0)
+        fusion.flush()
+    return run
+
+# Return a function which updates a tracker with the next of a series of frames of n detections: a
+# tenth of them are targets moving at constant velocity, the rest clutter. The tracker is run over
+# the series once first, so it holds as many tracks as it does in steady state.
+def tracker_bench(n, frames = 20):
+    rng = np.random.RandomState(SEED)
+    targets = n // 10
+    start = rng.uniform([5.0, -40.0], [150.0, 40.0], (targets, 2))
+    velocity = rng.uniform(-15.0, 15.0, (targets, 2))
+    series = []
+    for k in range(frames):
+        positions = np.vstack((start + velocity * k * 0.06 + rng.normal(0.0, 0.3, (targets, 2)),
+                               rng.uniform([0.5, -100.0], [250.0, 100.0], (n - targets, 2))))
+        series.append((positions, np.zeros_like(positions)))
+    tracker = ars430_codec.MultiTargetTracker()
+    for positions, velocities in series:
+        tracker.update(positions, velocities, 0.06)
+    state = {'k': 0}
+    def run():
+        positions, velocities = series[state['k'] % frames]
+        state['k'] += 1
+        tracker.update(positions, velocities, 0.06)
+    return run
+
+# Clustering a NEAR frame of n detections: a tenth of them are targets of 5 detections each,
+# spread like the reflections of a car, and the rest is clutter
+def cluster_bench(n):
+    rng = np.random.RandomState(SEED)
+    targets = n // 50
+    detections = np.zeros(n, dtype=ars430_codec.DETECTION_DTYPE)
+    clutter = n - 5 * targets
+    detections['Range'] = np.concatenate((np.repeat(rng.uniform(5.0, 150.0, targets), 5) + rng.normal(0.0, 0.5, 5 * targets),
+                                          rng.uniform(0.5, 250.0, clutter)))
+    detections['AzimuthalAngle0'] = np.concatenate((np.repeat(rng.uniform(-0.8, 0.8, targets), 5) + rng.normal(0.0, 0.01, 5 * targets),
+                                                    rng.uniform(-1.0, 1.0, clutter)))
+    detections['RelativeRadialVelocity'] = np.concatenate((np.repeat(rng.uniform(-15.0, 15.0, targets), 5) + rng.normal(0.0, 0.2, 5 * targets),
+                                                           rng.uniform(-30.0, 30.0, clutter)))
+    detections['ProbabilityAz0'] = 1.0
+    frame = ars430_codec.EventFrame()
+    frame.EventType = codec.Headers.NEAR0.value
+    frame.DetectionList = detections
+    clusterer = ars430_codec.DetectionClusterer()
+    return lambda: clusterer.clusterFrame(frame)
+
+# What the statistics of the diagnostics topic add to handling a decoded packet: the clock reads
+# and the counting done by handle_datagram_timed in scripts/ars430.py
+def stats_bench(packet):
+    stats = ars430_codec.RadarStats()
+    clock = time.time
+    def run():
+        start = clock()
+        decoded = clock()
+        published = clock()
+        assembled = clock()
+        done = clock()
+        stats.addPacket(packet)
+        stats.addLatency('decode', decoded - start)
+        stats.addLatency('publish', published - decoded)
+        stats.addLatency('assemble', assembled - published)
+        stats.addLatency('hop', start - 1.0)
+        stats.addLatency('total', done - 1.0)
+    return run
+
+# The frame which a full NEAR scan is collected into
+def near_frame(detections):
+    assembler = ars430_codec.CompleteFrameAssembler()
+    for datagram in RadarSimulator(detections, 0, seed = SEED).scan(0.0)[:3]:
+        frames = assembler.add(ars430_codec.Unpack(datagram, True), 0.0)
+    return frames[0]
+
+# Return the names of the UnpackEvent benchmarks whose batch decode differs from the scalar one
+# in any byte of its detections, padding included
+def check_batch_decode():
+    differ = []
+    for n in DETECTION_COUNTS:
+        datagram = event_datagram(n)
+        scalar = codec.UnpackEvent(datagram, False, codec.HEADER_LEN).DetectionList
+        batch = codec.UnpackEvent(datagram, True, codec.HEADER_LEN).DetectionList
+        if batch.tobytes() != scalar.tobytes():
+            differ.append('UnpackEvent/batch/%d' % n)
+    return differ
+
+# Return the list of (name, function) of every benchmark
+def benchmarks():
+    benches = []
+    status = RadarSimulator(seed = SEED).status(0.0)
+    event = event_datagram(MAX_DETECTIONS_PER_PACKET)
+    benches.append(('FindHeader', lambda: codec.FindHeader(event)))
+    benches.append(('Validate/length/%d' % MAX_DETECTIONS_PER_PACKET, lambda: ars430_codec.Validate(event, False)))
+    benches.append(('Validate/crc/%d' % MAX_DETECTIONS_PER_PACKET, lambda: ars430_codec.Validate(event, True)))
+    benches.append(('Validate/crc/status', lambda: ars430_codec.Validate(status, True)))
+    benches.append(('UnpackStatus', lambda: codec.UnpackStatus(status, codec.HEADER_LEN)))
+    # A status which repeats the cached one, within the heartbeat
+    statusCache = ars430_codec.StatusCache(1.0)
+    statusCache.wanted(status, 0.0)
+    benches.append(('StatusCache/unchanged', lambda: statusCache.wanted(status, 0.5)))
+    for n in DETECTION_COUNTS:
+        datagram = event_datagram(n)
+        benches.append(('UnpackEvent/%d' % n, lambda d = datagram: codec.UnpackEvent(d, False, codec.HEADER_LEN)))
+        benches.append(('UnpackEvent/batch/%d' % n, lambda d = datagram: codec.UnpackEvent(d, True, codec.HEADER_LEN)))
+    # Only the header fields, as when no output needs the detections
+    benches.append(('UnpackEvent/header-only/%d' % MAX_DETECTIONS_PER_PACKET,
+                    lambda: codec.UnpackEvent(event, True, codec.HEADER_LEN, False)))
+
+    datagrams = scan_datagrams()
+    benches.append(('ValidateBatch/crc/%dscans' % SCANS, lambda: ars430_codec.ValidateBatch(datagrams, True)))
+    packets = [ars430_codec.Unpack(datagram, True) for datagram in datagrams]
+    for name, assemblerClass in (('timestamp', ars430_codec.FrameAssembler),
+                                 ('complete', ars430_codec.CompleteFrameAssembler),
+                                 ('window', ars430_codec.WindowedFrameAssembler)):
+        benches.append(('collect/%s/%dscans' % (name, SCANS), collect_bench(assemblerClass, packets)))
+    benches.append(('RadarStats/packet', stats_bench(packets[0])))
+
+    frame = near_frame(3 * MAX_DETECTIONS_PER_PACKET)
+    benches.append(('DetectionsToXYZ/%d' % len(frame.DetectionList),
+                    lambda: ars430_codec.DetectionsToXYZ(frame.DetectionList)))
+    benches.append(('MarkerPoints/%d' % len(frame.DetectionList),
+                    lambda: ars430_codec.MarkerPoints(frame.DetectionList)))
+    benches.append(('CloudArray/%d' % len(frame.DetectionList), lambda: ars430_codec.CloudArray(frame)))
+    benches.append(('DetectionFilter/%d' % len(frame.DetectionList), filter_bench(frame)))
+    benches.append(('FrameFusion/4radars/%d' % (8 * len(frame.DetectionList)), fusion_bench(frame, 4)))
+    for n in (100, 500, 1000):
+        benches.append(('MultiTargetTracker/%d' % n, tracker_bench(n)))
+    for n in (100, 500, 1000):
+        benches.append(('DetectionClusterer/%d' % n, cluster_bench(n)))
+    return benches
+
+# Best time per call of function, in microseconds. The number of calls per repeat is chosen so a
+# repeat takes about minTime seconds.
+def measure(function, repeat, minTime):
+    number = 1
+    while True:
+        elapsed = timeit.timeit(function, number = number)
+        if elapsed >= minTime / 10:
+            break
+        number *= 10
+    number = max(1, int(number * minTime / max(elapsed, 1e-9)))
+    return min(timeit.repeat(function, number = number, repeat = repeat)) / number * 1e6
+
+# The commit of the working tree, if this is a git checkout
+def git_commit():
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr = devnull,
+                                           cwd = os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Compare results with baseline. Returns the names of the benchmarks which got more than
+# threshold slower.
+def compare(results, baseline, threshold):
+    slower = []
+    print('%-32s %12s %12s %8s' % ('benchmark', 'baseline us', 'us', 'change'))
+    for name in sorted(results):
+        if name not in baseline:
+            print('%-32s %12s %12.2f %8s' % (name, '-', results[name], 'new'))
+            continue
+        change = results[name] / baseline[name] - 1
+        flag = ''
+        if change > threshold:
+            slower.append(name)
+            flag = '  SLOWER'
+        print('%-32s %12.2f %12.2f %+7.1f%%%s' % (name, baseline[name], results[name], 100 * change, flag))
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Microbenchmarks of the ars430 decode and assembly hot paths')
+    parser.add_argument('--filter', default = None, help = 'only run the benchmarks matching this regular expression')
+    parser.add_argument('--repeat', type = int, default = 7, help = 'repeats per benchmark; the best one is kept')
+    parser.add_argument('--min-time', type = float, default = 0.2, help = 'seconds per repeat')
+    parser.add_argument('--save', default = None, help = 'write the results to this JSON file')
+    parser.add_argument('--compare', default = None, help = 'JSON file of results to compare with')
+    parser.add_argument('--threshold', type = float, default = THRESHOLD,
+                        help = 'fraction by which a benchmark may get slower before --compare fails')
+    args = parser.parse_args()
+
+    differ = check_batch_decode()
+    if differ:
+        print('The batch decode differs from the scalar decode in %s' % ', '.join(differ))
+        sys.exit(1)
+
+    results = {}
+    for name, function in benchmarks():
+        if args.filter is not None and not re.search(args.filter, name):
+            continue
+        results[name] = measure(function, args.repeat, args.min_time)
+        print('%-32s %10.2f us' % (name, results[name]))
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump({'commit': git_commit(),
+                       'python': platform.python_version(),
+                       'numpy': np.__version__,
+                       'machine': platform.machine(),
+                       'results': results}, f, indent = 2, sort_keys = True)
+        print('Saved to %s' % args.save)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print('\nCompared with %s (commit %s, Python %s):' % (args.compare, baseline.get('commit'),
+                                                             baseline.get('python')))
+        if baseline.get('python') != platform.python_version() or baseline.get('numpy') != np.__version__:
+            print('Warning: the baseline was measured with Python %s and NumPy %s' %
+                  (baseline.get('python'), baseline.get('numpy')))
+        slower = compare(results, baseline['results'], args.threshold)
+        if slower:
+            print('%d benchmarks are more than %.0f%% slower' % (len(slower), 100 * args.threshold))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+# Measure how decode throughput scales with the number of worker processes of the pipeline mode
+# of the ars430 node. A producer pushes canned datagrams of several radars into one shared-memory
+# ring per worker, the same way run_pipeline in scripts/ars430.py does: from the memoryviews of a
+# ReceiveBufferPool, where recv_batch leaves them. Every worker decodes and collects the
+# datagrams of its radars. Does not need ROS:
+#   python bench/pipeline.py [radars] [scans] [max workers]
+
+###########
+# Imports #
+###########
+import multiprocessing
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'rosudp', 'src'))
+import ars430_codec
+from ars430_codec import codec
+from rosudp.connection import ReceiveBufferPool
+from rosudp.ringbuffer import DatagramRing, ring_dir
+
+# Detections in every event packet, as in a busy scene
+DETECTIONS = 38
+# A datagram from this address stops a worker
+STOP_IP = '0.0.0.0'
+
+# One radar cycle: NEAR0-2 and FAR0-1 event packets with the given TimeStamp
+def make_scan(timeStamp):
+    scan = []
+    for headerBytes in (codec.NEAR0_HEADER_BYTES, codec.NEAR1_HEADER_BYTES, codec.NEAR2_HEADER_BYTES,
+                        codec.FAR0_HEADER_BYTES, codec.FAR1_HEADER_BYTES):
+        payload = codec.EVENT_STRUCT.pack(0, 0, 0, 0, 0, timeStamp, timeStamp, timeStamp, 3 * DETECTIONS,
+                                          0, 0, DETECTIONS) + os.urandom(DETECTIONS * codec.RADAR_DETECTION_PACKAGE_LENGTH)
+        scan.append(headerBytes + struct.pack('!L', len(payload) + 8) + b'\0' * 8 + payload)
+    return scan
+
+# Decode and collect every datagram of a ring until a stop datagram arrives
+def decode_ring(path):
+    ring = DatagramRing(path)
+    assemblers = {}
+    running = True
+    while running:
+        count = ring.wait(1.0)
+        for i in range(count):
+            ip, datagram = ring.get(i)
+            if ip == STOP_IP:
+                running = False
+                break
+            packet = ars430_codec.Unpack(datagram, True)
+            assembler = assemblers.get(ip)
+            if assembler is None:
+                assembler = assemblers[ip] = ars430_codec.FrameAssembler()
+            assembler.collect(packet)
+        ring.release(count)
+    ring.close()
+
+# Push datagrams into a ring, waiting while it is full
+def push_wait(ring, data, ip):
+    while not ring.push(data, ip, False):
+        time.sleep(0.0001)
+
+# Decode all datagrams with the given number of worker processes (0: in this process).
+# Returns the number of seconds taken.
+def run(datagrams, radars, workers):
+    if workers == 0:
+        assemblers = dict((ip, ars430_codec.FrameAssembler()) for ip in radars)
+        start = time.time()
+        for ip, data in datagrams:
+            assemblers[ip].collect(ars430_codec.Unpack(data, True))
+        return time.time() - start
+
+    rings = [DatagramRing(os.path.join(ring_dir(), 'ars430_bench_%d_%d.ring' % (os.getpid(), k)), create = True)
+             for k in range(workers)]
+    shards = dict((ip, rings[k % workers]) for k, ip in enumerate(radars))
+    procs = [multiprocessing.Process(target = decode_ring, args = (ring.path,)) for ring in rings]
+    for proc in procs:
+        proc.start()
+    # Every datagram is copied into a receive buffer first, as recvfrom_into does
+    pool = ReceiveBufferPool(1)
+    start = time.time()
+    for ip, data in datagrams:
+        pool.sizes[0] = len(data)
+        pool.buffers[0][:len(data)] = data
+        push_wait(shards[ip], pool.views[0][:pool.sizes[0]], ip)
+    for ring in rings:
+        push_wait(ring, b'', STOP_IP)
+    for proc in procs:
+        proc.join()
+    seconds = time.time() - start
+    for ring in rings:
+        ring.close()
+    return seconds
+
+def main():
+    radarCount = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    scans = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    maxWorkers = int(sys.argv[3]) if len(sys.argv) > 3 else min(radarCount, multiprocessing.cpu_count())
+
+    radars = ['192.168.1.%d' % (2 + k) for k in range(radarCount)]
+    # The radars' packets are interleaved, as they arrive on a shared network
+    datagrams = [(ip, data) for ts in range(scans) for data in make_scan(ts) for ip in radars]
+
+    print('%d radars, %d datagrams of %d detections, %d cpus' % (radarCount, len(datagrams), DETECTIONS,
+                                                                  multiprocessing.cpu_count()))
+    baseline = None
+    for workers in range(0, maxWorkers + 1):
+        seconds = run(datagrams, radars, workers)
+        rate = len(datagrams) / seconds
+        baseline = baseline or rate
+        print('%-12s %9.0f datagrams/s  x%.2f' % ('%d workers' % workers if workers else 'in process', rate, rate / baseline))
+
+if __name__ == '__main__':
+    main()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -5,493 +5,712 @@
 ###########
 import rospy
 import roslib; roslib.load_manifest('ars430')
+from rospy.numpy_msg import numpy_msg
 from visualization_msgs.msg import Marker
 from geometry_msgs.msg import Point
+from sensor_msgs.msg import PointCloud2, PointField
 from std_msgs.msg import String
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
 from rosudp.msg import UDPMsg
+from rosudp.connection import init_udp_connection, ReceiveBufferPool, recv_batch, kernel_drops, RECV_TIMEOUT
+from rosudp.ringbuffer import DatagramRing, ring_dir, RING_SLOTS
+from rosudp.capture import CaptureReader, paced
 from ars430.msg import ARS430Event
+from ars430.msg import ARS430EventColumns
 from ars430.msg import ARS430Status
 from ars430.msg import RadarDetection
 
-import struct
-import binascii
-import math
-import enum
-from enum import Enum
-
-try:
-    from enum import auto
-except ImportError:
-    __my_enum_auto_id = 0
-    def auto():
-        global __my_enum_auto_id
-        i = __my_enum_auto_id 
-        __my_enum_auto_id += 1
-        return i
-
-# Class for the ARS430, which contains functions for
-# unpacking the UDPMsg from the ARS430 radar and turning it into
-# a meaningful object here. It also contains a method for emitting
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# All the decoding is done by the ROS-free ars430_codec library (see src/ars430_codec).
+# This node only moves its frames in and out of ROS messages.
+import ars430_codec
+from ars430_codec import (FrameAssembler, CompleteFrameAssembler, WindowedFrameAssembler, StatusFrame, EventFrame,
+                          RadarStats, DatagramValidator, StatusCache, DetectionFilter, MultiTargetTracker,
+                          DetectionClusterer)
+
+# Class for the ARS430, which unpacks the UDPMsg from the ARS430 radar with ars430_codec
+# and turns the resulting frames into ROS messages. It also contains a method for emitting
 # ARS430Msg to a given topic.
 class ARS430Publisher:
-    # Enumerator defining the ARS430 header types
-    class Headers(Enum):
-        STATUS = 5
-        FAR0   = 0
-        FAR1   = 1
-        NEAR0  = 2
-        NEAR1  = 3
-        NEAR2  = 4
-
-    # The ARS430 has a header length of 16 bytes
-    HEADER_LEN = 16
-    # The headers in byte format (hexadecimal)
-    STATUS_HEADER_BYTES = '\x00\xc8\x00\x00'
-    FAR0_HEADER_BYTES   = '\x00\xdc\x00\x01'
-    FAR1_HEADER_BYTES   = '\x00\xdc\x00\x02'
-    NEAR0_HEADER_BYTES  = '\x00\xdc\x00\x03' 
-    NEAR1_HEADER_BYTES  = '\x00\xdc\x00\x04' 
-    NEAR2_HEADER_BYTES  = '\x00\xdc\x00\x05' 
-
-    # Other global information
-    RADAR_DETECTION_START = 32 # byte value of Event data at which the RadarDetection list begins
-    RADAR_DETECTION_PACKAGE_LENGTH = 28 # number of bytes in one element of RadarDetection list
-    SERIAL_NUMBER_START = 29 # byte value of StatusData where SerialNumber begins
-    SERIAL_NUMBER_LENGTH = 26 # number of bytes in the SerialNumber of Status data
-
-    # Constructor - initializes rospy Publishers for each of the topics
-    def __init__(self, ip, statusTopic, eventTopic):
+    # Fields copied from an EventFrame to an ARS430Event; the DetectionList is converted separately
+    EVENT_FIELDS = tuple(name for name in EventFrame.__slots__ if name != 'DetectionList')
+    # float32[] and uint8[] columns of an ARS430EventColumns, see ars430_codec.DETECTION_FIELDS
+    FLOAT_COLUMNS = tuple(name for name in ars430_codec.DETECTION_FIELDS if name not in ars430_codec.PDH0_FLAG_FIELDS)
+    FLAG_COLUMNS = ars430_codec.PDH0_FLAG_FIELDS
+    # Fields of the PointCloud2 points, see ars430_codec.POINT_DTYPE
+    CLOUD_FIELDS = ars430_codec.PointFieldList(PointField)
+    # Fields of the tracks, see ars430_codec.TRACK_DTYPE
+    TRACK_FIELDS = ars430_codec.PointFieldList(PointField, ars430_codec.TRACK_DTYPE)
+    # Fields of the clusters, see ars430_codec.CLUSTER_DTYPE
+    CLUSTER_FIELDS = ars430_codec.PointFieldList(PointField, ars430_codec.CLUSTER_DTYPE)
+    # Header type -> header type of the first packet of its scan
+    SCAN_STARTS = {ars430_codec.Headers.NEAR0: ars430_codec.Headers.NEAR0,
+                   ars430_codec.Headers.NEAR1: ars430_codec.Headers.NEAR0,
+                   ars430_codec.Headers.NEAR2: ars430_codec.Headers.NEAR0,
+                   ars430_codec.Headers.FAR0: ars430_codec.Headers.FAR0,
+                   ars430_codec.Headers.FAR1: ars430_codec.Headers.FAR0}
+
+    # Constructor - initializes rospy Publishers for each of the topics.
+    # If batchDecode is true, RadarDetection lists are decoded with NumPy (see ars430_codec.UnpackRadarDetectionsBatch)
+    # markerNs is the rviz marker namespace of this radar's points. If pointsTopic is given, every
+    # collected frame is also published there as a PointCloud2 in frameId.
+    # If columnsTopic is given, events are also published there as ARS430EventColumns. If eventTopic
+    # is None, events are only published as ARS430EventColumns.
+    # assembler collects the packets into frames; a FrameAssembler is used if none is given.
+    # If tracker (an ars430_codec.MultiTargetTracker) is given, it is updated with every collected
+    # frame, and its confirmed tracks are published to tracksTopic as a PointCloud2 in frameId.
+    # If clusterer (an ars430_codec.DetectionClusterer) is given, the clusters of every collected
+    # frame are published to clustersTopic as a PointCloud2 in frameId.
+    def __init__(self, ip, statusTopic, eventTopic, batchDecode = False, markerNs = 'ars430_points',
+                 pointsTopic = None, frameId = '/map', columnsTopic = None, assembler = None,
+                 tracksTopic = None, tracker = None, clustersTopic = None, clusterer = None):
         # Initialize publishers for Event and Status topics
         self.statuses = rospy.Publisher(statusTopic, ARS430Status, queue_size = 10)
-        self.events = rospy.Publisher(eventTopic, ARS430Event, queue_size = 10)
+        self.events = rospy.Publisher(eventTopic, ARS430Event, queue_size = 10) if eventTopic else None
+        # numpy_msg serializes the float32[] columns straight from the NumPy arrays
+        self.columns = rospy.Publisher(columnsTopic, numpy_msg(ARS430EventColumns), queue_size = 10) if columnsTopic else None
+        self.clouds = rospy.Publisher(pointsTopic, PointCloud2, queue_size = 5) if pointsTopic else None
+        self.tracker = tracker
+        self.tracks = rospy.Publisher(tracksTopic, PointCloud2, queue_size = 5) if tracker is not None else None
+        # Frames reach the tracker from the receiving thread and from the timer which expires frames
+        self.trackerLock = threading.Lock()
+        self.clusterer = clusterer
+        self.clusters = rospy.Publisher(clustersTopic, PointCloud2, queue_size = 5) if clusterer is not None else None
+        self.frameId = frameId
         self.ip = ip
-        self.nearPackets = []
-        self.farPackets = []
+        self.batchDecode = batchDecode
+        self.markerNs = markerNs
+        # Each radar has its own assembler, so NEAR/FAR packets of different radars never mix
+        self.assembler = assembler if assembler is not None else FrameAssembler()
+        # The assembler is used by the receiving thread and by the timer which expires frames
+        self.lock = threading.Lock()
+        # Statistics for the diagnostics topic (an ars430_codec.RadarStats), None when disabled
+        self.stats = None
+        # Checks every datagram before it is decoded (an ars430_codec.DatagramValidator), None when disabled
+        self.validator = None
+        # Skips statuses which repeat the last published one (an ars430_codec.StatusCache), None when disabled
+        self.statusCache = None
+        # Whether the detections of the last event were decoded (see wantsDetections)
+        self.decodedDetections = True
+        # Whether the detections of the current NEAR and FAR scan are decoded, keyed by the header
+        # type of the first packet of the scan
+        self.scanDetections = {ars430_codec.Headers.NEAR0: True, ars430_codec.Headers.FAR0: True}
+        # Drops poor detections from every event before any output (an ars430_codec.DetectionFilter), None when disabled
+        self.detectionFilter = None
 
     def get_ip(self):
          return self.ip
 
-    # Find the header in the UDPMsg.data object, and return
-    # a Headers enum corresponding to that header type
-    @staticmethod
-    def FindHeader(data):
-        # Split the header into its components
-        header = data[:ARS430Publisher.HEADER_LEN]
-        headerID = header[:4]
-        e2eLength = header[4:8]
-        # If necessary, find out what [8:16] are
-
-        # Determine what type of object this is
-        if headerID == ARS430Publisher.STATUS_HEADER_BYTES:
-            return ARS430Publisher.Headers.STATUS
-        elif headerID == ARS430Publisher.FAR0_HEADER_BYTES:
-            return ARS430Publisher.Headers.FAR0
-        elif headerID == ARS430Publisher.FAR1_HEADER_BYTES:
-            return ARS430Publisher.Headers.FAR1
-        elif headerID == ARS430Publisher.NEAR0_HEADER_BYTES:
-            return ARS430Publisher.Headers.NEAR0
-        elif headerID == ARS430Publisher.NEAR1_HEADER_BYTES:
-            return ARS430Publisher.Headers.NEAR1
-        elif headerID == ARS430Publisher.NEAR2_HEADER_BYTES:
-            return ARS430Publisher.Headers.NEAR2
-
-    # Method to unpack a status-type message emitted by an ARS430 radar
-    @staticmethod
-    def UnpackStatus(statusData):
-        def merge24(int8_part1, int8_part2, int8_part3):
-            merged = (int8_part1 << 16) | (int8_part2 << 8) | int8_part3
-            return merged
-        # The serial number is an array of uint8s, so we need to split the unpacking into 3 sections: before SN, SN, and after SN
-        before_sn = statusData[:ARS430Publisher.SERIAL_NUMBER_START]
-        serial_number_end_byte = ARS430Publisher.SERIAL_NUMBER_START + ARS430Publisher.SERIAL_NUMBER_LENGTH
-        _SerialNumber = statusData[ARS430Publisher.SERIAL_NUMBER_START : serial_number_end_byte]
-        after_sn = statusData[serial_number_end_byte:]
-
-        # Unpack the statusData into an ARS430Status
-        # Step 1: unpack the "before SN" section
-        (_CRC, _Len, _SQC, _PartNumber, _AssemblyPartNumber, _SWPartNumber) = struct.unpack("!HHBQQQ", before_sn)
-
-        # Step 2: unpack the "after SN" section, _SerialNumber, 
-        (_BLVersion1, _BLVersion2,
-         _BLVersion3, _BLCRC, _SWVersion1, _SWVersion2,_SWVersion3, _SWCRC, _UtcTimeStamp, _TimeStamp, _CurrentDamping,
-         _OpState, _CurrentFarCF, _CurrentNearCF, _Defective, _SupplVoltLimit, _SensorOffTemp, _GmMissing, _TxOutReduced,
-         _MaximumRangeFar, _MaximumRangeNear
-         ) = struct.unpack("!BBBLBBBLQLLBBBBBBBBHH", after_sn)
-        # Merge the 24-byte objects together
-        _SWVersion = merge24(_SWVersion1, _SWVersion2, _SWVersion3)
-        _BLVersion = merge24(_BLVersion1, _BLVersion2, _BLVersion3)
-
-        # Copy the data over into the ARS430Status object
-        packet = ARS430Status()
-        packet.EventType = ARS430Publisher.Headers.STATUS.value                                 # (custom by us, not continental)
-        packet.CRC=_CRC                                                                         # (unitless)
-        packet.Len = _Len                                                                       # (unitless)
-        packet.SQC = _SQC                                                                       # (unitless)
-        packet.PartNumber = _PartNumber                                                         # (unitless)
-        packet.AssemblyPartNumber =_AssemblyPartNumber                                          # (unitless)
-        packet.SWPartNumber =_SWPartNumber                                                      # (unitless)
-        packet.SerialNumber = _SerialNumber                                                     # (unitless)
-        packet.BLVersion=_BLVersion                                                             # (unitless)
-        packet.BLCRC=_BLCRC                                                                     # (unitless)
-        packet.SWVersion=_SWVersion                                                             # (unitless)
-        packet.SWCRC=_SWCRC                                                                     # (unitless)
-        packet.UTCTimestamp=_UtcTimeStamp                                                       # nsec
-        packet.Timestamp=_TimeStamp                                                             # usec
-        packet.CurrentDamping= ((_CurrentDamping * 0.931322575049159) - 2000000000) /100000000  # dB
-        packet.Opstate=_OpState                                                                 # (unitless)
-        packet.CurrentFarCF=_CurrentFarCF                                                       # (unitless)
-        packet.CurrentNearCF=_CurrentNearCF                                                     # (unitless)
-        packet.Defective=_Defective                                                             # (unitless)
-        packet.SupplyVoltLimit=_SupplVoltLimit                                                  # (unitless)
-        packet.SensorOffTemp=_SensorOffTemp                                                     # (unitless)
-        packet.GmMissing=_GmMissing                                                             # (unitless)
-        packet.TxOutReduced=_TxOutReduced                                                       # (unitless)
-        packet.MaximumRangeFar=_MaximumRangeFar * 0.1                                           # m
-        packet.MaximumRangeNear=_MaximumRangeNear * 0.1                                         # m
-
-        # Return the ARS430Status object for publishing
-        return packet
+    # Return true if anything subscribes to an output which needs the detections of this radar's
+    # events: its event topics, its points or clusters topic or the rviz markers. The tracker always needs
+    # them, so its tracks are up to date when a subscriber connects.
+    def wantsDetections(self):
+        if self.tracker is not None:
+            return True
+        for publisher in (self.events, self.columns, self.clouds, self.clusters, rvizPublisher):
+            if publisher is not None and publisher.get_num_connections() > 0:
+                return True
+        return False
 
-    @staticmethod
-    def UnpackRadarDetections(packet, detection_bytes, numDetections):
-        packet.DetectionList = []
-        index = 0
-        length = len(detection_bytes)
-        # Unpack all RadarDetection bytes from the UDP data, which comes in detection_bytes
-        while(index<length and (index/ARS430Publisher.RADAR_DETECTION_PACKAGE_LENGTH) < numDetections):
-
-            # Create a new RadarDetection message
-            detection = RadarDetection()
-            # Unpac the UDP data to get the Radar Detection signals
-            chunk=detection_bytes[index:index+ARS430Publisher.RADAR_DETECTION_PACKAGE_LENGTH]
-            (f_Range, f_VrelRad, f_AzAng0,
-             f_AzAng1, f_ElAng, f_RCS0, 
-             f_RCS1, f_Prob0, f_Prob1, 
-             f_RangeVar, f_VrelRadVar, f_AzAngVar0, 
-             f_AzAngVar1, f_ElAngVar, f_Pdh0, f_SNR) = struct.unpack("!HhhhhhhBBHHHHHBB", chunk)
-
-            # Fill in the RadarDetection message with the unpacked signals
-            # Note that these signals are converted to their actual physical value
-            detection.Range = f_Range/65534.0 * 300                         # meters
-            detection.RelativeRadialVelocity = f_VrelRad/65534.0 * 300      # meters/s
-            detection.AzimuthalAngle0 = f_AzAng0/65534.0 * (2*math.pi)      # rad
-            detection.AzimuthalAngle1 = f_AzAng1/65534.0 * (2*math.pi)      # rad
-            detection.ElevationAngle = f_ElAng/65534.0 * (2*math.pi)        # rad
-            detection.RadarCrossSection0 = f_RCS0/65534.0 * 200             # dBm^2
-            detection.RadarCrossSection1 = f_RCS1/65534.0 * 200             # dBm^2
-            detection.ProbabilityAz0 = f_Prob0/254.0                        # (unitless)
-            detection.ProbabilityAz1 = f_Prob1/254.0                        # (unitless)
-            detection.RangeVariance = f_RangeVar/65534.0 * 10               # m^2
-            detection.RadialVelocityVariance = f_VrelRadVar/65534.0 * 10    # (m/s)^2
-            detection.Az0Variance = f_AzAngVar0/65534.0                     # rad^2
-            detection.Az1Variance = f_AzAngVar1/65534.0                     # rad^2
-            detection.ElAngleVariance = f_ElAngVar/65534.0                  # rad^2
-            # PdH0 is a bitstream of flags, not an actual probability value. Split it into those bits and set flags accordingly.
-            # We also map Pdh0 to a "probability", so that if it is above some threshold we
-            # can check these flags to find out which ones apply
-            detection.ProbabilityFalseDetection   = f_Pdh0/254.0            # (unitless)
-            detection.FalseDetectionNear          = (f_Pdh0 & 0b0000001)>0  # boolean
-            detection.FalseDetectionFromInference = (f_Pdh0 & 0b0000010)>0  # boolean
-            detection.FalseDetectionFromSidelobe  = (f_Pdh0 & 0b0000100)>0  # boolean
-            detection.BiasCorrectionInaccurate    = (f_Pdh0 & 0b0001000)>0  # boolean
-            detection.ClusterNotLocalMax          = (f_Pdh0 & 0b0010000)>0  # boolean
-            detection.BeamFormerMonopulseDiffer1  = (f_Pdh0 & 0b0100000)>0  # boolean
-            detection.BeamFormerMonopulseDiffer2  = (f_Pdh0 & 0b1000000)>0  # boolean
-            # SNR = Signal-to-noise ratio
-            detection.SNR = (f_SNR + 110.0)/10.0               # dBr
-            # Add this RadarDetection message to the ARS430Event message
-            packet.DetectionList.append(detection)
-            # Go to the next Radar Detection segment of the UDP data to unpack it
-            index+=ARS430Publisher.RADAR_DETECTION_PACKAGE_LENGTH
-
-        # Return the packet, which is now filled with detections
+    # Unpack the data of a UDPMsg into a StatusFrame or EventFrame. The detections are only decoded
+    # while an output needs them; otherwise the event only carries its header fields. Whether they
+    # are decoded is only decided at the first packet (NEAR0 or FAR0) of a scan, so the packets of
+    # a frame are either all decoded or none are, and its DetectionList matches its NofDet. The
+    # detection filter is applied here, so every output gets the same filtered detections.
+    def Unpack(self, udpData):
+        headerType = ars430_codec.FindHeader(udpData)
+        scanStart = ARS430Publisher.SCAN_STARTS.get(headerType)
+        if scanStart is not None:
+            if headerType is scanStart:
+                self.scanDetections[scanStart] = self.wantsDetections()
+            self.decodedDetections = self.scanDetections[scanStart]
+        packet = ars430_codec.Unpack(udpData, self.batchDecode, self.decodedDetections)
+        if self.detectionFilter is not None and self.decodedDetections and not ars430_codec.IsStatus(packet):
+            self.detectionFilter.apply(packet)
         return packet
 
+    # Convert a StatusFrame into an ARS430Status message
     @staticmethod
-    def UnpackEvent(eventData):
-        # Split the Event and RadarDetection sections into two.
-        # The event only data is 32 bytes long
-        # The RadarDetection list is the rest of the package
-        eventOnlyData=eventData[:ARS430Publisher.RADAR_DETECTION_START]
-
-        # Unpack the data for Events using struct.unpack
-        (RDI_CRC,RDI_Len,RDI_SQC,RDI_MessageCounter,
-         RDI_UtcTimeStamp,RDI_TimeStamp,RDI_MeasureCounter,
-         RDI_CycleCounter,RDI_NofDetections,RDI_Vambig,
-	 RDI_CenterFrequency,RDI_DetectionsInPacket) =struct.unpack("!HHBBQLLLHhBB",eventOnlyData)
-
-        # Convert the unpacked data into an ARS430Event type
-	packet=ARS430Event()
-	
-        packet.CRC=RDI_CRC                          # (unitless)
-	packet.Len=RDI_Len                          # (unitless)
-	packet.SQC=RDI_SQC                          # (unitless)
-	packet.MessageCounter=RDI_MessageCounter    # (unitless)
-	packet.UtcTimeStamp=RDI_UtcTimeStamp        # nsec
-	packet.TimeStamp=RDI_TimeStamp              # usec
-	packet.MeasureCounter=RDI_MeasureCounter    # (unitless)
-	packet.CycleCounter=RDI_CycleCounter        # (unitless)
-	packet.NofDet=RDI_NofDetections             # (unitless)
-	packet.Vambig=RDI_Vambig/65534.0 * 200      # m/s
-	packet.CenterFreq=RDI_CenterFrequency       # GHz
-	packet.DetInPack=RDI_DetectionsInPacket     # (unitless)
-
-        if RDI_DetectionsInPacket > 0:
-            #calling the class Radar Detection for the data starting from the 256th bit/32th byte position 
-            packet = ARS430Publisher.UnpackRadarDetections(packet, eventData[ARS430Publisher.RADAR_DETECTION_START:], RDI_DetectionsInPacket)
-        else:
-            packet.DetectionList = []
+    def ToStatusMsg(frame):
+        msg = ARS430Status()
+        for name in StatusFrame.__slots__:
+            setattr(msg, name, getattr(frame, name))
+        return msg
 
-        # Return the ARS430Event message
-        return packet
-
-    # Unpack a UDPMsg into the ARS430Msg type, and returns that ARS430Msg as
-    # well as the type
+    # Convert an EventFrame into an ARS430Event message
     @staticmethod
-    def Unpack(udpData):
-        # Determine what header is in this UDP packet
-        headerType = ARS430Publisher.FindHeader(udpData)
-
-        # Separate the header and the data itself
-        data = udpData[ARS430Publisher.HEADER_LEN:]
-
-        # Unpack the relevant data and publish it to the topics
-        if headerType == ARS430Publisher.Headers.STATUS:
-            status = ARS430Publisher.UnpackStatus(data)
-            return status
-        else:
-            event = ARS430Publisher.UnpackEvent(data)
-            event.EventType = headerType.value
-            return event
-
-    # Determine if a header is of status type
+    def ToEventMsg(frame):
+        msg = ARS430Event()
+        for name in ARS430Publisher.EVENT_FIELDS:
+            setattr(msg, name, getattr(frame, name))
+        # tolist() gives one tuple per detection, with the fields in RadarDetection order
+        msg.DetectionList = [RadarDetection(*row) for row in frame.DetectionList.tolist()]
+        return msg
+
+    # Convert an EventFrame into an ARS430EventColumns message, with one array per detection field.
+    # The float32 columns stay NumPy arrays, which numpy_msg writes with one copy each; the bool
+    # Pdh0 flags are already one 0/1 byte each, so their bytes are the uint8[] columns.
     @staticmethod
-    def IsStatus(packet):
-        return packet.EventType == ARS430Publisher.Headers.STATUS.value
-
-    # determine if a header is of near type
+    def ToEventColumnsMsg(frame):
+        msg = numpy_msg(ARS430EventColumns)()
+        for name in ARS430Publisher.EVENT_FIELDS:
+            setattr(msg, name, getattr(frame, name))
+        detections = frame.DetectionList
+        for name in ARS430Publisher.FLOAT_COLUMNS:
+            setattr(msg, name, detections[name])
+        for name in ARS430Publisher.FLAG_COLUMNS:
+            setattr(msg, name, detections[name].tobytes())
+        return msg
+
+    # Convert a collected EventFrame into a PointCloud2 in frameId. The point buffer is built
+    # column by column by ars430_codec.CloudArray, without a Python object per point.
     @staticmethod
-    def IsNear( packet):
-        if packet.EventType == ARS430Publisher.Headers.NEAR0.value or \
-           packet.EventType == ARS430Publisher.Headers.NEAR1.value or \
-           packet.EventType == ARS430Publisher.Headers.NEAR2.value:
-            return True
-        return False
+    def ToCloudMsg(frame, frameId):
+        return ARS430Publisher.ToPointsMsg(ars430_codec.CloudArray(frame), ARS430Publisher.CLOUD_FIELDS, frameId)
 
-    # Determine if a header is of far type
+    # Convert a NumPy array with one record per point into a PointCloud2 in frameId with the given
+    # fields, stamped now (see ars430_codec.PointsMsg)
     @staticmethod
-    def IsFar( packet):
-        if packet.EventType == ARS430Publisher.Headers.FAR0.value or \
-           packet.EventType == ARS430Publisher.Headers.FAR1.value:
-            return True
-        return False
-
-    # Immediately publish a packet to the relevant topic
+    def ToPointsMsg(points, fields, frameId):
+        return ars430_codec.PointsMsg(PointCloud2, points, fields, frameId, rospy.Time.now())
+
+    # Publish a collected frame as a PointCloud2, if this radar has a points topic with subscribers
+    def publishCloud(self, frame):
+        if self.clouds is not None and self.clouds.get_num_connections() > 0:
+            self.clouds.publish(ARS430Publisher.ToCloudMsg(frame, self.frameId))
+
+    # Update the tracker with a collected frame, and publish the confirmed tracks if anything subscribes to them
+    def track(self, frame):
+        if self.tracker is None:
+            return
+        with self.trackerLock:
+            self.tracker.updateFrame(frame)
+            tracks = self.tracker.tracks() if self.tracks.get_num_connections() > 0 else None
+        if tracks is not None:
+            self.tracks.publish(ARS430Publisher.ToPointsMsg(tracks, ARS430Publisher.TRACK_FIELDS, self.frameId))
+
+    # Publish the clusters of a collected frame, if this radar clusters and anything subscribes to them
+    def publishClusters(self, frame):
+        if self.clusters is not None and self.clusters.get_num_connections() > 0:
+            clusters = self.clusterer.clusterFrame(frame)
+            self.clusters.publish(ARS430Publisher.ToPointsMsg(clusters, ARS430Publisher.CLUSTER_FIELDS, self.frameId))
+
+    # Immediately publish a packet to the relevant topics which have subscribers. No message is
+    # built for a topic without any.
     def publishNow(self, packet):
 
         # Set the IP of the packet
         packet.sourceIP = self.get_ip()
 
         # Publish it to the relevant topics
-        if ARS430Publisher.IsStatus(packet):
-            self.statuses.publish(packet)
-        # Only publish an event packet if it had any detections in it
-        elif packet.DetInPack > 0:
-            self.events.publish(packet)
-
-    # Given an event packet and a list of previous events, do the following:
-    # * if the list is empty, save the packet to the list and return nothing
-    # * if the packet has the same timestamp as everything in the list, save the packet and return nothing
-    # * if the packet has a different timestamp than everything in the list, return the list,
-    #      then overwrite the list with the inputted packet.
-    def __storeEvent(self, event, previousEventList):
-        # If the list is empty, save the packet
-        if not previousEventList:
-            previousEventList.append(event)
-            return []
-
-        # The list is not empty; we need to compare the timestamp of the packet with the
-        # timestamp of the list. For simplicity, we will only take the last element of the list
-        # to compare timestamps.
-
-        # If the timestamps match, just save the packet
-        if previousEventList[-1].TimeStamp == event.TimeStamp:
-            previousEventList.append(event)
-            return []
-
-        # Since the timestamps don't match, now we need to return the previous list
-        # and overwrite it with a new packet
-        # 1. copy the previous list over
-        packetList = list(previousEventList)
-        # 2. clear the previous list
-        del previousEventList[:]
-        # 3. overwrite with the new packet
-        previousEventList.append(event)
-        # 4. return the copy of the old list
-        return packetList
-
-    # Given any event type packet, this will collect NEAR and FAR packages
-    # together so long as they have the same internal timestamp. It will wait until 
-    # a packet of the same type with a new timestamp appears, and then return the previous list all at once.
-    # Returns (wasPublished, packet) where
-    # * wasPublished = true if a new collected packet list was returned
-    # * packets = the new combined packet containing all detections for this timestamp (or a status packet)
+        if ars430_codec.IsStatus(packet):
+            if self.statuses.get_num_connections() > 0:
+                self.statuses.publish(ARS430Publisher.ToStatusMsg(packet))
+        # Only publish an event packet if it had any detections in it, and they were decoded (a
+        # subscriber may have connected since the packet was unpacked)
+        elif packet.DetInPack > 0 and self.decodedDetections:
+            if self.events is not None and self.events.get_num_connections() > 0:
+                self.events.publish(ARS430Publisher.ToEventMsg(packet))
+            if self.columns is not None and self.columns.get_num_connections() > 0:
+                self.columns.publish(ARS430Publisher.ToEventColumnsMsg(packet))
+
+    # Collect NEAR and FAR packets into one frame per scan (see ars430_codec.FrameAssembler and
+    # ars430_codec.CompleteFrameAssembler). Returns the list of frames which are ready.
     def collect(self, packet):
-        # status messages are returned immediately
-        if ARS430Publisher.IsStatus(packet):
-            return (False, packet)
-
-        # don't do anything if there were no detections in this packet. We don't care.
-        if packet.DetInPack == 0:
-            return (False, packet)
-
-        # Save the package to the relevant list of packages.
-        packetList = []
-        if ARS430Publisher.IsNear(packet):
-            packetList = self.__storeEvent(packet, self.nearPackets)
-        else:
-            packetList = self.__storeEvent(packet, self.farPackets)
-
-        # If the packet list is empty, then the storePacket function just saved the packet. This means
-        # the packet should not be combined for anything else.
-        if not packetList:
-            return (False, packet)
-
-        # If the packet list is NOT empty, then we have started a new list and are supposed to 
-        # emit this one. Let's collect all the packets together into one event and return it for whatever we need. We don't set CRC or Len since they don't often match. 
-
-        combinedPacket = ARS430Event()
-        combinedPacket.sourceIP = packet.sourceIP
-        combinedPacket.EventType = packet.EventType
-        combinedPacket.SQC = packet.SQC
-        combinedPacket.MessageCounter = packet.MessageCounter
-        combinedPacket.UtcTimeStamp = packet.UtcTimeStamp
-        combinedPacket.TimeStamp = packet.TimeStamp
-        combinedPacket.MeasureCounter = packet.MeasureCounter
-        combinedPacket.CycleCounter = packet.CycleCounter
-        combinedPacket.NofDet = packetList[0].NofDet
-        combinedPacket.Vambig = packet.Vambig
-        combinedPacket.DetInPack = 0
-        combinedPacket.DetectionList = []
-
-        for event in packetList:
-            combinedPacket.DetInPack += event.DetInPack
-            combinedPacket.DetectionList += event.DetectionList
-
-        return (True, combinedPacket)
-
-# Global variable corresponding to a publisher for this node
-arsPublisher = None
+        with self.lock:
+            return self.assembler.add(packet)
+
+    # Return the frames which the assembler stopped waiting for
+    def expire(self):
+        with self.lock:
+            return self.assembler.expire()
+
+# Global variables corresponding to the publishers for this node. arsPublishers maps the
+# IP address of every radar served by this node to its ARS430Publisher.
+arsPublishers = {}
 rvizPublisher = None
+diagnosticsPublisher = None
 
 # Callback function for the subscriber
 def callback(data):
-    # Declare that we are using the global publisher objects
-    global arsPublisher
-    global rvizPublisher
-
     # Tell people we heard a UDP message!
     # rospy.loginfo(rospy.get_caller_id() + "I heard a message from %s", str(data.ip))
-    # Only publish data if it comes from a desired IP address
-    if (arsPublisher.get_ip() == data.ip):
-        packet = arsPublisher.Unpack(data.data)
-        arsPublisher.publishNow(packet)
-        collected, jointPacket = arsPublisher.collect(packet)
-        # Convert every element of the packet into XYZ marker and emit to rviz
-        if collected:
-            # Create a POINTS marker object with the correct header, frame name, id, etc
-            marker = Marker()
-            # frame_id is /map since that is the RVIZ default. Could be changed later.
-            marker.header.frame_id = "/map";
-            marker.header.stamp = rospy.Time.now();
-            marker.ns = "ars430_points"
-            # Create a list of points, so that RVIZ can batch display.
-            # Alternatively, this could be a SPHERE_LIST
-            marker.type = Marker.SPHERE_LIST
-            # rospy.Duration() means the points never get erased automatically
-            marker.lifetime = rospy.Duration(1) # 2 seconds max duration. rospy.Duration() will make it infinite.
-            marker.action = Marker.ADD
-            # The base of the radar is assumed to be at (0,0,0), facing the x direction
-            marker.pose.position.x = 0;
-            marker.pose.position.y = 0;
-            marker.pose.position.z = 0;
-            # No rotation on the radar
-            marker.pose.orientation.x = 0.0;
-            marker.pose.orientation.y = 0.0;
-            marker.pose.orientation.z = 0.0;
-            marker.pose.orientation.w = 1.0;
-            # Scale of the points, in meters. The radar has a resolution of 0.55m, so we make
-            # our points 0.5m wide to have a bit of a buffer.
-            marker.scale.x = 0.5;
-            marker.scale.y = 0.5;
-            marker.scale.z = 0.5;
-
-            # Distinguish NEAR and FAR points by colour.
-            if ARS430Publisher.IsNear(jointPacket): 
-                # NEAR points are yellow
-                marker.color.r = 1.0;
-                marker.color.g = 1.0;
-                marker.color.b = 0.0;
-                marker.color.a = 1.0;
-                # The NEAR ID 
-                marker.id = 0
-            elif ARS430Publisher.IsFar(jointPacket):
-                marker.color.r = 1.0;
-                marker.color.g = 0.0;
-                marker.color.b = 0.0;
-                marker.color.a = 1.0;
-                # The FAR ID 
-                marker.id = 1
-            else:
-                return
-                    
-            # Add all the points to the POINTS marker, in XYZ coordinates
-            for detection in jointPacket.DetectionList:
-                # Compute the angle with maximal probability
-		AzAng = 0;
-               	if detection.ProbabilityAz0 >= detection.ProbabilityAz1:
-               	    AzAng=detection.AzimuthalAngle0;
- 		elif detection.ProbabilityAz1 > detection.ProbabilityAz0:
-                    AzAng=detection.AzimuthalAngle1;
-
-                # Convert the detection to XYZ coordinates
-	        f_X = math.cos(AzAng)*detection.Range;
-		# The y-axis is to the right of the radar, where our model has it to the left.
-		# Thus, we invert the y direction.
-                f_Y = -math.sin(AzAng)*detection.Range;
-		# For now, if the probability of false detection is greater than 0,
-		# we do not display the point.
-		
-                # The detection's elevation is not considered for now. 
-                # Eventually we will add using the elevation angle and Range.
-                # Add this point to the marker
-                f_Z = 0; 
-                # For now only display points that are not erroneous
-                # TODO: Filter using other parameters from the RDI
-                if detection.ProbabilityFalseDetection == 0: 
-                    marker.points.append(Point(f_X, f_Y, f_Z))
-
-            # Publish the POINTS marker to rvizPublisher, to batch display these points
-            rvizPublisher.publish(marker)
+    # rosudp stamps the header when it receives the datagram
+    handle_datagram(data.ip, data.data, data.header.stamp.to_sec())
+
+# Decode a datagram received from ip, publish it, and publish the collected frame to rviz.
+# Used both for UDPMsgs from rosudp and for datagrams read directly from the socket.
+# stamp is the time the datagram was received (seconds), or 0 if it is not known.
+def handle_datagram(ip, datagram, stamp = 0.0):
+    # Route the datagram to the publisher of the radar which sent it. Only publish data
+    # if it comes from a desired IP address.
+    arsPublisher = arsPublishers.get(ip)
+    if arsPublisher is None:
+        return
+    # Drop corrupted and truncated datagrams
+    if arsPublisher.validator is not None:
+        reason = arsPublisher.validator.check(datagram)
+        if reason is not None:
+            rospy.logwarn_throttle(10, 'Rejected a datagram from %s (%s)' % (ip, reason))
+            return
+    # Neither decode nor publish a status which repeats the last one
+    if arsPublisher.statusCache is not None and not arsPublisher.statusCache.wanted(datagram):
+        if arsPublisher.stats is not None:
+            arsPublisher.stats.addStatus(ars430_codec.StatusSqc(datagram))
+        return
+    if arsPublisher.stats is not None:
+        handle_datagram_timed(arsPublisher, datagram, stamp)
+        return
+
+    packet = arsPublisher.Unpack(datagram)
+    arsPublisher.publishNow(packet)
+    for jointPacket in arsPublisher.collect(packet):
+        publish_frame(arsPublisher, jointPacket)
+
+# Same as handle_datagram, but also counts the datagram and the time of every stage in the
+# radar's statistics. Only used when diagnostics are enabled.
+def handle_datagram_timed(arsPublisher, datagram, stamp):
+    stats = arsPublisher.stats
+    start = time.time()
+    packet = arsPublisher.Unpack(datagram)
+    decoded = time.time()
+    arsPublisher.publishNow(packet)
+    published = time.time()
+    frames = arsPublisher.collect(packet)
+    assembled = time.time()
+    for jointPacket in frames:
+        publish_frame(arsPublisher, jointPacket)
+    done = time.time()
+
+    stats.addPacket(packet)
+    stats.addLatency('decode', decoded - start)
+    stats.addLatency('publish', published - decoded)
+    stats.addLatency('assemble', assembled - published)
+    if frames:
+        stats.addFrames(len(frames))
+        stats.addLatency('frame', done - assembled)
+    if stamp > 0:
+        stats.addLatency('hop', start - stamp)
+        stats.addLatency('total', done - stamp)
+
+# Publish a collected frame as a point cloud, and convert every element of the packet
+# into XYZ marker and emit to rviz
+def publish_frame(arsPublisher, jointPacket):
+    arsPublisher.publishCloud(jointPacket)
+    arsPublisher.track(jointPacket)
+    arsPublisher.publishClusters(jointPacket)
+    publish_marker(arsPublisher, jointPacket)
+
+# Timer callback which publishes the frames whose missing packets are not worth waiting for
+def expire_frames(event):
+    for arsPublisher in arsPublishers.values():
+        frames = arsPublisher.expire()
+        for jointPacket in frames:
+            publish_frame(arsPublisher, jointPacket)
+        if frames and arsPublisher.stats is not None:
+            arsPublisher.stats.addFrames(len(frames))
+
+# Timer callback which publishes the statistics of every radar since the last call to
+# /diagnostics, one DiagnosticStatus per radar. A radar warns when it lost packets, sent none, or
+# sent datagrams which were rejected.
+def publish_diagnostics(event):
+    array = DiagnosticArray()
+    array.header.stamp = rospy.Time.now()
+    for ip, arsPublisher in sorted(arsPublishers.items()):
+        values = arsPublisher.stats.snapshot()
+        rejected = 0
+        if arsPublisher.validator is not None:
+            rejects = arsPublisher.validator.snapshot()
+            rejected = sum(rejects.values())
+            values.update(rejects)
+        if arsPublisher.statusCache is not None:
+            values['total skipped statuses'] = arsPublisher.statusCache.skipped
+        if arsPublisher.detectionFilter is not None:
+            values.update(arsPublisher.detectionFilter.snapshot())
+        if arsPublisher.tracker is not None:
+            values['tracks'] = len(arsPublisher.tracker)
+        status = DiagnosticStatus()
+        status.name = '%s: radar %s' % (rospy.get_name(), ip)
+        status.hardware_id = ip
+        if values['packets/s'] == 0:
+            status.level = DiagnosticStatus.WARN
+            status.message = 'No packets'
+        elif values['lost packets'] > 0:
+            status.level = DiagnosticStatus.WARN
+            status.message = '%d packets lost' % values['lost packets']
+        elif rejected > 0:
+            status.level = DiagnosticStatus.WARN
+            status.message = '%d datagrams rejected' % rejected
+        else:
+            status.level = DiagnosticStatus.OK
+            status.message = '%.0f packets/s' % values['packets/s']
+        status.values = [KeyValue(name, '%.6g' % value) for name, value in values.items()]
+        array.status.append(status)
+    diagnosticsPublisher.publish(array)
+
+# Convert every detection of a collected frame into XYZ coordinates and publish them to rviz
+# as one SPHERE_LIST marker
+def publish_marker(arsPublisher, jointPacket):
+    # Declare that we are using the global publisher object
+    global rvizPublisher
+    # rviz is rarely connected; then don't build the marker at all
+    if rvizPublisher.get_num_connections() == 0:
+        return
+
+    # Create a POINTS marker object with the correct header, frame name, id, etc
+    marker = Marker()
+    # frame_id is /map since that is the RVIZ default. Could be changed later.
+    marker.header.frame_id = "/map";
+    marker.header.stamp = rospy.Time.now();
+    marker.ns = arsPublisher.markerNs
+    # Create a list of points, so that RVIZ can batch display.
+    # Alternatively, this could be a SPHERE_LIST
+    marker.type = Marker.SPHERE_LIST
+    # rospy.Duration() means the points never get erased automatically
+    marker.lifetime = rospy.Duration(1) # 2 seconds max duration. rospy.Duration() will make it infinite.
+    marker.action = Marker.ADD
+    # The base of the radar is assumed to be at (0,0,0), facing the x direction
+    marker.pose.position.x = 0;
+    marker.pose.position.y = 0;
+    marker.pose.position.z = 0;
+    # No rotation on the radar
+    marker.pose.orientation.x = 0.0;
+    marker.pose.orientation.y = 0.0;
+    marker.pose.orientation.z = 0.0;
+    marker.pose.orientation.w = 1.0;
+    # Scale of the points, in meters. The radar has a resolution of 0.55m, so we make
+    # our points 0.5m wide to have a bit of a buffer.
+    marker.scale.x = 0.5;
+    marker.scale.y = 0.5;
+    marker.scale.z = 0.5;
+
+    # Distinguish NEAR and FAR points by colour.
+    if ars430_codec.IsNear(jointPacket): 
+        # NEAR points are yellow
+        marker.color.r = 1.0;
+        marker.color.g = 1.0;
+        marker.color.b = 0.0;
+        marker.color.a = 1.0;
+        # The NEAR ID 
+        marker.id = 0
+    elif ars430_codec.IsFar(jointPacket):
+        marker.color.r = 1.0;
+        marker.color.g = 0.0;
+        marker.color.b = 0.0;
+        marker.color.a = 1.0;
+        # The FAR ID 
+        marker.id = 1
+    else:
+        return
+            
+    # Add all the points to the POINTS marker, in XYZ coordinates
+    marker.points = [Point(f_X, f_Y, f_Z) for f_X, f_Y, f_Z in ars430_codec.MarkerPoints(jointPacket.DetectionList)]
+
+    # Publish the POINTS marker to rvizPublisher, to batch display these points
+    rvizPublisher.publish(marker)
+
+# Seconds between two checks of the datagrams the kernel dropped
+DROP_CHECK_INTERVAL = 1.0
+
+# Warn if the kernel dropped datagrams on sock since the last check. drops is the count at the
+# last check; returns the count now.
+def check_kernel_drops(sock, pool, drops):
+    total = kernel_drops(sock, pool)
+    if total != drops:
+        rospy.logwarn('The socket dropped %d datagrams; raise ~rcvbuf or ~batch_size' % (total - drops))
+    return total
+
+# Read datagrams straight from the radar's UDP socket and decode them in this process, instead of
+# receiving them as UDPMsgs from rosudp. Datagrams are drained batchSize at a time into reused
+# buffers and decoded from there without being copied. rcvbuf and timestamps set up the socket
+# (see rosudp.connection.configure_receive).
+def listen_udp(hostIP, mcastPort, mcastGrp, batchSize, timeout, rcvbuf = 0, timestamps = False):
+    sock = init_udp_connection(hostIP, mcastPort, mcastGrp, True, rcvbuf, timestamps)
+    sock.setblocking(0)
+    pool = ReceiveBufferPool(batchSize, timestamps = timestamps)
+    drops = kernel_drops(sock, pool)
+    lastCheck = time.time()
+
+    while not rospy.is_shutdown():
+        try:
+            count = recv_batch(sock, pool, timeout)
+            for i in range(count):
+                handle_datagram(pool.addrs[i][0], ars430_codec.DatagramView(pool.buffers[i], pool.sizes[i]),
+                                pool.stamps[i])
+        # Handle errors gracefully
+        except Exception as err:
+            rospy.logerr(err)
+        if time.time() - lastCheck >= DROP_CHECK_INTERVAL:
+            lastCheck = time.time()
+            drops = check_kernel_drops(sock, pool, drops)
+
+    # Close the socket connection
+    rospy.loginfo('Closing a connection to port ' + str(mcastPort))
+    sock.close()
+
+# Decode the datagrams of a capture file (see rosudp/scripts/capture_udp.py) as if they were received
+# now, speed times as fast as they were recorded (0: as fast as possible). start and duration select
+# the part of the capture to replay, in seconds from its start.
+def replay_capture(path, speed, start, duration):
+    reader = CaptureReader(path)
+    start = reader.start_time() + start
+    end = start + duration if duration > 0 else None
+    rospy.loginfo('Replaying %d datagrams of %s' % (len(reader), path))
+    for stamp, ip, port, datagram in paced(reader.records(start, end), speed):
+        if rospy.is_shutdown():
+            break
+        try:
+            handle_datagram(ip, datagram)
+        # Handle errors gracefully
+        except Exception as err:
+            rospy.logerr(err)
+    rospy.loginfo('Finished replaying ' + path)
+    reader.close()
+
+# Decode the datagrams of a shared-memory ring filled by the receiver of a pipeline node
+# (see run_pipeline). Runs in a worker process, which publishes the topics of its radars.
+def run_worker(ringPath, timeout):
+    ring = DatagramRing(ringPath)
+    parent = os.getppid()
+
+    # Stop when the receiver goes away, even if it could not stop this worker
+    while not rospy.is_shutdown() and os.getppid() == parent:
+        count = ring.wait(timeout)
+        try:
+            for i in range(count):
+                ip, datagram = ring.get(i)
+                handle_datagram(ip, datagram, ring.stamp(i))
+        # Handle errors gracefully
+        except Exception as err:
+            rospy.logerr(err)
+        finally:
+            ring.release(count)
+    ring.close()
+
+# Start a worker node decoding the datagrams of the given (ip, namespace) radars from the ring
+# at ringPath. The worker runs this script again, as a node of its own named <node>_worker_<k>,
+# and gets the settings which it needs from this node as private params.
+def start_worker(k, radars, ringPath, settings):
+    args = [sys.executable, os.path.abspath(__file__),
+            '__name:=%s_worker_%d' % (rospy.get_name().split('/')[-1], k),
+            '__ns:=' + rospy.get_namespace(),
+            '_mode:=worker', '_ring:=' + ringPath,
+            '_radars:=[%s]' % ', '.join('{ip: "%s", ns: "%s"}' % (ip, ns) for ip, ns in radars)]
+    args += ['_%s:=%s' % (name, value) for name, value in settings.items()]
+    return subprocess.Popen(args)
+
+# Receive datagrams in this process and decode them in worker processes. Each radar is handled
+# by exactly one of the workers, so the datagrams of a radar stay in order; datagrams reach the
+# workers through one shared-memory ring per worker. Only as many workers as radars are started.
+def run_pipeline(radars, workers, settings, hostIP, mcastPort, mcastGrp, batchSize, timeout, slots,
+                 rcvbuf = 0, timestamps = False):
+    rings = []
+    procs = []
+    # The ring of the worker which handles each radar
+    shards = {}
+    workers = max(1, min(workers, len(radars)))
+    try:
+        for k in range(workers):
+            ring = DatagramRing(os.path.join(ring_dir(), 'ars430_%d_%d.ring' % (os.getpid(), k)), slots, create = True)
+            rings.append(ring)
+            shard = radars[k::workers]
+            for ip, ns in shard:
+                shards[ip] = ring
+            procs.append(start_worker(k, shard, ring.path, settings))
+            rospy.loginfo('Worker %d decodes %s' % (k, ', '.join(ip for ip, ns in shard)))
+
+        sock = init_udp_connection(hostIP, mcastPort, mcastGrp, True, rcvbuf, timestamps)
+        sock.setblocking(0)
+        pool = ReceiveBufferPool(batchSize, timestamps = timestamps)
+        drops = 0
+        kernelDrops = kernel_drops(sock, pool)
+        lastCheck = time.time()
+        while not rospy.is_shutdown():
+            try:
+                count = recv_batch(sock, pool, timeout)
+                for i in range(count):
+                    # Only pass on data from the desired IP addresses
+                    ring = shards.get(pool.addrs[i][0])
+                    if ring is not None:
+                        ring.push(pool.views[i][:pool.sizes[i]], pool.addrs[i][0], True, pool.stamps[i])
+            # Handle errors gracefully
+            except Exception as err:
+                rospy.logerr(err)
+            # The receiver never waits for a worker; a full ring drops the datagram
+            total = sum(ring.drops() for ring in rings)
+            if total != drops:
+                rospy.logwarn('%d datagrams dropped because a worker fell behind' % (total - drops))
+                drops = total
+            if time.time() - lastCheck >= DROP_CHECK_INTERVAL:
+                lastCheck = time.time()
+                kernelDrops = check_kernel_drops(sock, pool, kernelDrops)
+
+        # Close the socket connection
+        rospy.loginfo('Closing a connection to port ' + str(mcastPort))
+        sock.close()
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+        for ring in rings:
+            ring.close()
+
+# Given the ~radars param, return a list of (ip, namespace) for every radar. Each entry of radars
+# is either an IP address or a dict with an 'ip' and an optional 'ns'. A single radar publishes under
+# ars430/ by default, as before; several radars publish under ars430/radar_<ip>/ by default.
+def radar_namespaces(radars):
+    namespaces = []
+    for radar in radars:
+        if isinstance(radar, dict):
+            ip, ns = radar['ip'], radar.get('ns')
+        else:
+            ip, ns = radar, None
+        if ns is None:
+            ns = 'ars430' if len(radars) == 1 else 'ars430/radar_' + ip.replace('.', '_')
+        namespaces.append((ip, ns))
+    return namespaces
 
 def listener():
     rospy.init_node('ars430', anonymous=True)
 
-    # Initialize a publisher and make it available to the callback function
-    global arsPublisher # modify the global variable
+    # Initialize the publishers and make them available to the callback function
     global rvizPublisher # modify the global rviz variable
-
-    # TODO: Take the IP as a param input
-    arsPublisher = ARS430Publisher('192.168.1.2', 'ars430/status', 'ars430/event')
+    global diagnosticsPublisher
+
+    # 'topic' listens to the UDPMsgs published by rosudp. 'udp' reads the radar's socket
+    # in this node, which skips the rosudp hop; rosudp is then not needed. 'pipeline' reads the
+    # socket in this node and decodes in ~workers worker processes ('worker' mode). 'replay' decodes
+    # the datagrams of the capture file ~capture at ~speed times the recorded rate.
+    mode = rospy.get_param('~mode', 'topic')
+    radars = radar_namespaces(rospy.get_param('~radars', ['192.168.1.2']))
+    hostIP = rospy.get_param('~host_ip', '192.168.1.30')
+    mcastPort = int(rospy.get_param('~mcast_port', 31122))
+    mcastGrp = rospy.get_param('~mcast_grp', '225.0.0.1')
+    batchSize = int(rospy.get_param('~batch_size', 16))
+    recvTimeout = float(rospy.get_param('~recv_timeout', RECV_TIMEOUT))
+    # Socket receive buffer in bytes (0 keeps the system default), and whether datagrams are
+    # stamped with their kernel receive time (for the 'hop' latency of the diagnostics)
+    rcvbuf = int(rospy.get_param('~rcvbuf', 0))
+    kernelTimestamps = rospy.get_param('~kernel_timestamps', False)
+
+    # Decode RadarDetection lists with NumPy unless told otherwise
+    batchDecode = rospy.get_param('~batch_decode', True)
+    # Collected frames are published as <ns>/points PointCloud2s in this frame
+    frameId = rospy.get_param('~frame_id', '/map')
+    # Events are published as ARS430Event on <ns>/event ('list'), as ARS430EventColumns on
+    # <ns>/event_columns ('columns'), or as both ('both')
+    eventFormat = rospy.get_param('~event_format', 'list')
+    # 'timestamp' emits a NEAR or FAR frame when the next scan starts. 'complete' emits it as soon as
+    # all of its packets arrived, or ~frame_timeout seconds after its first packet if one was lost.
+    # 'window' does the same for up to ~frame_window scans at a time, which may arrive interleaved,
+    # and holds at most ~max_detections detections per radar.
+    assemblerMode = rospy.get_param('~assembler', 'timestamp')
+    frameTimeout = float(rospy.get_param('~frame_timeout', ars430_codec.FRAME_TIMEOUT))
+    frameWindow = int(rospy.get_param('~frame_window', ars430_codec.FRAME_WINDOW))
+    maxDetections = int(rospy.get_param('~max_detections', ars430_codec.MAX_HELD_DETECTIONS))
+    # Every ~diagnostics_period seconds, publish per-radar rates, lost packets and stage latencies
+    # to /diagnostics. 0 disables the statistics, which then cost nothing.
+    diagnosticsPeriod = float(rospy.get_param('~diagnostics_period', 0.0))
+    # 'length' drops datagrams whose length does not match their header or contents, 'crc' also those
+    # whose E2E Length or CRC is wrong (with the Data ID ~e2e_data_id, if the radar is configured
+    # with one), 'off' decodes everything
+    validation = rospy.get_param('~validate', 'off')
+    dataId = int(rospy.get_param('~e2e_data_id', -1))
+    # Publish a status only when anything but its counters, time stamps and damping changed, or
+    # when the last one is ~status_heartbeat seconds old. 0 publishes every status.
+    statusHeartbeat = float(rospy.get_param('~status_heartbeat', 0.0))
+    # Rules of the detection filter (see ars430_codec.DetectionFilter), e.g.
+    # {reject_flags: [FalseDetectionFromSidelobe], min_snr: 12.0}. Empty keeps every detection.
+    filterRules = rospy.get_param('~filter', {})
+    # Track the targets of every radar and publish them to <ns>/tracks. A detection updates a track
+    # at most ~track_gate m away; a track is published after ~track_confirm_hits detections and
+    # deleted after ~track_max_misses frames without one.
+    tracking = rospy.get_param('~track', False)
+    trackGate = float(rospy.get_param('~track_gate', ars430_codec.TRACK_GATE))
+    trackConfirmHits = int(rospy.get_param('~track_confirm_hits', ars430_codec.TRACK_CONFIRM_HITS))
+    trackMaxMisses = int(rospy.get_param('~track_max_misses', ars430_codec.TRACK_MAX_MISSES))
+    # Cluster the detections of every frame and publish the clusters to <ns>/clusters. Detections
+    # within ~cluster_range_eps m, ~cluster_azimuth_eps rad and ~cluster_velocity_eps m/s (scaled
+    # together) are neighbours; a cluster grows from detections with ~cluster_min_points neighbours.
+    clustering = rospy.get_param('~cluster', False)
+    clusterRangeEps = float(rospy.get_param('~cluster_range_eps', ars430_codec.CLUSTER_RANGE_EPS))
+    clusterAzimuthEps = float(rospy.get_param('~cluster_azimuth_eps', ars430_codec.CLUSTER_AZIMUTH_EPS))
+    clusterVelocityEps = float(rospy.get_param('~cluster_velocity_eps', ars430_codec.CLUSTER_VELOCITY_EPS))
+    clusterMinPoints = int(rospy.get_param('~cluster_min_points', ars430_codec.CLUSTER_MIN_POINTS))
+
+    if mode == 'pipeline':
+        # This node only receives; the workers publish with the same settings
+        settings = {'batch_decode': batchDecode, 'frame_id': frameId, 'event_format': eventFormat,
+                    'assembler': assemblerMode, 'frame_timeout': frameTimeout, 'frame_window': frameWindow,
+                    'max_detections': maxDetections, 'diagnostics_period': diagnosticsPeriod,
+                    'validate': validation, 'e2e_data_id': dataId, 'status_heartbeat': statusHeartbeat,
+                    'filter': filterRules, 'track': tracking, 'track_gate': trackGate,
+                    'track_confirm_hits': trackConfirmHits, 'track_max_misses': trackMaxMisses,
+                    'cluster': clustering, 'cluster_range_eps': clusterRangeEps,
+                    'cluster_azimuth_eps': clusterAzimuthEps, 'cluster_velocity_eps': clusterVelocityEps,
+                    'cluster_min_points': clusterMinPoints}
+        run_pipeline(radars, int(rospy.get_param('~workers', 2)), settings, hostIP, mcastPort, mcastGrp,
+                     batchSize, recvTimeout, int(rospy.get_param('~ring_slots', RING_SLOTS)), rcvbuf,
+                     kernelTimestamps)
+        return
+
+    # One publisher (with its own topics and assembler) per radar served by this node
+    for ip, ns in radars:
+        markerNs = 'ars430_points' if ns == 'ars430' else ns.replace('ars430/', 'ars430_points/', 1)
+        eventTopic = ns + '/event' if eventFormat in ('list', 'both') else None
+        columnsTopic = ns + '/event_columns' if eventFormat in ('columns', 'both') else None
+        if assemblerMode == 'complete':
+            assembler = CompleteFrameAssembler(frameTimeout)
+        elif assemblerMode == 'window':
+            assembler = WindowedFrameAssembler(frameTimeout, frameWindow, maxDetections)
+        else:
+            assembler = FrameAssembler()
+        tracker = MultiTargetTracker(trackGate, trackConfirmHits, trackMaxMisses) if tracking else None
+        clusterer = DetectionClusterer(clusterRangeEps, clusterAzimuthEps, clusterVelocityEps,
+                                       clusterMinPoints) if clustering else None
+        arsPublishers[ip] = ARS430Publisher(ip, ns + '/status', eventTopic, batchDecode, markerNs,
+                                            ns + '/points', frameId, columnsTopic, assembler,
+                                            ns + '/tracks', tracker, ns + '/clusters', clusterer)
+        if validation in ('length', 'crc'):
+            arsPublishers[ip].validator = DatagramValidator(validation == 'crc', dataId if dataId >= 0 else None)
+        if statusHeartbeat > 0:
+            arsPublishers[ip].statusCache = StatusCache(statusHeartbeat)
+        if filterRules:
+            arsPublishers[ip].detectionFilter = DetectionFilter(filterRules)
+        rospy.loginfo('Publishing radar %s on %s/' % (ip, ns))
+
+    # Check for incomplete frames a few times per timeout
+    if assemblerMode in ('complete', 'window'):
+        rospy.Timer(rospy.Duration(frameTimeout / 4), expire_frames)
 
     # Publisher for displaying XYZ points in visualization tools
     rvizPublisher = rospy.Publisher('visualization_marker', Marker, queue_size = 5)
 
-    # Listen for UDPMsg types and call the callback function
-    rospy.Subscriber('rosudp/31122', UDPMsg, callback)
-
-    # spin() stops rospy from exiting until CTRL-C is done
-    rospy.spin()
+    if diagnosticsPeriod > 0:
+        for arsPublisher in arsPublishers.values():
+            arsPublisher.stats = RadarStats()
+        diagnosticsPublisher = rospy.Publisher('/diagnostics', DiagnosticArray, queue_size = 5)
+        rospy.Timer(rospy.Duration(diagnosticsPeriod), publish_diagnostics)
+
+    if mode == 'udp':
+        listen_udp(hostIP, mcastPort, mcastGrp, batchSize, recvTimeout, rcvbuf, kernelTimestamps)
+    elif mode == 'worker':
+        run_worker(rospy.get_param('~ring'), recvTimeout)
+    elif mode == 'replay':
+        replay_capture(rospy.get_param('~capture'), float(rospy.get_param('~speed', 1.0)),
+                       float(rospy.get_param('~start', 0.0)), float(rospy.get_param('~duration', 0.0)))
+    else:
+        # Listen for UDPMsg types and call the callback function
+        rospy.Subscriber('rosudp/31122', UDPMsg, callback)
+
+        # spin() stops rospy from exiting until CTRL-C is done
+        rospy.spin()
 
 if __name__ == '__main__':
     listener()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+# Fuse the point clouds of several ARS430 radars into one cloud in the vehicle frame. Every radar
+# is given by the namespace of its topics and its mount pose (m, rad) in ~radars, e.g.
+#   rosrun ars430 fuse_radars.py _radars:="[{ns: ars430/front, x: 3.6, z: 0.5},
+#                                          {ns: ars430/rear, x: -1.0, z: 0.5, yaw: 3.1416}]"
+# The <ns>/points clouds which the ars430 nodes publish within ~window seconds of each other are
+# published together to ars430/fused_points, in ~frame_id.
+
+###########
+# Imports #
+###########
+import rospy
+import roslib; roslib.load_manifest('ars430')
+from sensor_msgs.msg import PointCloud2, PointField
+
+import threading
+
+import numpy as np
+
+import ars430_codec
+from ars430_codec import FrameFusion, MountTransform, POINT_DTYPE
+
+# Fields of the fused points: the same as those of every radar's points
+CLOUD_FIELDS = ars430_codec.PointFieldList(PointField)
+# Mount pose params of a radar, in the order of MountTransform; each is 0 if not given
+MOUNT_PARAMS = ('x', 'y', 'z', 'roll', 'pitch', 'yaw')
+
+fusion = None
+fusionLock = threading.Lock()
+fusedPublisher = None
+frameId = None
+
+# Publish the fused POINT_DTYPE arrays, each stamped at its stamp (seconds)
+def publish_clouds(clouds):
+    for stamp, points in clouds:
+        fusedPublisher.publish(ars430_codec.PointsMsg(PointCloud2, points, CLOUD_FIELDS, frameId,
+                                                      rospy.Time.from_sec(stamp)))
+
+# Subscriber callback for the points of the radar ns. The cloud's data is read in place as a
+# POINT_DTYPE array; it is only copied once, into the fused cloud.
+def callback(msg, ns):
+    if msg.point_step != POINT_DTYPE.itemsize:
+        rospy.logwarn_throttle(10, 'Dropped a cloud of %s with %d-byte points' % (ns, msg.point_step))
+        return
+    points = np.frombuffer(msg.data, dtype = POINT_DTYPE, count = msg.width * msg.height)
+    # rospy calls the callbacks of different topics from different threads
+    with fusionLock:
+        clouds = fusion.add(ns, points, msg.header.stamp.to_sec())
+    publish_clouds(clouds)
+
+# Timer callback which publishes the window whose late frames are not worth waiting for
+def expire_windows(event):
+    with fusionLock:
+        clouds = fusion.expire(rospy.get_time())
+    publish_clouds(clouds)
+
+def listener():
+    global fusion, fusedPublisher, frameId
+    rospy.init_node('fuse_radars', anonymous=True)
+
+    radars = rospy.get_param('~radars', [{'ns': 'ars430'}])
+    frameId = rospy.get_param('~frame_id', 'base_link')
+    window = float(rospy.get_param('~window', ars430_codec.FUSION_WINDOW))
+    delay = float(rospy.get_param('~delay', ars430_codec.FUSION_DELAY))
+
+    # The rotation and translation of every radar are computed once, here
+    transforms = {}
+    for radar in radars:
+        transforms[radar['ns']] = MountTransform(*[float(radar.get(name, 0.0)) for name in MOUNT_PARAMS])
+    fusion = FrameFusion(transforms, window, delay)
+
+    fusedPublisher = rospy.Publisher('ars430/fused_points', PointCloud2, queue_size = 5)
+    for radar in radars:
+        rospy.Subscriber(radar['ns'] + '/points', PointCloud2, callback, radar['ns'], queue_size = 10)
+        rospy.loginfo('Fusing %s/points' % radar['ns'])
+
+    # Check for windows to emit a few times per window
+    rospy.Timer(rospy.Duration(window / 4), expire_windows)
+    rospy.spin()
+
+if __name__ == '__main__':
+    listener()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
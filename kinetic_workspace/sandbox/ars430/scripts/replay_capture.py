@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+# Replay a capture of radar traffic (see rosudp/scripts/capture_udp.py), at the rate it was
+# recorded, N times faster, or as fast as possible (--speed 0). Does not need ROS.
+#
+# By default the datagrams are decoded and assembled into frames in this process, with the same
+# ars430_codec code as the ars430 node, and the decode throughput is reported. With --udp they are
+# sent to a multicast group on the loopback interface instead, for a node started with
+# _host_ip:=127.0.0.1. Every radar is sent from its own loopback address, 127.0.0.<last byte of
+# its IP>, which must be given as the node's ~radars. The ars430 node can also replay a capture
+# itself, keeping the radars' addresses (_mode:=replay _capture:=<file>).
+#   rosrun ars430 replay_capture.py radar.cap --speed 10
+
+###########
+# Imports #
+###########
+import argparse
+import os
+import sys
+import time
+
+# Run from the source tree as well as from an installed package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'rosudp', 'src'))
+import ars430_codec
+from ars430_codec import FrameAssembler, CompleteFrameAssembler, WindowedFrameAssembler, DatagramValidator, REJECT_REASONS
+from rosudp.capture import CaptureReader, paced
+from rosudp.connection import init_loopback_sender
+
+# Seconds between two progress reports
+REPORT_INTERVAL = 5.0
+
+ASSEMBLERS = {'timestamp': FrameAssembler, 'complete': CompleteFrameAssembler, 'window': WindowedFrameAssembler}
+
+# Decode and assemble every record, one assembler per radar. validator (a DatagramValidator, or
+# None) drops the datagrams which are not intact. A datagram which cannot be decoded (an unknown
+# header ID, or a truncated packet) is counted and skipped, as the ars430 node does. Returns
+# (datagrams, frames, undecodable).
+def replay_decode(records, assemblerMode, batchDecode, validator):
+    assemblers = {}
+    datagrams = frames = undecodable = 0
+    for stamp, ip, port, data in records:
+        assembler = assemblers.get(ip)
+        if assembler is None:
+            assembler = assemblers[ip] = ASSEMBLERS[assemblerMode]()
+        if validator is not None and validator.check(data) is not None:
+            continue
+        try:
+            packet = ars430_codec.Unpack(data, batchDecode)
+        except Exception:
+            undecodable += 1
+            continue
+        # Frames time out against the capture's clock, not the wall clock
+        frames += len(assembler.add(packet, stamp)) + len(assembler.expire(stamp))
+        datagrams += 1
+    return datagrams, frames, undecodable
+
+# Send every record to (group, port) on the loopback interface, from the loopback address of
+# its radar. Returns (datagrams, 0).
+def replay_udp(records, group, port, ttl):
+    socks = {}
+    datagrams = 0
+    lastReport = time.time()
+    for stamp, ip, srcPort, data in records:
+        sock = socks.get(ip)
+        if sock is None:
+            source = '127.0.0.' + ip.split('.')[-1]
+            print('Sending the datagrams of %s from %s' % (ip, source))
+            sock = socks[ip] = init_loopback_sender(source, ttl)
+        sock.sendto(data, (group, port))
+        datagrams += 1
+        if time.time() - lastReport >= REPORT_INTERVAL:
+            lastReport = time.time()
+            print('%d datagrams sent' % datagrams)
+    for sock in socks.values():
+        sock.close()
+    return datagrams, 0
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Replay a capture of ARS430 traffic')
+    parser.add_argument('file', help = 'capture file written by capture_udp.py')
+    parser.add_argument('--speed', type = float, default = 1.0,
+                        help = 'multiple of the recorded rate; 0 replays as fast as possible')
+    parser.add_argument('--start', type = float, default = 0.0, help = 'seconds into the capture to start at')
+    parser.add_argument('--duration', type = float, default = None, help = 'seconds of the capture to replay')
+    parser.add_argument('--udp', action = 'store_true', help = 'send the datagrams instead of decoding them')
+    parser.add_argument('--mcast-grp', default = '225.0.0.1')
+    parser.add_argument('--mcast-port', type = int, default = 31122)
+    parser.add_argument('--ttl', type = int, default = 0, help = 'multicast TTL; 0 keeps the datagrams on this host')
+    parser.add_argument('--assembler', choices = sorted(ASSEMBLERS), default = 'timestamp')
+    parser.add_argument('--scalar-decode', action = 'store_true', help = 'decode detections without NumPy')
+    parser.add_argument('--validate', choices = ('off', 'length', 'crc'), default = 'off',
+                        help = 'drop datagrams whose length (and E2E CRC) is wrong, and count them')
+    parser.add_argument('--e2e-data-id', type = int, default = None, help = 'Data ID of the E2E CRC')
+    # rosrun and roslaunch may add remapping arguments
+    args = parser.parse_args([arg for arg in sys.argv[1:] if ':=' not in arg])
+
+    reader = CaptureReader(args.file)
+    start = reader.start_time() + args.start
+    end = start + args.duration if args.duration is not None else None
+    print('%s: %d datagrams, %.1f s' % (args.file, len(reader), reader.end_time() - reader.start_time()))
+
+    records = paced(reader.records(start, end), args.speed)
+    began = time.time()
+    try:
+        if args.udp:
+            datagrams, frames = replay_udp(records, args.mcast_grp, args.mcast_port, args.ttl)
+        else:
+            validator = None
+            if args.validate != 'off':
+                validator = DatagramValidator(args.validate == 'crc', args.e2e_data_id)
+            datagrams, frames, undecodable = replay_decode(records, args.assembler, not args.scalar_decode, validator)
+    except KeyboardInterrupt:
+        return
+    seconds = time.time() - began
+    rate = datagrams / seconds if seconds else 0
+    if args.udp:
+        print('%d datagrams sent in %.2f s (%.0f datagrams/s)' % (datagrams, seconds, rate))
+    else:
+        print('%d datagrams, %d frames in %.2f s (%.0f datagrams/s), %d undecodable datagrams skipped' %
+              (datagrams, frames, seconds, rate, undecodable))
+        if validator is not None:
+            print('Rejected: ' + ', '.join('%s %d' % (reason, validator.rejects[reason]) for reason in REJECT_REASONS))
+    reader.close()
+
+if __name__ == '__main__':
+    main()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
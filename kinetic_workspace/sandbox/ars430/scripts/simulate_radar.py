@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+# Simulate ARS430 radars on this host, for load testing rosudp and ars430 without a sensor.
+# Every radar sends a NEAR0-2 and a FAR0-1 scan per cycle, and a status message every
+# --status-period seconds, to a multicast group on the loopback interface. The radars send from
+# 127.0.0.2, 127.0.0.3, ..., so listen with _host_ip:=127.0.0.1 and give those as ~radars:
+#   rosrun ars430 simulate_radar.py --radars 2 --rate 20
+#   rosrun ars430 ars430.py _mode:=udp _host_ip:=127.0.0.1 _radars:="['127.0.0.2', '127.0.0.3']"
+# Does not need ROS.
+
+###########
+# Imports #
+###########
+import argparse
+import os
+import sys
+import time
+
+# Run from the source tree as well as from an installed package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'rosudp', 'src'))
+from ars430_codec.synth import RadarSimulator, CYCLE_TIME
+from rosudp.connection import init_loopback_sender
+
+# Seconds between two progress reports
+REPORT_INTERVAL = 5.0
+
+# Send the scans of every (simulator, socket) pair of radars to (group, port), rate cycles per
+# second, until duration seconds have passed (forever if None)
+def simulate(radars, group, port, rate, statusPeriod, duration):
+    period = 1.0 / rate
+    start = time.time()
+    nextCycle = start
+    nextStatus = start
+    lastReport = start
+    datagrams = cycles = late = 0
+    while duration is None or nextCycle - start < duration:
+        now = time.time()
+        if now < nextCycle:
+            time.sleep(nextCycle - now)
+        elif now - nextCycle > period:
+            # Sending takes longer than a cycle; count it and do not try to catch up
+            late += 1
+            nextCycle = now
+        sendStatus = nextCycle >= nextStatus
+        for simulator, sock in radars:
+            if sendStatus:
+                sock.sendto(simulator.status(nextCycle), (group, port))
+                datagrams += 1
+            for datagram in simulator.scan(nextCycle):
+                sock.sendto(datagram, (group, port))
+                datagrams += 1
+        if sendStatus:
+            nextStatus += statusPeriod
+        cycles += 1
+        nextCycle += period
+        if now - lastReport >= REPORT_INTERVAL:
+            print('%d cycles, %d datagrams sent (%.0f datagrams/s), %d late cycles' %
+                  (cycles, datagrams, datagrams / (now - start), late))
+            lastReport = now
+    return cycles, datagrams, late
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Send synthetic ARS430 traffic on the loopback interface')
+    parser.add_argument('--radars', type = int, default = 1, help = 'number of radars, sending from 127.0.0.2 on')
+    parser.add_argument('--rate', type = float, default = 1.0 / CYCLE_TIME, help = 'cycles per second')
+    parser.add_argument('--near-detections', type = int, default = 100, help = 'detections per NEAR scan (max 114)')
+    parser.add_argument('--far-detections', type = int, default = 60, help = 'detections per FAR scan (max 76)')
+    parser.add_argument('--status-period', type = float, default = 1.0, help = 'seconds between status messages')
+    parser.add_argument('--duration', type = float, default = None, help = 'seconds to run for')
+    parser.add_argument('--mcast-grp', default = '225.0.0.1')
+    parser.add_argument('--mcast-port', type = int, default = 31122)
+    parser.add_argument('--ttl', type = int, default = 0, help = 'multicast TTL; 0 keeps the datagrams on this host')
+    parser.add_argument('--seed', type = int, default = None, help = 'seed of the random detections')
+    # rosrun and roslaunch may add remapping arguments
+    args = parser.parse_args([arg for arg in sys.argv[1:] if ':=' not in arg])
+
+    radars = []
+    for k in range(args.radars):
+        ip = '127.0.0.%d' % (2 + k)
+        simulator = RadarSimulator(args.near_detections, args.far_detections, 1.0 / args.rate,
+                                   None if args.seed is None else args.seed + k, ('ARS430-SIM-' + ip).encode('ascii'))
+        radars.append((simulator, init_loopback_sender(ip, args.ttl)))
+        print('Simulating a radar at %s' % ip)
+
+    try:
+        cycles, datagrams, late = simulate(radars, args.mcast_grp, args.mcast_port, args.rate,
+                                           args.status_period, args.duration)
+        print('%d cycles, %d datagrams sent, %d late cycles' % (cycles, datagrams, late))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for simulator, sock in radars:
+            sock.close()
+
+if __name__ == '__main__':
+    main()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+
+# Installs the ROS-free ars430_codec library, e.g. with `pip install ./ars430`.
+# The ROS node does not need this; roslib.load_manifest('ars430') puts src/ on the path.
+from setuptools import setup
+
+setup(name='ars430_codec',
+      version='0.1.0',
+      description='Decoder for the UDP datagrams of the Continental ARS430 radar',
+      author='Adan Moran-MacDonald',
+      license='BSD',
+      package_dir={'': 'src'},
+      packages=['ars430_codec'],
+      install_requires=['numpy', 'enum34; python_version < "3.4"'])
@@ -0,0 +1,22 @@
+# ROS-free codec for the Continental ARS430 radar. It decodes the radar's UDP datagrams into
+# plain Python/NumPy frames and assembles NEAR/FAR packets into frames, so the same code can be
+# used by the ars430 ROS node and by offline tools that run without ROS.
+
+from ars430_codec.frames import (Detection, DetectionArray, EmptyDetections, StatusFrame, EventFrame,
+                                 DETECTION_FIELDS, DETECTION_DTYPE, PDH0_FLAG_FIELDS)
+from ars430_codec.codec import (Headers, DatagramView, FindHeader, Unpack, UnpackStatus, UnpackEvent,
+                                UnpackRadarDetections, UnpackRadarDetectionsBatch, IsStatus, IsNear, IsFar)
+from ars430_codec.assembler import (CombineEvents, FrameAssembler, CompleteFrameAssembler, WindowedFrameAssembler,
+                                    FRAME_TIMEOUT, FRAME_WINDOW, MAX_HELD_DETECTIONS)
+from ars430_codec.geometry import BestAzimuth, PolarToXYZ, LineOfSight, DetectionsToXYZ, MarkerPoints
+from ars430_codec.pointcloud import (CloudArray, PointFields, PointFieldList, PointsMsg, POINT_DTYPE, TAG_NEAR,
+                                     TAG_FAR)
+from ars430_codec.stats import LatencyHistogram, SequenceTracker, RadarStats, STAGES
+from ars430_codec.validate import Validate, ValidateBatch, DatagramValidator, E2ECrc, REJECT_REASONS
+from ars430_codec.status import StatusCache, StatusSqc
+from ars430_codec.filters import DetectionFilter, FILTER_RULES
+from ars430_codec.fusion import RotationMatrix, MountTransform, FrameFusion, FUSION_WINDOW, FUSION_DELAY
+from ars430_codec.tracker import (Associate, MultiTargetTracker, TRACK_DTYPE, TRACK_GATE, TRACK_CONFIRM_HITS,
+                                  TRACK_MAX_MISSES)
+from ars430_codec.clustering import (ClusterLabels, DetectionClusterer, CLUSTER_DTYPE, CLUSTER_RANGE_EPS,
+                                     CLUSTER_AZIMUTH_EPS, CLUSTER_VELOCITY_EPS, CLUSTER_MIN_POINTS)
@@ -0,0 +1,312 @@
+# Collects the NEAR and FAR event packets of one radar scan into a single frame.
+
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from ars430_codec.codec import Headers, IsStatus, IsNear
+from ars430_codec.frames import EventFrame
+
+# Event packets the radar sends in every NEAR and every FAR scan
+NEAR_EVENT_TYPES = frozenset((Headers.NEAR0.value, Headers.NEAR1.value, Headers.NEAR2.value))
+FAR_EVENT_TYPES = frozenset((Headers.FAR0.value, Headers.FAR1.value))
+# Seconds to wait for the missing packets of a scan before emitting what arrived
+FRAME_TIMEOUT = 0.1
+# Scans a WindowedFrameAssembler receives at the same time, and the detections it may hold
+FRAME_WINDOW = 4
+MAX_HELD_DETECTIONS = 2048
+
+# Combine a list of event packets from the same scan into one EventFrame. The fields are taken
+# from packet (the packet which triggered the emission, or the last packet of the scan), except
+# for NofDet, DetInPack and the DetectionList. We don't set CRC or Len since they don't often match.
+def CombineEvents(packet, packetList):
+    combinedPacket = EventFrame()
+    combinedPacket.sourceIP = packet.sourceIP
+    combinedPacket.EventType = packet.EventType
+    combinedPacket.SQC = packet.SQC
+    combinedPacket.MessageCounter = packet.MessageCounter
+    combinedPacket.UtcTimeStamp = packet.UtcTimeStamp
+    combinedPacket.TimeStamp = packet.TimeStamp
+    combinedPacket.MeasureCounter = packet.MeasureCounter
+    combinedPacket.CycleCounter = packet.CycleCounter
+    combinedPacket.NofDet = packetList[0].NofDet
+    combinedPacket.Vambig = packet.Vambig
+    combinedPacket.DetInPack = sum(event.DetInPack for event in packetList)
+    combinedPacket.DetectionList = np.concatenate([event.DetectionList for event in packetList])
+    return combinedPacket
+
+# Assembles NEAR and FAR packets for one radar, keyed by their internal timestamp
+class FrameAssembler(object):
+    def __init__(self):
+        self.nearPackets = []
+        self.farPackets = []
+
+    # Given an event packet and a list of previous events, do the following:
+    # * if the list is empty, save the packet to the list and return nothing
+    # * if the packet has the same timestamp as everything in the list, save the packet and return nothing
+    # * if the packet has a different timestamp than everything in the list, return the list,
+    #      then overwrite the list with the inputted packet.
+    def __storeEvent(self, event, previousEventList):
+        # If the list is empty, save the packet
+        if not previousEventList:
+            previousEventList.append(event)
+            return []
+
+        # The list is not empty; we need to compare the timestamp of the packet with the
+        # timestamp of the list. For simplicity, we will only take the last element of the list
+        # to compare timestamps.
+
+        # If the timestamps match, just save the packet
+        if previousEventList[-1].TimeStamp == event.TimeStamp:
+            previousEventList.append(event)
+            return []
+
+        # Since the timestamps don't match, now we need to return the previous list
+        # and overwrite it with a new packet
+        # 1. copy the previous list over
+        packetList = list(previousEventList)
+        # 2. clear the previous list
+        del previousEventList[:]
+        # 3. overwrite with the new packet
+        previousEventList.append(event)
+        # 4. return the copy of the old list
+        return packetList
+
+    # Given any event type packet, this will collect NEAR and FAR packages
+    # together so long as they have the same internal timestamp. It will wait until
+    # a packet of the same type with a new timestamp appears, and then return the previous list all at once.
+    # Returns (wasPublished, packet) where
+    # * wasPublished = true if a new collected packet list was returned
+    # * packets = the new combined packet containing all detections for this timestamp (or a status packet)
+    def collect(self, packet):
+        # status messages are returned immediately
+        if IsStatus(packet):
+            return (False, packet)
+
+        # don't do anything if there were no detections in this packet. We don't care.
+        if packet.DetInPack == 0:
+            return (False, packet)
+
+        # Save the package to the relevant list of packages.
+        packetList = []
+        if IsNear(packet):
+            packetList = self.__storeEvent(packet, self.nearPackets)
+        else:
+            packetList = self.__storeEvent(packet, self.farPackets)
+
+        # If the packet list is empty, then the storePacket function just saved the packet. This means
+        # the packet should not be combined for anything else.
+        if not packetList:
+            return (False, packet)
+
+        # If the packet list is NOT empty, then we have started a new list and are supposed to
+        # emit this one. Let's collect all the packets together into one event and return it for whatever we need.
+        return (True, CombineEvents(packet, packetList))
+
+    # Same as collect, but returns the list of frames to emit (at most one here)
+    def add(self, packet, now = None):
+        collected, frame = self.collect(packet)
+        return [frame] if collected else []
+
+    # Frames are only emitted by the next scan, so nothing ever times out
+    def expire(self, now = None):
+        return []
+
+# The packets of one NEAR or FAR scan which an assembler has received so far
+class PendingFrame(object):
+    __slots__ = ('key', 'near', 'packets', 'detections', 'eventTypes', 'started')
+
+    def __init__(self, key, near, now):
+        self.key = key
+        self.near = near
+        self.packets = []
+        self.detections = 0
+        self.eventTypes = set()
+        self.started = now
+
+    # Add a packet of this scan. Packets without detections count towards completeness,
+    # but add nothing to the frame.
+    def add(self, packet):
+        self.eventTypes.add(packet.EventType)
+        if packet.DetInPack > 0:
+            self.packets.append(packet)
+            self.detections += packet.DetInPack
+
+    # A scan is complete when its packets hold NofDet detections, or when all of its
+    # NEAR0-2 (FAR0-1) packets have arrived
+    def isComplete(self):
+        if self.packets and self.detections >= self.packets[0].NofDet:
+            return True
+        return (NEAR_EVENT_TYPES if self.near else FAR_EVENT_TYPES) <= self.eventTypes
+
+    # The combined frame of the scan, or None if it has no detections
+    def frame(self):
+        if not self.packets:
+            return None
+        return CombineEvents(self.packets[-1], self.packets)
+
+# Assembles NEAR and FAR packets for one radar, and emits a scan's frame as soon as it is complete:
+# when its packets hold NofDet detections, or when all NEAR0-2 (FAR0-1) packets have arrived.
+# A scan which is still incomplete after timeout seconds (a packet was lost) is emitted by expire,
+# or when a packet of the next scan arrives. This saves the radar cycle which FrameAssembler waits
+# for the next scan.
+class CompleteFrameAssembler(object):
+    def __init__(self, timeout = FRAME_TIMEOUT):
+        self.timeout = timeout
+        # The scan being received and the TimeStamp of the last emitted scan, for NEAR (True) and FAR (False)
+        self.pending = {True: None, False: None}
+        self.lastEmitted = {True: None, False: None}
+        # Frames emitted complete, emitted incomplete (on timeout or because the next scan started),
+        # and packets dropped because their scan had already been emitted
+        self.completeFrames = 0
+        self.incompleteFrames = 0
+        self.latePackets = 0
+
+    # Add an event packet, and return the list of frames which are ready to be emitted
+    def add(self, packet, now = None):
+        if IsStatus(packet):
+            return []
+        if now is None:
+            now = time.time()
+        near = IsNear(packet)
+        frames = []
+
+        # A packet of a scan which was emitted already comes too late to be part of it
+        if packet.TimeStamp == self.lastEmitted[near]:
+            self.latePackets += 1
+            return frames
+
+        pending = self.pending[near]
+        if pending is not None and pending.key != packet.TimeStamp:
+            # The next scan started before this one was complete
+            frames += self.__emit(near, False)
+            pending = None
+        if pending is None:
+            pending = self.pending[near] = PendingFrame(packet.TimeStamp, near, now)
+
+        pending.add(packet)
+        if pending.isComplete():
+            frames += self.__emit(near, True)
+        return frames
+
+    # Return the frames of the scans which have waited for more than timeout seconds
+    def expire(self, now = None):
+        if now is None:
+            now = time.time()
+        frames = []
+        for near in (True, False):
+            pending = self.pending[near]
+            if pending is not None and now - pending.started >= self.timeout:
+                frames += self.__emit(near, False)
+        return frames
+
+    # Stop waiting for the pending scan of a group, and return its frame (if it has detections)
+    def __emit(self, near, complete):
+        pending = self.pending[near]
+        self.pending[near] = None
+        self.lastEmitted[near] = pending.key
+        frame = pending.frame()
+        if frame is None:
+            return []
+        if complete:
+            self.completeFrames += 1
+        else:
+            self.incompleteFrames += 1
+        return [frame]
+
+# Assembles NEAR and FAR packets for one radar like CompleteFrameAssembler, but keys the scans by
+# MeasureCounter and CycleCounter and receives up to window scans at the same time, so packets
+# which arrive late or interleaved with the next scan still join their own frame. Adding a packet
+# is O(1), and the memory held is bounded:
+# * when a new scan does not fit in the window, the oldest scan is emitted incomplete (evicted)
+# * when the scans would hold more than maxDetections detections, the oldest scans are emitted
+#   incomplete until the packet fits (overflow)
+# * packets of scans which were emitted recently, and repeated packets, are dropped
+class WindowedFrameAssembler(object):
+    def __init__(self, timeout = FRAME_TIMEOUT, window = FRAME_WINDOW, maxDetections = MAX_HELD_DETECTIONS):
+        self.timeout = timeout
+        self.window = window
+        self.maxDetections = maxDetections
+        # Scans being received, oldest first, and the keys of the last emitted scans
+        self.pending = OrderedDict()
+        self.emitted = OrderedDict()
+        self.heldDetections = 0
+        # Frames emitted complete, emitted incomplete after timeout, emitted incomplete to make
+        # room in the window or under maxDetections, and packets dropped as late, repeated, or
+        # because their scan alone would hold more than maxDetections
+        self.completeFrames = 0
+        self.timedOutFrames = 0
+        self.evictedFrames = 0
+        self.overflowFrames = 0
+        self.latePackets = 0
+        self.duplicatePackets = 0
+        self.overflowPackets = 0
+
+    # Add an event packet, and return the list of frames which are ready to be emitted
+    def add(self, packet, now = None):
+        if IsStatus(packet):
+            return []
+        if now is None:
+            now = time.time()
+        near = IsNear(packet)
+        key = (near, packet.MeasureCounter, packet.CycleCounter)
+        frames = []
+
+        if key in self.emitted:
+            self.latePackets += 1
+            return frames
+
+        pending = self.pending.get(key)
+        if pending is None:
+            while len(self.pending) >= self.window:
+                self.evictedFrames += self.__emitOldest(frames)
+            pending = self.pending[key] = PendingFrame(key, near, now)
+        elif packet.EventType in pending.eventTypes:
+            self.duplicatePackets += 1
+            return frames
+
+        while self.heldDetections + packet.DetInPack > self.maxDetections and \
+                next(iter(self.pending)) != key:
+            self.overflowFrames += self.__emitOldest(frames)
+        if self.heldDetections + packet.DetInPack > self.maxDetections:
+            # This scan alone holds too many detections
+            self.overflowPackets += 1
+            return frames
+
+        pending.add(packet)
+        self.heldDetections += packet.DetInPack
+        if pending.isComplete():
+            self.completeFrames += self.__emit(key, frames)
+        return frames
+
+    # Return the frames of the scans which have waited for more than timeout seconds
+    def expire(self, now = None):
+        if now is None:
+            now = time.time()
+        frames = []
+        # Scans are kept in the order they started, so only the oldest ones can time out
+        while self.pending and now - next(iter(self.pending.values())).started >= self.timeout:
+            self.timedOutFrames += self.__emitOldest(frames)
+        return frames
+
+    # Emit the scan which started first
+    def __emitOldest(self, frames):
+        return self.__emit(next(iter(self.pending)), frames)
+
+    # Stop waiting for the scan with the given key, and append its frame (if it has detections)
+    # to frames. Returns the number of frames appended.
+    def __emit(self, key, frames):
+        pending = self.pending.pop(key)
+        self.heldDetections -= pending.detections
+        self.emitted[key] = True
+        # Remember enough scans to recognize the late packets of the window
+        while len(self.emitted) > 2 * self.window:
+            self.emitted.popitem(last = False)
+        frame = pending.frame()
+        if frame is None:
+            return 0
+        frames.append(frame)
+        return 1
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,113 @@
+# DBSCAN clustering of the detections of a collected frame, in range, azimuth and radial velocity.
+# Each of the three is divided by its own eps, so two detections are neighbours when the distance
+# of their scaled (range, azimuth, velocity) is at most 1. The neighbours of all detections are
+# found at once through a hash grid of unit cells (see grid.py), so a frame takes time linear in
+# its detections rather than quadratic, and the clusters are then labelled with NumPy.
+
+import numpy as np
+
+from ars430_codec.codec import IsNear
+from ars430_codec.geometry import BestAzimuth, DetectionsToXYZ
+from ars430_codec.grid import NeighbourPairs
+from ars430_codec.pointcloud import TAG_NEAR, TAG_FAR
+
+# Differences of range (m), azimuth (rad) and radial velocity (m/s) which, each on its own, make
+# two detections just neighbours
+CLUSTER_RANGE_EPS = 1.0
+CLUSTER_AZIMUTH_EPS = 0.03
+CLUSTER_VELOCITY_EPS = 0.5
+# Neighbours (counting the detection itself) which make a detection a core point of a cluster
+CLUSTER_MIN_POINTS = 2
+
+# A cluster as reported (and published as a PointCloud2): the centroid of its detections and the
+# size of their bounding box in the radar frame, their mean radial velocity, their number, and
+# the scan (TAG_NEAR or TAG_FAR) they came from
+CLUSTER_DTYPE = np.dtype({
+    'names': ['x', 'y', 'z', 'size_x', 'size_y', 'size_z', 'radial_velocity', 'count', 'tag'],
+    'formats': ['<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<f4', '<u2', 'u1'],
+    'offsets': [0, 4, 8, 12, 16, 20, 24, 28, 30],
+    'itemsize': 32,
+})
+
+# Label the (n, d) points with DBSCAN, where points at most 1 apart are neighbours and a point
+# with at least minPoints neighbours (counting itself) is a core point. Returns the cluster
+# (0, 1, ...) of every point, or -1 for noise. Core points which are neighbours share a cluster;
+# a border point (a neighbour of a core point, but not one itself) joins the cluster of one of them.
+def ClusterLabels(points, minPoints = CLUSTER_MIN_POINTS):
+    count = len(points)
+    labels = np.full(count, -1, dtype=np.intp)
+    # Pairs in both directions, and every point with itself; grouped by the first point
+    pairFirst, pairSecond = NeighbourPairs(points, points, 1.0)[:2]
+    core = np.bincount(pairFirst, minlength=count) >= minPoints
+    if not core.any():
+        return labels
+
+    # Connected components of the core points: every core point repeatedly takes the smallest
+    # label of its core neighbours, then follows its label to that point's label (pointer jumping),
+    # until nothing changes. Since the pairs are grouped, the smallest label of the neighbours of
+    # every point is one np.minimum.reduceat.
+    coreEdges = core[pairFirst] & core[pairSecond]
+    first, second = pairFirst[coreEdges], pairSecond[coreEdges]
+    starts = np.flatnonzero(np.concatenate(([True], first[1:] != first[:-1])))
+    heads = first[starts]
+    roots = np.arange(count)
+    while True:
+        joined = roots.copy()
+        joined[heads] = np.minimum(roots[heads], np.minimum.reduceat(roots[second], starts))
+        joined = joined[joined]
+        if np.array_equal(joined, roots):
+            break
+        roots = joined
+
+    # Number the clusters in the order of their roots, and add the border points
+    labels[core] = np.unique(roots[core], return_inverse=True)[1]
+    border = ~core[pairFirst] & core[pairSecond]
+    labels[pairFirst[border]] = labels[pairSecond[border]]
+    return labels
+
+# Clusters the detections of collected frames; the detections of a frame which are in no cluster
+# are dropped.
+class DetectionClusterer(object):
+    def __init__(self, rangeEps = CLUSTER_RANGE_EPS, azimuthEps = CLUSTER_AZIMUTH_EPS,
+                 velocityEps = CLUSTER_VELOCITY_EPS, minPoints = CLUSTER_MIN_POINTS):
+        if min(rangeEps, azimuthEps, velocityEps) <= 0:
+            raise ValueError('The eps of the range, azimuth and radial velocity must be positive')
+        self.scales = np.array([1.0 / rangeEps, 1.0 / azimuthEps, 1.0 / velocityEps])
+        self.minPoints = minPoints
+
+    # Scaled (range, azimuth, radial velocity) of every detection of a DETECTION_DTYPE array, as an (n, 3) array
+    def features(self, detections):
+        features = np.empty((len(detections), 3))
+        features[:, 0] = detections['Range']
+        features[:, 1] = BestAzimuth(detections)
+        features[:, 2] = detections['RelativeRadialVelocity']
+        features *= self.scales
+        return features
+
+    # Return the clusters of a collected EventFrame as a CLUSTER_DTYPE array. The sums, minima and
+    # maxima of all clusters are each taken with one reduceat over the detections sorted by cluster.
+    def clusterFrame(self, frame):
+        detections = frame.DetectionList
+        labels = ClusterLabels(self.features(detections), self.minPoints)
+        clustered = np.flatnonzero(labels >= 0)
+        order = clustered[np.argsort(labels[clustered], kind='mergesort')]
+        sortedLabels = labels[order]
+        clusters = np.zeros(len(np.unique(sortedLabels)), dtype=CLUSTER_DTYPE)
+        if len(clusters) == 0:
+            return clusters
+        starts = np.flatnonzero(np.concatenate(([True], sortedLabels[1:] != sortedLabels[:-1])))
+        counts = np.diff(np.concatenate((starts, [len(order)])))
+
+        xyz = DetectionsToXYZ(detections[order])
+        centroids = np.add.reduceat(xyz, starts) / counts[:, None]
+        sizes = np.maximum.reduceat(xyz, starts) - np.minimum.reduceat(xyz, starts)
+        for axis, name in enumerate('xyz'):
+            clusters[name] = centroids[:, axis]
+            clusters['size_' + name] = sizes[:, axis]
+        velocities = detections['RelativeRadialVelocity'][order].astype(np.float64)
+        clusters['radial_velocity'] = np.add.reduceat(velocities, starts) / counts
+        clusters['count'] = np.minimum(counts, np.iinfo(np.uint16).max)
+        clusters['tag'] = TAG_NEAR if IsNear(frame) else TAG_FAR
+        return clusters
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,293 @@
+# Decoder for the datagrams emitted by an ARS430 radar. This module does not depend on ROS;
+# it turns a datagram into a StatusFrame or EventFrame (see frames.py).
+
+import struct
+import math
+import numpy as np
+from enum import Enum
+
+from ars430_codec.frames import Detection, DetectionArray, EmptyDetections, StatusFrame, EventFrame, DETECTION_DTYPE
+
+# Enumerator defining the ARS430 header types
+class Headers(Enum):
+    STATUS = 5
+    FAR0   = 0
+    FAR1   = 1
+    NEAR0  = 2
+    NEAR1  = 3
+    NEAR2  = 4
+
+# The ARS430 has a header length of 16 bytes
+HEADER_LEN = 16
+# The headers in byte format (hexadecimal)
+STATUS_HEADER_BYTES = b'\x00\xc8\x00\x00'
+FAR0_HEADER_BYTES   = b'\x00\xdc\x00\x01'
+FAR1_HEADER_BYTES   = b'\x00\xdc\x00\x02'
+NEAR0_HEADER_BYTES  = b'\x00\xdc\x00\x03'
+NEAR1_HEADER_BYTES  = b'\x00\xdc\x00\x04'
+NEAR2_HEADER_BYTES  = b'\x00\xdc\x00\x05'
+
+# Header ID -> header type, keyed by the header ID read as a big-endian uint32.
+# FindHeader does one dict lookup instead of comparing strings one by one.
+HEADER_TYPES = dict((struct.unpack("!L", headerBytes)[0], headerType) for headerBytes, headerType in (
+    (STATUS_HEADER_BYTES, Headers.STATUS),
+    (FAR0_HEADER_BYTES,   Headers.FAR0),
+    (FAR1_HEADER_BYTES,   Headers.FAR1),
+    (NEAR0_HEADER_BYTES,  Headers.NEAR0),
+    (NEAR1_HEADER_BYTES,  Headers.NEAR1),
+    (NEAR2_HEADER_BYTES,  Headers.NEAR2)))
+
+# Other global information
+RADAR_DETECTION_START = 32 # byte value of Event data at which the RadarDetection list begins
+RADAR_DETECTION_PACKAGE_LENGTH = 28 # number of bytes in one element of RadarDetection list
+SERIAL_NUMBER_START = 29 # byte value of StatusData where SerialNumber begins
+SERIAL_NUMBER_LENGTH = 26 # number of bytes in the SerialNumber of Status data
+
+# Precompiled layouts. Every field is read with unpack_from at an offset into the datagram,
+# so nothing is sliced (copied) before it is decoded.
+HEADER_STRUCT = struct.Struct("!LL")                     # header ID, E2E length; [8:16] is not used
+STATUS_STRUCT = struct.Struct("!HHBQQQ%dsBBBLBBBLQLLBBBBBBBBHH" % SERIAL_NUMBER_LENGTH)
+EVENT_STRUCT = struct.Struct("!HHBBQLLLHhBB")
+RADAR_DETECTION_STRUCT = struct.Struct("!HhhhhhhBBHHHHHBB")
+
+# Wire layout of one element of the RadarDetection list. This is the same layout as the
+# "!HhhhhhhBBHHHHHBB" struct format, so a whole list can be read with one np.frombuffer call.
+RADAR_DETECTION_DTYPE = np.dtype([('f_Range', '>u2'), ('f_VrelRad', '>i2'), ('f_AzAng0', '>i2'),
+                                  ('f_AzAng1', '>i2'), ('f_ElAng', '>i2'), ('f_RCS0', '>i2'),
+                                  ('f_RCS1', '>i2'), ('f_Prob0', 'u1'), ('f_Prob1', 'u1'),
+                                  ('f_RangeVar', '>u2'), ('f_VrelRadVar', '>u2'), ('f_AzAngVar0', '>u2'),
+                                  ('f_AzAngVar1', '>u2'), ('f_ElAngVar', '>u2'), ('f_Pdh0', 'u1'),
+                                  ('f_SNR', 'u1')])
+# Scale factors applied by UnpackRadarDetections, one per RADAR_DETECTION_DTYPE field.
+# Each physical value is (raw + offset) / divisor * multiplier, in that order, so the
+# batch decoder gives the same values as the scalar decoder.
+RADAR_DETECTION_OFFSETS = np.array([0.0]*15 + [110.0])
+RADAR_DETECTION_DIVISORS = np.array([65534.0]*7 + [254.0]*2 + [65534.0]*5 + [254.0, 10.0])
+RADAR_DETECTION_MULTIPLIERS = np.array([300.0, 300.0] + [2*math.pi]*3 + [200.0, 200.0] +
+                                       [1.0, 1.0, 10.0, 10.0] + [1.0]*5)
+# Below this many detections, the fixed cost of the batch decoder is higher than the scalar loop
+BATCH_DECODE_MIN_DETECTIONS = 8
+# Bits of f_Pdh0, in the order of the boolean flags of RadarDetection
+PDH0_FLAG_BITS = np.array([0b0000001, 0b0000010, 0b0000100, 0b0001000, 0b0010000, 0b0100000, 0b1000000], dtype=np.uint8)
+
+# Return a view of the first length bytes of buf (e.g. a reused receive buffer) that the
+# decoder can read without copying. numpy on Python 2 only accepts old-style buffers.
+try:
+    _buffer = buffer
+    def DatagramView(buf, length):
+        return _buffer(buf, 0, length)
+except NameError:
+    def DatagramView(buf, length):
+        return memoryview(buf)[:length]
+
+# Find the header in the datagram, and return a Headers enum corresponding to that header type
+# (or None if the header is not known)
+def FindHeader(data):
+    headerID, e2eLength = HEADER_STRUCT.unpack_from(data, 0)
+    return HEADER_TYPES.get(headerID)
+
+# Unpack a status-type message emitted by an ARS430 radar. The status data starts at offset
+# bytes into statusData.
+def UnpackStatus(statusData, offset=0):
+    def merge24(int8_part1, int8_part2, int8_part3):
+        merged = (int8_part1 << 16) | (int8_part2 << 8) | int8_part3
+        return merged
+    # Unpack the statusData into a StatusFrame. The serial number is an array of uint8s,
+    # which STATUS_STRUCT reads as one string.
+    (_CRC, _Len, _SQC, _PartNumber, _AssemblyPartNumber, _SWPartNumber, _SerialNumber,
+     _BLVersion1, _BLVersion2,
+     _BLVersion3, _BLCRC, _SWVersion1, _SWVersion2,_SWVersion3, _SWCRC, _UtcTimeStamp, _TimeStamp, _CurrentDamping,
+     _OpState, _CurrentFarCF, _CurrentNearCF, _Defective, _SupplVoltLimit, _SensorOffTemp, _GmMissing, _TxOutReduced,
+     _MaximumRangeFar, _MaximumRangeNear
+     ) = STATUS_STRUCT.unpack_from(statusData, offset)
+    # Merge the 24-byte objects together
+    _SWVersion = merge24(_SWVersion1, _SWVersion2, _SWVersion3)
+    _BLVersion = merge24(_BLVersion1, _BLVersion2, _BLVersion3)
+
+    # Copy the data over into the StatusFrame object
+    packet = StatusFrame()
+    packet.EventType = Headers.STATUS.value                                                 # (custom by us, not continental)
+    packet.CRC=_CRC                                                                         # (unitless)
+    packet.Len = _Len                                                                       # (unitless)
+    packet.SQC = _SQC                                                                       # (unitless)
+    packet.PartNumber = _PartNumber                                                         # (unitless)
+    packet.AssemblyPartNumber =_AssemblyPartNumber                                          # (unitless)
+    packet.SWPartNumber =_SWPartNumber                                                      # (unitless)
+    packet.SerialNumber = _SerialNumber                                                     # (unitless)
+    packet.BLVersion=_BLVersion                                                             # (unitless)
+    packet.BLCRC=_BLCRC                                                                     # (unitless)
+    packet.SWVersion=_SWVersion                                                             # (unitless)
+    packet.SWCRC=_SWCRC                                                                     # (unitless)
+    packet.UTCTimestamp=_UtcTimeStamp                                                       # nsec
+    packet.Timestamp=_TimeStamp                                                             # usec
+    packet.CurrentDamping= ((_CurrentDamping * 0.931322575049159) - 2000000000) /100000000  # dB
+    packet.Opstate=_OpState                                                                 # (unitless)
+    packet.CurrentFarCF=_CurrentFarCF                                                       # (unitless)
+    packet.CurrentNearCF=_CurrentNearCF                                                     # (unitless)
+    packet.Defective=_Defective                                                             # (unitless)
+    packet.SupplyVoltLimit=_SupplVoltLimit                                                  # (unitless)
+    packet.SensorOffTemp=_SensorOffTemp                                                     # (unitless)
+    packet.GmMissing=_GmMissing                                                             # (unitless)
+    packet.TxOutReduced=_TxOutReduced                                                       # (unitless)
+    packet.MaximumRangeFar=_MaximumRangeFar * 0.1                                           # m
+    packet.MaximumRangeNear=_MaximumRangeNear * 0.1                                         # m
+
+    # Return the StatusFrame
+    return packet
+
+# Scalar reference decoder for the RadarDetection list, which starts at offset bytes into
+# detection_bytes. Returns a list of Detection objects.
+def UnpackRadarDetections(detection_bytes, numDetections, offset=0):
+    detections = []
+    index = offset
+    end = offset + min(numDetections, (len(detection_bytes) - offset) // RADAR_DETECTION_PACKAGE_LENGTH) * RADAR_DETECTION_PACKAGE_LENGTH
+    # Unpack all RadarDetection bytes from the UDP data, which comes in detection_bytes
+    while(index<end):
+
+        # Create a new Detection
+        detection = Detection()
+        # Unpack the UDP data to get the Radar Detection signals
+        (f_Range, f_VrelRad, f_AzAng0,
+         f_AzAng1, f_ElAng, f_RCS0,
+         f_RCS1, f_Prob0, f_Prob1,
+         f_RangeVar, f_VrelRadVar, f_AzAngVar0,
+         f_AzAngVar1, f_ElAngVar, f_Pdh0, f_SNR) = RADAR_DETECTION_STRUCT.unpack_from(detection_bytes, index)
+
+        # Fill in the Detection with the unpacked signals
+        # Note that these signals are converted to their actual physical value
+        detection.Range = f_Range/65534.0 * 300                         # meters
+        detection.RelativeRadialVelocity = f_VrelRad/65534.0 * 300      # meters/s
+        detection.AzimuthalAngle0 = f_AzAng0/65534.0 * (2*math.pi)      # rad
+        detection.AzimuthalAngle1 = f_AzAng1/65534.0 * (2*math.pi)      # rad
+        detection.ElevationAngle = f_ElAng/65534.0 * (2*math.pi)        # rad
+        detection.RadarCrossSection0 = f_RCS0/65534.0 * 200             # dBm^2
+        detection.RadarCrossSection1 = f_RCS1/65534.0 * 200             # dBm^2
+        detection.ProbabilityAz0 = f_Prob0/254.0                        # (unitless)
+        detection.ProbabilityAz1 = f_Prob1/254.0                        # (unitless)
+        detection.RangeVariance = f_RangeVar/65534.0 * 10               # m^2
+        detection.RadialVelocityVariance = f_VrelRadVar/65534.0 * 10    # (m/s)^2
+        detection.Az0Variance = f_AzAngVar0/65534.0                     # rad^2
+        detection.Az1Variance = f_AzAngVar1/65534.0                     # rad^2
+        detection.ElAngleVariance = f_ElAngVar/65534.0                  # rad^2
+        # PdH0 is a bitstream of flags, not an actual probability value. Split it into those bits and set flags accordingly.
+        # We also map Pdh0 to a "probability", so that if it is above some threshold we
+        # can check these flags to find out which ones apply
+        detection.ProbabilityFalseDetection   = f_Pdh0/254.0            # (unitless)
+        detection.FalseDetectionNear          = (f_Pdh0 & 0b0000001)>0  # boolean
+        detection.FalseDetectionFromInference = (f_Pdh0 & 0b0000010)>0  # boolean
+        detection.FalseDetectionFromSidelobe  = (f_Pdh0 & 0b0000100)>0  # boolean
+        detection.BiasCorrectionInaccurate    = (f_Pdh0 & 0b0001000)>0  # boolean
+        detection.ClusterNotLocalMax          = (f_Pdh0 & 0b0010000)>0  # boolean
+        detection.BeamFormerMonopulseDiffer1  = (f_Pdh0 & 0b0100000)>0  # boolean
+        detection.BeamFormerMonopulseDiffer2  = (f_Pdh0 & 0b1000000)>0  # boolean
+        # SNR = Signal-to-noise ratio
+        detection.SNR = (f_SNR + 110.0)/10.0               # dBr
+        # Add this Detection to the list
+        detections.append(detection)
+        # Go to the next Radar Detection segment of the UDP data to unpack it
+        index+=RADAR_DETECTION_PACKAGE_LENGTH
+
+    # Return the list of detections
+    return detections
+
+# Batch version of UnpackRadarDetections. All detections in the packet are read at once
+# into a RADAR_DETECTION_DTYPE array, and the scale factors and Pdh0 flags are applied to
+# whole columns. The list starts at offset bytes into detection_bytes. Returns a DETECTION_DTYPE array,
+# which does not share memory with detection_bytes.
+def UnpackRadarDetectionsBatch(detection_bytes, numDetections, offset=0):
+    count = min(numDetections, (len(detection_bytes) - offset) // RADAR_DETECTION_PACKAGE_LENGTH)
+    raw = np.frombuffer(detection_bytes, dtype=RADAR_DETECTION_DTYPE, count=count, offset=offset)
+
+    # Copy every field into one float matrix so the scale factors can be applied in a single pass
+    values = np.empty((count, len(RADAR_DETECTION_DTYPE.names)))
+    for i, name in enumerate(RADAR_DETECTION_DTYPE.names):
+        values[:, i] = raw[name]
+    values += RADAR_DETECTION_OFFSETS
+    values /= RADAR_DETECTION_DIVISORS
+    values *= RADAR_DETECTION_MULTIPLIERS
+
+    # DETECTION_DTYPE keeps its 16 float32 columns first in memory (in wire order), followed
+    # by the 7 Pdh0 flags, so both can be written as blocks. The array is zeroed so its padding
+    # byte is the same as in the arrays built by DetectionArray.
+    detections = np.zeros(count, dtype=DETECTION_DTYPE)
+    detections.view(np.float32).reshape(count, DETECTION_DTYPE.itemsize // 4)[:, :16] = values
+    # PdH0 is a bitstream of flags; split all of them at once
+    detections.view(np.uint8).reshape(count, DETECTION_DTYPE.itemsize)[:, 64:71] = (raw['f_Pdh0'][:, None] & PDH0_FLAG_BITS) > 0
+    return detections
+
+# Unpack an event-type message (NEAR or FAR) emitted by an ARS430 radar. The event data
+# starts at offset bytes into eventData. If detections is false, the RadarDetection list is not
+# decoded and the DetectionList is left empty; DetInPack still gives its length.
+def UnpackEvent(eventData, batch=False, offset=0, detections=True):
+    # The event only data is 32 bytes long
+    # The RadarDetection list is the rest of the package
+    (RDI_CRC,RDI_Len,RDI_SQC,RDI_MessageCounter,
+     RDI_UtcTimeStamp,RDI_TimeStamp,RDI_MeasureCounter,
+     RDI_CycleCounter,RDI_NofDetections,RDI_Vambig,
+     RDI_CenterFrequency,RDI_DetectionsInPacket) = EVENT_STRUCT.unpack_from(eventData, offset)
+
+    # Convert the unpacked data into an EventFrame
+    packet=EventFrame()
+
+    packet.CRC=RDI_CRC                          # (unitless)
+    packet.Len=RDI_Len                          # (unitless)
+    packet.SQC=RDI_SQC                          # (unitless)
+    packet.MessageCounter=RDI_MessageCounter    # (unitless)
+    packet.UtcTimeStamp=RDI_UtcTimeStamp        # nsec
+    packet.TimeStamp=RDI_TimeStamp              # usec
+    packet.MeasureCounter=RDI_MeasureCounter    # (unitless)
+    packet.CycleCounter=RDI_CycleCounter        # (unitless)
+    packet.NofDet=RDI_NofDetections             # (unitless)
+    packet.Vambig=RDI_Vambig/65534.0 * 200      # m/s
+    packet.CenterFreq=RDI_CenterFrequency       # GHz
+    packet.DetInPack=RDI_DetectionsInPacket     # (unitless)
+
+    if RDI_DetectionsInPacket > 0 and detections:
+        # The RadarDetection list starts from the 256th bit/32th byte position
+        detectionStart = offset + RADAR_DETECTION_START
+        if batch and RDI_DetectionsInPacket >= BATCH_DECODE_MIN_DETECTIONS:
+            packet.DetectionList = UnpackRadarDetectionsBatch(eventData, RDI_DetectionsInPacket, detectionStart)
+        else:
+            packet.DetectionList = DetectionArray(UnpackRadarDetections(eventData, RDI_DetectionsInPacket, detectionStart))
+    else:
+        packet.DetectionList = EmptyDetections()
+
+    # Return the EventFrame
+    return packet
+
+# Unpack a datagram into a StatusFrame or EventFrame. If batch is true, the RadarDetection
+# list is decoded with UnpackRadarDetectionsBatch instead of UnpackRadarDetections; if detections
+# is false, it is not decoded at all (see UnpackEvent).
+# udpData may be any buffer (str/bytes, bytearray or a DatagramView); it is never sliced.
+def Unpack(udpData, batch=False, detections=True):
+    # Determine what header is in this UDP packet
+    headerType = FindHeader(udpData)
+
+    # Unpack the relevant data, which starts right after the header
+    if headerType is Headers.STATUS:
+        return UnpackStatus(udpData, HEADER_LEN)
+    else:
+        event = UnpackEvent(udpData, batch, HEADER_LEN, detections)
+        event.EventType = headerType.value
+        return event
+
+# Determine if a frame is of status type
+def IsStatus(packet):
+    return packet.EventType == Headers.STATUS.value
+
+# Determine if a frame is of near type
+def IsNear(packet):
+    if packet.EventType == Headers.NEAR0.value or \
+       packet.EventType == Headers.NEAR1.value or \
+       packet.EventType == Headers.NEAR2.value:
+        return True
+    return False
+
+# Determine if a frame is of far type
+def IsFar(packet):
+    if packet.EventType == Headers.FAR0.value or \
+       packet.EventType == Headers.FAR1.value:
+        return True
+    return False
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
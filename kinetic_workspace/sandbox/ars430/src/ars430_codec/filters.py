@@ -0,0 +1,96 @@
+# Quality filter for the detections of an event, based on the radar's RDI signals (Pdh0 flags,
+# SNR, RCS, variances and azimuth probabilities). Every rule is applied to whole columns of the
+# DetectionList with NumPy, and the detections it rejects are counted per rule.
+
+from collections import OrderedDict
+
+import numpy as np
+
+from ars430_codec.frames import PDH0_FLAG_FIELDS
+
+# Return the values of column0 for the detections whose AzimuthalAngle0 is more probable (the
+# angle used by geometry.BestAzimuth), and of column1 for the others
+def BestHypothesis(detections, column0, column1):
+    return np.where(detections['ProbabilityAz0'] >= detections['ProbabilityAz1'],
+                    detections[column0], detections[column1])
+
+# Threshold rules: rule name -> (function returning the tested column of a DetectionList, and
+# whether a detection must be at least (True) or at most (False) the threshold to be kept).
+# RCS and azimuth variance are those of the more probable azimuth.
+THRESHOLD_RULES = OrderedDict([
+    ('max_false_detection_probability', (lambda d: d['ProbabilityFalseDetection'], False)),
+    ('min_snr', (lambda d: d['SNR'], True)),
+    ('min_rcs', (lambda d: BestHypothesis(d, 'RadarCrossSection0', 'RadarCrossSection1'), True)),
+    ('min_azimuth_probability', (lambda d: np.maximum(d['ProbabilityAz0'], d['ProbabilityAz1']), True)),
+    ('max_range_variance', (lambda d: d['RangeVariance'], False)),
+    ('max_velocity_variance', (lambda d: d['RadialVelocityVariance'], False)),
+    ('max_azimuth_variance', (lambda d: BestHypothesis(d, 'Az0Variance', 'Az1Variance'), False)),
+    ('max_elevation_variance', (lambda d: d['ElAngleVariance'], False)),
+])
+# Rule which rejects the detections with any of the given Pdh0 flags set (see PDH0_FLAG_FIELDS)
+FLAG_RULE = 'reject_flags'
+FILTER_RULES = (FLAG_RULE,) + tuple(THRESHOLD_RULES)
+
+# Drops the detections of an event which fail any of its rules. rules is a dict of rule name
+# (see FILTER_RULES) -> threshold, or the list of Pdh0 flag names for 'reject_flags'; e.g.
+# {'reject_flags': ['FalseDetectionFromSidelobe', 'ClusterNotLocalMax'], 'min_snr': 12.0}.
+# Raises ValueError for an unknown rule or flag.
+class DetectionFilter(object):
+    def __init__(self, rules):
+        unknown = set(rules) - set(FILTER_RULES)
+        if unknown:
+            raise ValueError('Unknown detection filter rules: %s' % ', '.join(sorted(unknown)))
+        # (rule name, function returning the mask of the detections which pass it)
+        self.tests = []
+        flags = list(rules.get(FLAG_RULE, ()))
+        if flags:
+            unknown = set(flags) - set(PDH0_FLAG_FIELDS)
+            if unknown:
+                raise ValueError('Unknown Pdh0 flags: %s' % ', '.join(sorted(unknown)))
+            self.tests.append((FLAG_RULE, lambda d: ~np.logical_or.reduce([d[flag] for flag in flags])))
+        for name, (column, isMinimum) in THRESHOLD_RULES.items():
+            if name in rules:
+                compare = np.greater_equal if isMinimum else np.less_equal
+                threshold = float(rules[name])
+                self.tests.append((name, lambda d, column = column, compare = compare, threshold = threshold:
+                                   compare(column(d), threshold)))
+        # Detections seen and rejected, in total and per rule (a detection which fails several
+        # rules counts for each of them)
+        self.detections = 0
+        self.rejected = 0
+        self.rejects = OrderedDict((name, 0) for name, test in self.tests)
+        # Rejects up to the last snapshot
+        self.reported = (0, dict(self.rejects))
+
+    # Drop the detections of an EventFrame which fail any rule. DetInPack and NofDet keep the
+    # counts which the radar sent. Returns the frame.
+    def apply(self, frame):
+        detections = frame.DetectionList
+        count = len(detections)
+        if count == 0 or not self.tests:
+            return frame
+        keep = None
+        for name, test in self.tests:
+            passed = test(detections)
+            rejected = count - int(np.count_nonzero(passed))
+            if rejected:
+                self.rejects[name] += rejected
+                keep = passed if keep is None else keep & passed
+        self.detections += count
+        if keep is not None:
+            frame.DetectionList = detections[keep]
+            self.rejected += count - len(frame.DetectionList)
+        return frame
+
+    # Return an OrderedDict of 'filtered detections' and 'filtered <rule>' -> detections rejected
+    # since the last snapshot
+    def snapshot(self):
+        rejected, rejects = self.reported
+        values = OrderedDict()
+        values['filtered detections'] = self.rejected - rejected
+        for name in self.rejects:
+            values['filtered ' + name] = self.rejects[name] - rejects[name]
+        self.reported = (self.rejected, dict(self.rejects))
+        return values
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
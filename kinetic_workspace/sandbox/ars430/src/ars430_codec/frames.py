@@ -0,0 +1,80 @@
+# Plain Python/NumPy equivalents of the ars430 messages, so that datagrams can be decoded
+# without ROS. Attribute names match ARS430Status.msg, ARS430Event.msg and RadarDetection.msg,
+# which lets the ROS node copy a frame into a message field by field.
+
+import numpy as np
+
+# Fields of RadarDetection.msg, in message order
+DETECTION_FIELDS = ('Range', 'RelativeRadialVelocity', 'AzimuthalAngle0', 'AzimuthalAngle1',
+                    'ElevationAngle', 'RadarCrossSection0', 'RadarCrossSection1', 'ProbabilityAz0',
+                    'ProbabilityAz1', 'RangeVariance', 'RadialVelocityVariance', 'Az0Variance',
+                    'Az1Variance', 'ElAngleVariance', 'ProbabilityFalseDetection', 'FalseDetectionNear',
+                    'FalseDetectionFromInference', 'FalseDetectionFromSidelobe', 'BiasCorrectionInaccurate',
+                    'ClusterNotLocalMax', 'BeamFormerMonopulseDiffer1', 'BeamFormerMonopulseDiffer2', 'SNR')
+
+# Names of the boolean Pdh0 flags, in the order of their bits (bit 0 first)
+PDH0_FLAG_FIELDS = DETECTION_FIELDS[15:22]
+
+# A detection list is stored as one structured array with a column per RadarDetection field.
+# The fields are listed in message order, so detections.tolist() gives one tuple per detection
+# that can be passed straight to RadarDetection(*row). In memory the 16 float32 columns are
+# packed first (SNR last) and the 7 flags after them, so the decoder can fill the floats as
+# one (n, 16) float32 block.
+DETECTION_DTYPE = np.dtype({
+    'names': list(DETECTION_FIELDS),
+    'formats': [np.float32]*15 + [np.bool_]*7 + [np.float32],
+    'offsets': [4*i for i in range(15)] + [64 + i for i in range(7)] + [60],
+    'itemsize': 72,
+})
+
+# One radar detection, decoded by the scalar reference decoder
+class Detection(object):
+    __slots__ = DETECTION_FIELDS
+
+    def __init__(self, *args):
+        for name, value in zip(DETECTION_FIELDS, args):
+            setattr(self, name, value)
+
+    # Return the signals of this detection as a tuple, in message order
+    def astuple(self):
+        return tuple(getattr(self, name) for name in DETECTION_FIELDS)
+
+# Build a DETECTION_DTYPE array from a list of Detection objects (or of tuples in message order).
+# The array is zeroed first, since np.array leaves its padding byte uninitialised.
+def DetectionArray(detections):
+    array = np.zeros(len(detections), dtype=DETECTION_DTYPE)
+    array[:] = [d if isinstance(d, tuple) else d.astuple() for d in detections]
+    return array
+
+# An empty detection list
+def EmptyDetections():
+    return np.zeros(0, dtype=DETECTION_DTYPE)
+
+# Decoded STATUS datagram (see ARS430Status.msg)
+class StatusFrame(object):
+    __slots__ = ('sourceIP', 'EventType', 'CRC', 'Len', 'SQC', 'PartNumber', 'AssemblyPartNumber',
+                 'SWPartNumber', 'SerialNumber', 'BLVersion', 'BLCRC', 'SWVersion', 'SWCRC',
+                 'UTCTimestamp', 'Timestamp', 'CurrentDamping', 'Opstate', 'CurrentFarCF',
+                 'CurrentNearCF', 'Defective', 'SupplyVoltLimit', 'SensorOffTemp', 'GmMissing',
+                 'TxOutReduced', 'MaximumRangeFar', 'MaximumRangeNear')
+
+    def __init__(self):
+        for name in StatusFrame.__slots__:
+            setattr(self, name, 0)
+        self.sourceIP = ''
+        self.SerialNumber = b''
+
+# Decoded NEAR or FAR datagram, or several of them combined by a FrameAssembler (see ARS430Event.msg).
+# DetectionList is a DETECTION_DTYPE array.
+class EventFrame(object):
+    __slots__ = ('sourceIP', 'EventType', 'CRC', 'Len', 'SQC', 'MessageCounter', 'UtcTimeStamp',
+                 'TimeStamp', 'MeasureCounter', 'CycleCounter', 'NofDet', 'Vambig', 'CenterFreq',
+                 'DetInPack', 'DetectionList')
+
+    def __init__(self):
+        for name in EventFrame.__slots__:
+            setattr(self, name, 0)
+        self.sourceIP = ''
+        self.DetectionList = EmptyDetections()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
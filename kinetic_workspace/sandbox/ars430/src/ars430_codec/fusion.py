@@ -0,0 +1,92 @@
+# Fusion of the point clouds of several radars into one cloud in the vehicle frame. The mount
+# pose of every radar is turned into a rotation matrix and a translation once; the points of a
+# frame are then moved into the vehicle frame with one matrix multiply. This module does not
+# depend on ROS.
+
+import math
+
+import numpy as np
+
+from ars430_codec.pointcloud import POINT_DTYPE
+
+# Seconds of radar time merged into one cloud: about one radar cycle
+FUSION_WINDOW = 0.06
+# Seconds to wait for late frames after a window ended, before it is emitted without them
+FUSION_DELAY = 0.02
+# Width of a point in float32s. x, y and z are its first three; viewing a cloud as an (n, width)
+# float32 matrix gives all of their positions as one (n, 3) block without copying them.
+POINT_FLOATS = POINT_DTYPE.itemsize // 4
+assert POINT_DTYPE.itemsize % 4 == 0 and [POINT_DTYPE.fields[name][1] for name in 'xyz'] == [0, 4, 8]
+
+# Rotation matrix of the roll, pitch and yaw angles (rad) about the x, y and z axes, applied in
+# that order (as in tf: R = Rz(yaw) Ry(pitch) Rx(roll))
+def RotationMatrix(roll, pitch, yaw):
+    cr, sr = math.cos(roll), math.sin(roll)
+    cp, sp = math.cos(pitch), math.sin(pitch)
+    cy, sy = math.cos(yaw), math.sin(yaw)
+    return np.array([[cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+                     [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+                     [-sp, cp * sr, cp * cr]])
+
+# Mount pose of a radar in the vehicle frame: the position of the radar (m) and the roll, pitch and
+# yaw (rad) of its x-forward, y-left, z-up frame (see geometry.DetectionsToXYZ)
+class MountTransform(object):
+    __slots__ = ('rotation', 'translation')
+
+    def __init__(self, x = 0.0, y = 0.0, z = 0.0, roll = 0.0, pitch = 0.0, yaw = 0.0):
+        # Transposed, so a row of positions is multiplied from the left
+        self.rotation = RotationMatrix(roll, pitch, yaw).T.astype(np.float32)
+        self.translation = np.array([x, y, z], dtype = np.float32)
+
+    # Move the points of the (n, 3) float32 block xyz into the vehicle frame, in place
+    def apply(self, xyz):
+        xyz[...] = np.dot(xyz, self.rotation) + self.translation
+
+# Merges the clouds of several radars which fall into the same window of time. The first frame
+# opens a window of window seconds; a frame stamped at or after its end closes it, and so does
+# expire() once delay more seconds went by. Frames stamped before the window opened are merged
+# into it too. transforms maps the key of every radar to its MountTransform.
+class FrameFusion(object):
+    def __init__(self, transforms, window = FUSION_WINDOW, delay = FUSION_DELAY):
+        self.transforms = transforms
+        self.window = window
+        self.delay = delay
+        # Start (seconds) of the open window, and its (key, POINT_DTYPE array) frames
+        self.start = None
+        self.frames = []
+
+    # Add the POINT_DTYPE cloud of the radar key, stamped at stamp (seconds), in the radar's
+    # frame. Returns the list of fused (stamp, POINT_DTYPE array) clouds which are ready.
+    def add(self, key, points, stamp):
+        ready = []
+        if self.start is not None and stamp >= self.start + self.window:
+            ready.append(self.flush())
+        if self.start is None:
+            self.start = stamp
+        self.frames.append((key, points))
+        return ready
+
+    # Return the list of fused clouds whose window ended more than delay seconds before now
+    def expire(self, now):
+        if self.start is not None and now >= self.start + self.window + self.delay:
+            return [self.flush()]
+        return []
+
+    # Close the open window. Returns its (start, points) cloud in the vehicle frame: every frame
+    # is copied into it once, then moved into the vehicle frame in place. (np.concatenate is not
+    # used, since newer NumPy drops the padding of POINT_DTYPE from what it returns.) The cloud is
+    # zeroed first, so its padding is not published as leftover memory.
+    def flush(self):
+        frames, start = self.frames, self.start
+        self.frames, self.start = [], None
+        points = np.zeros(sum(len(framePoints) for key, framePoints in frames), dtype = POINT_DTYPE)
+        xyz = points.view(np.float32).reshape(len(points), POINT_FLOATS)
+        first = 0
+        for key, framePoints in frames:
+            last = first + len(framePoints)
+            points[first:last] = framePoints
+            self.transforms[key].apply(xyz[first:last, :3])
+            first = last
+        return start, points
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
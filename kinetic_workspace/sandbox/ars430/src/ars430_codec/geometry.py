@@ -0,0 +1,48 @@
+# Conversion of detections from the radar's polar coordinates to XYZ coordinates. A whole frame
+# is converted at once with NumPy, including the elevation of every detection. This is the only
+# conversion; the markers, the point clouds (and so the fused clouds), the tracker and the
+# clusters all use it.
+
+import numpy as np
+
+# Return the azimuth of every detection, taking the angle (AzimuthalAngle0 or AzimuthalAngle1)
+# with maximal probability. Ties go to AzimuthalAngle0.
+def BestAzimuth(detections):
+    return np.where(detections['ProbabilityAz0'] >= detections['ProbabilityAz1'],
+                    detections['AzimuthalAngle0'], detections['AzimuthalAngle1'])
+
+# Convert a DETECTION_DTYPE array into an (n, 3) float32 array of the points at distance scale
+# (an array, or 1) along the line of sight of every detection, in the radar frame: x points
+# forward, y to the left (the radar's y-axis is to the right, so it is inverted) and z up. The
+# azimuth is chosen by BestAzimuth. Every column is written in place, with one cosine and one
+# sine per angle.
+def PolarToXYZ(detections, scale):
+    azimuth = BestAzimuth(detections)
+    elevation = detections['ElevationAngle']
+    horizontal = np.cos(elevation)
+    horizontal *= scale
+    xyz = np.empty((len(detections), 3), dtype=np.float32)
+    np.multiply(np.cos(azimuth), horizontal, out=xyz[:, 0])
+    np.multiply(np.sin(azimuth), horizontal, out=xyz[:, 1])
+    np.negative(xyz[:, 1], out=xyz[:, 1])
+    np.multiply(np.sin(elevation), scale, out=xyz[:, 2])
+    return xyz
+
+# Convert a DETECTION_DTYPE array into an (n, 3) float32 array of unit vectors along the line of
+# sight of every detection (see PolarToXYZ)
+def LineOfSight(detections):
+    return PolarToXYZ(detections, 1.0)
+
+# Convert a DETECTION_DTYPE array into an (n, 3) float32 array of XYZ coordinates in the radar
+# frame (see PolarToXYZ)
+def DetectionsToXYZ(detections):
+    return PolarToXYZ(detections, detections['Range'])
+
+# Return the (x, y, z) position of every detection of a DETECTION_DTYPE array which is shown as
+# an rviz marker point: the detections whose probability of false detection is 0.
+# The other RDI signals are checked by filters.DetectionFilter, before any output. All points are
+# converted and the rows are selected afterwards, which is cheaper than selecting the detections.
+def MarkerPoints(detections):
+    return DetectionsToXYZ(detections)[detections['ProbabilityFalseDetection'] == 0].tolist()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,55 @@
+# Neighbour queries through a uniform hash grid, in 1 to 3 dimensions. The points are sorted by
+# the key of the cell they fall into, and the points in the cells around a query are found with
+# a binary search, so a query is only compared with the points near it instead of with all of them.
+
+import numpy as np
+
+# Cell (i, j, k) is keyed by i * GRID_STRIDE^2 + j * GRID_STRIDE + k; a cell index is at most
+# 2^20 cells from 0 in every dimension
+GRID_STRIDE = 1 << 21
+
+# Key offsets of a cell and its neighbours (3^dimensions of them)
+def NeighbourOffsets(dimensions):
+    offsets = np.zeros(1, dtype=np.int64)
+    for d in range(dimensions):
+        offsets = (offsets[:, None] * GRID_STRIDE + np.array([-1, 0, 1], dtype=np.int64)).ravel()
+    return offsets
+
+# Keys of the cells of side cellSize which an (n, dimensions) array of positions fall into
+def GridKeys(positions, cellSize):
+    cells = np.floor(positions / cellSize).astype(np.int64)
+    keys = cells[:, 0].copy()
+    for d in range(1, positions.shape[1]):
+        keys *= GRID_STRIDE
+        keys += cells[:, d]
+    return keys
+
+# Return the (queryIndices, pointIndices, squared distances) of every pair of one of the (m, d)
+# queries and one of the (n, d) points which are at most radius apart. The pairs are grouped by
+# query, in the order of the queries.
+def NeighbourPairs(queries, points, radius):
+    empty = np.zeros(0, dtype=np.intp)
+    if len(queries) == 0 or len(points) == 0:
+        return empty, empty, np.zeros(0)
+    offsets = NeighbourOffsets(points.shape[1])
+    keys = GridKeys(points, radius)
+    order = np.argsort(keys, kind='mergesort')
+    sortedKeys = keys[order]
+    # [lo, lo + counts) of the sorted points in each of the cells around every query
+    neighbours = (GridKeys(queries, radius)[:, None] + offsets).ravel()
+    lo = np.searchsorted(sortedKeys, neighbours, 'left')
+    counts = np.searchsorted(sortedKeys, neighbours, 'right') - lo
+    total = counts.sum()
+    if total == 0:
+        return empty, empty, np.zeros(0)
+
+    # One candidate pair per point in those cells
+    queryIndices = np.repeat(np.arange(len(queries)).repeat(len(offsets)), counts)
+    firsts = np.repeat(lo, counts)
+    firsts += np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    pointIndices = order[firsts]
+    distances = ((queries[queryIndices] - points[pointIndices]) ** 2).sum(axis=1)
+    near = distances <= radius * radius
+    return queryIndices[near], pointIndices[near], distances[near]
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
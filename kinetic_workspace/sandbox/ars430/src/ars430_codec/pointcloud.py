@@ -0,0 +1,87 @@
+# Builds the point cloud of a collected frame as one binary buffer, laid out for a
+# sensor_msgs/PointCloud2 message. No Python object is created per point. The message and its
+# fields are built from classes passed in by the caller, so this module does not depend on ROS.
+
+import numpy as np
+
+from ars430_codec.codec import IsNear
+from ars430_codec.frames import PDH0_FLAG_FIELDS
+from ars430_codec.geometry import DetectionsToXYZ
+
+# Values of the 'tag' field, which tells which scan a point came from
+TAG_NEAR = 0
+TAG_FAR = 1
+
+# PointField datatypes (see sensor_msgs/PointField.msg)
+POINT_FIELD_UINT8 = 2
+POINT_FIELD_UINT16 = 4
+POINT_FIELD_UINT32 = 6
+POINT_FIELD_FLOAT32 = 7
+# PointField datatype of every NumPy type which a point field may have
+POINT_FIELD_TYPES = {np.dtype('u1'): POINT_FIELD_UINT8, np.dtype('<u2'): POINT_FIELD_UINT16,
+                     np.dtype('<u4'): POINT_FIELD_UINT32, np.dtype('<f4'): POINT_FIELD_FLOAT32}
+
+# Layout of one point, little-endian. pdh0 holds the Pdh0 flag bits as sent by the radar.
+POINT_DTYPE = np.dtype({
+    'names': ['x', 'y', 'z', 'radial_velocity', 'rcs', 'snr', 'pdh0', 'tag'],
+    'formats': ['<f4', '<f4', '<f4', '<f4', '<f4', '<f4', 'u1', 'u1'],
+    'offsets': [0, 4, 8, 12, 16, 20, 24, 25],
+    'itemsize': 28,
+})
+
+# (name, offset, datatype) of every field of pointDtype (POINT_DTYPE, or another little-endian
+# layout such as tracker.TRACK_DTYPE), for building the PointField list
+def PointFields(pointDtype = POINT_DTYPE):
+    fields = []
+    for name in pointDtype.names:
+        dtype, offset = pointDtype.fields[name][:2]
+        fields.append((name, offset, POINT_FIELD_TYPES[dtype]))
+    return fields
+
+# Build the field list of a PointCloud2 of pointDtype points, with fieldClass
+# (sensor_msgs.msg.PointField)
+def PointFieldList(fieldClass, pointDtype = POINT_DTYPE):
+    return [fieldClass(name, offset, datatype, 1) for name, offset, datatype in PointFields(pointDtype)]
+
+# Build a msgClass (sensor_msgs.msg.PointCloud2) in frameId, stamped at stamp, from a NumPy array
+# with one record per point and its field list (see PointFieldList)
+def PointsMsg(msgClass, points, fields, frameId, stamp):
+    msg = msgClass()
+    msg.header.stamp = stamp
+    msg.header.frame_id = frameId
+    msg.height = 1
+    msg.width = len(points)
+    msg.fields = fields
+    msg.is_bigendian = False
+    msg.point_step = points.itemsize
+    msg.row_step = points.itemsize * len(points)
+    msg.data = points.tobytes()
+    msg.is_dense = True
+    return msg
+
+# Rebuild the Pdh0 bit field from the boolean flags of a DETECTION_DTYPE array
+def Pdh0Bits(detections):
+    bits = np.zeros(len(detections), dtype=np.uint8)
+    for bit, name in enumerate(PDH0_FLAG_FIELDS):
+        bits |= detections[name].astype(np.uint8) << bit
+    return bits
+
+# Convert a collected EventFrame into a POINT_DTYPE array, one point per detection. The RCS is
+# taken for the same azimuth hypothesis as the position (see geometry.BestAzimuth).
+def CloudArray(frame):
+    detections = frame.DetectionList
+    # Zeroed, so the padding after 'tag' is not published as leftover memory
+    points = np.zeros(len(detections), dtype=POINT_DTYPE)
+    xyz = DetectionsToXYZ(detections)
+    points['x'] = xyz[:, 0]
+    points['y'] = xyz[:, 1]
+    points['z'] = xyz[:, 2]
+    points['radial_velocity'] = detections['RelativeRadialVelocity']
+    points['rcs'] = np.where(detections['ProbabilityAz0'] >= detections['ProbabilityAz1'],
+                             detections['RadarCrossSection0'], detections['RadarCrossSection1'])
+    points['snr'] = detections['SNR']
+    points['pdh0'] = Pdh0Bits(detections)
+    points['tag'] = TAG_NEAR if IsNear(frame) else TAG_FAR
+    return points
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,169 @@
+# Lightweight statistics of the datagrams of one radar, for diagnostics: latency histograms of
+# the stages a datagram goes through, packet, detection and frame rates, and the packets lost
+# according to the radar's sequence counters. This module does not depend on ROS.
+
+import time
+from collections import OrderedDict
+
+from ars430_codec.codec import Headers, IsStatus, IsNear
+
+# Stages of handling a datagram:
+#   hop: from its receive stamp (the kernel's, if the socket sets one) to the start of decoding,
+#        i.e. the rosudp topic, the pipeline ring or the receive batch
+#   decode: decoding it into a StatusFrame or EventFrame
+#   publish: publishing the status or event message
+#   assemble: adding the packet to its frame assembler
+#   frame: publishing the frames which were collected
+#   total: from its receive stamp to the end of all of the above
+STAGES = ('hop', 'decode', 'publish', 'assemble', 'frame', 'total')
+# Latencies are counted in buckets of powers of two: bucket 0 holds 0 us, bucket k holds
+# [2^(k-1), 2^k) us, so percentiles are exact to within a factor of two. The last bucket holds
+# everything above 2^(LATENCY_BUCKETS-2) us (about 18 min).
+LATENCY_BUCKETS = 32
+# SQC is an 8-bit counter per message type; CycleCounter a 32-bit counter
+SQC_MODULUS = 1 << 8
+CYCLE_MODULUS = 1 << 32
+
+# Histogram of latencies, with O(1) add and a fixed size
+class LatencyHistogram(object):
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * LATENCY_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    # Add a latency in seconds. Negative latencies (clocks of different hosts) count as 0.
+    def add(self, seconds):
+        us = max(0, int(seconds * 1e6))
+        self.counts[min(us.bit_length(), LATENCY_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    # Upper bound (us) of the bucket which holds the p-th percentile (0-100), at most the maximum
+    def percentile(self, p):
+        rank = p / 100.0 * self.count
+        seen = 0
+        for k, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                return min((1 << k) - 1, self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / float(self.count) if self.count else 0.0
+
+# Counts gaps in a wrapping counter, per key. A counter which moved forward by more than one
+# counts the skipped values as lost; one which moved back (by less than half the modulus) or
+# repeated counts as reordered, and does not move the last value back. A late packet has already
+# been counted as lost when the packets after it arrived.
+class SequenceTracker(object):
+    def __init__(self, modulus = SQC_MODULUS):
+        self.modulus = modulus
+        self.last = {}
+        self.lost = 0
+        self.reordered = 0
+
+    def add(self, key, counter):
+        last = self.last.get(key)
+        if last is None:
+            self.last[key] = counter
+            return
+        step = (counter - last) % self.modulus
+        if 0 < step <= self.modulus // 2:
+            self.lost += step - 1
+            self.last[key] = counter
+        else:
+            self.reordered += 1
+
+# Counts of one diagnostics period; RadarStats replaces it by a new one when it is read
+class PeriodStats(object):
+    __slots__ = ('started', 'packets', 'statuses', 'detections', 'frames', 'latencies')
+
+    def __init__(self, now):
+        self.started = now
+        self.packets = 0
+        self.statuses = 0
+        self.detections = 0
+        self.frames = 0
+        self.latencies = dict((stage, LatencyHistogram()) for stage in STAGES)
+
+# Statistics of the datagrams of one radar. The counts are kept per period, which snapshot
+# returns and starts anew; lost and reordered packets are also kept in total.
+class RadarStats(object):
+    def __init__(self, now = None):
+        self.period = PeriodStats(time.time() if now is None else now)
+        # Packets lost and reordered, from the SQC of every message type
+        self.packets = SequenceTracker(SQC_MODULUS)
+        # Cycles without a NEAR (FAR) scan, from the CycleCounter of the NEAR (FAR) scans
+        self.cycles = SequenceTracker(CYCLE_MODULUS)
+        self.lastCycle = {True: None, False: None}
+        self.totalPackets = 0
+        # Lost and reordered packets and skipped cycles up to the last snapshot
+        self.reported = (0, 0, 0)
+
+    # Count a decoded StatusFrame or EventFrame
+    def addPacket(self, packet):
+        if IsStatus(packet):
+            self.addStatus(packet.SQC)
+            return
+        period = self.period
+        period.packets += 1
+        self.totalPackets += 1
+        self.packets.add(packet.EventType, packet.SQC)
+        period.detections += packet.DetInPack
+        # All packets of a scan share its CycleCounter; only count it once per scan
+        near = IsNear(packet)
+        if packet.CycleCounter != self.lastCycle[near]:
+            self.lastCycle[near] = packet.CycleCounter
+            self.cycles.add(near, packet.CycleCounter)
+
+    # Count a status by its SQC, e.g. one which was not decoded (see StatusCache)
+    def addStatus(self, sqc):
+        period = self.period
+        period.packets += 1
+        period.statuses += 1
+        self.totalPackets += 1
+        self.packets.add(Headers.STATUS.value, sqc)
+
+    def addFrames(self, count):
+        self.period.frames += count
+
+    # Add the latency (seconds) of one of the STAGES
+    def addLatency(self, stage, seconds):
+        self.period.latencies[stage].add(seconds)
+
+    # Return the statistics of the period since the last snapshot as an OrderedDict of name ->
+    # number, and start a new period. Latencies are in microseconds. The period is swapped out
+    # rather than locked, so a packet counted while it is read may be lost from the statistics.
+    def snapshot(self, now = None):
+        if now is None:
+            now = time.time()
+        period, self.period = self.period, PeriodStats(now)
+        seconds = max(now - period.started, 1e-9)
+        lost, reordered, skipped = self.packets.lost, self.packets.reordered, self.cycles.lost
+        values = OrderedDict()
+        values['seconds'] = seconds
+        values['packets/s'] = period.packets / seconds
+        values['detections/s'] = period.detections / seconds
+        values['frames/s'] = period.frames / seconds
+        values['status/s'] = period.statuses / seconds
+        values['lost packets'] = lost - self.reported[0]
+        values['reordered packets'] = reordered - self.reported[1]
+        values['skipped cycles'] = skipped - self.reported[2]
+        values['total packets'] = self.totalPackets
+        values['total lost packets'] = lost
+        self.reported = (lost, reordered, skipped)
+        for stage in STAGES:
+            histogram = period.latencies[stage]
+            if histogram.count:
+                values[stage + ' mean us'] = histogram.mean()
+                values[stage + ' p50 us'] = histogram.percentile(50)
+                values[stage + ' p99 us'] = histogram.percentile(99)
+                values[stage + ' max us'] = histogram.max
+        return values
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,48 @@
+# Change detection for status datagrams. Most of a status (part numbers, serial number, versions
+# and their CRCs, operating state, maximum ranges) stays the same for as long as the radar runs,
+# so a status which only differs from the last one in its counters and time stamps does not need
+# to be decoded and published again. This module does not depend on ROS.
+
+import struct
+import time
+
+from ars430_codec.codec import HEADER_LEN, STATUS_STRUCT, Headers, FindHeader
+
+# The fields of STATUS_STRUCT which are compared, as two strings: PartNumber to SWCRC, and OpState
+# to MaximumRangeNear. CRC, Len and SQC before them, and UtcTimeStamp, TimeStamp and
+# CurrentDamping between them, change with every status.
+STATUS_STABLE_STRUCT = struct.Struct('!5x64s16x12s')
+assert STATUS_STABLE_STRUCT.size == STATUS_STRUCT.size
+# SQC of a status payload
+STATUS_SQC_STRUCT = struct.Struct('!4xB')
+
+# The SQC of the status datagram udpData, without decoding the rest of it
+def StatusSqc(udpData):
+    return STATUS_SQC_STRUCT.unpack_from(udpData, HEADER_LEN)[0]
+
+# Remembers the last status of one radar which was passed on. A status is passed on when its
+# stable fields changed, or heartbeat seconds after the last one which was.
+class StatusCache(object):
+    def __init__(self, heartbeat):
+        self.heartbeat = heartbeat
+        # Stable fields and time of the last status passed on
+        self.fields = None
+        self.passed = 0.0
+        self.skipped = 0
+
+    # Return true if the datagram udpData should be decoded: it is an event, or a status which
+    # is new according to the rules above. now is the current time (seconds); time.time() if None.
+    def wanted(self, udpData, now = None):
+        if FindHeader(udpData) is not Headers.STATUS:
+            return True
+        if now is None:
+            now = time.time()
+        fields = STATUS_STABLE_STRUCT.unpack_from(udpData, HEADER_LEN)
+        if fields == self.fields and now - self.passed < self.heartbeat:
+            self.skipped += 1
+            return False
+        self.fields = fields
+        self.passed = now
+        return True
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,133 @@
+# Builds synthetic ARS430 datagrams, laid out exactly like the radar's, for load tests,
+# benchmarks and the radar simulator (scripts/simulate_radar.py). Decoding a synthetic
+# datagram with Unpack gives back the values it was built from.
+
+import math
+import struct
+import time
+
+import numpy as np
+
+from ars430_codec.codec import (STATUS_HEADER_BYTES, FAR0_HEADER_BYTES, FAR1_HEADER_BYTES, NEAR0_HEADER_BYTES,
+                                NEAR1_HEADER_BYTES, NEAR2_HEADER_BYTES, SERIAL_NUMBER_LENGTH, RADAR_DETECTION_DTYPE,
+                                RADAR_DETECTION_PACKAGE_LENGTH, STATUS_STRUCT, EVENT_STRUCT)
+from ars430_codec.validate import E2ECrc
+
+# The packets of a NEAR and of a FAR scan, in the order the radar sends them
+NEAR_HEADERS = (NEAR0_HEADER_BYTES, NEAR1_HEADER_BYTES, NEAR2_HEADER_BYTES)
+FAR_HEADERS = (FAR0_HEADER_BYTES, FAR1_HEADER_BYTES)
+# Detections which fit in one event packet
+MAX_DETECTIONS_PER_PACKET = 38
+# Seconds between two scans of the radar
+CYCLE_TIME = 0.06
+# Number of different detection lists a RadarSimulator sends, so building a scan only packs headers
+DETECTION_VARIANTS = 8
+
+# E2E CRC at the start of a payload
+CRC_STRUCT = struct.Struct('!H')
+
+# E2E length field and [8:16] of the header: client ID, session ID, protocol version,
+# interface version, message type (notification) and return code
+HEADER_TAIL_STRUCT = struct.Struct('!LHHBBBB')
+
+# Wrap a payload into a datagram with the given header ID
+def Datagram(headerBytes, payload, session = 0):
+    return headerBytes + HEADER_TAIL_STRUCT.pack(len(payload) + 8, 0, session & 0xFFFF, 1, 1, 2, 0) + payload
+
+# Set the E2E CRC of a payload whose Len field is already set (see validate.E2ECrc)
+def ProtectPayload(payload, dataId = None):
+    length = CRC_STRUCT.unpack_from(payload, 2)[0]
+    return CRC_STRUCT.pack(E2ECrc(payload, 0, length, dataId)) + payload[2:]
+
+# Return the wire bytes of n random but plausible detections, drawn from the NumPy RandomState rng
+def RandomDetections(n, rng):
+    raw = np.zeros(n, dtype=RADAR_DETECTION_DTYPE)
+    raw['f_Range'] = rng.uniform(0.5, 250.0, n) / 300.0 * 65534
+    raw['f_VrelRad'] = rng.uniform(-30.0, 30.0, n) / 300.0 * 65534
+    raw['f_AzAng0'] = rng.uniform(-1.0, 1.0, n) / (2 * math.pi) * 65534
+    raw['f_AzAng1'] = rng.uniform(-1.0, 1.0, n) / (2 * math.pi) * 65534
+    raw['f_ElAng'] = rng.uniform(-0.1, 0.1, n) / (2 * math.pi) * 65534
+    raw['f_RCS0'] = rng.uniform(-10.0, 30.0, n) / 200.0 * 65534
+    raw['f_RCS1'] = rng.uniform(-10.0, 30.0, n) / 200.0 * 65534
+    raw['f_Prob0'] = rng.randint(0, 255, n)
+    raw['f_Prob1'] = 254 - raw['f_Prob0']
+    for name in ('f_RangeVar', 'f_VrelRadVar', 'f_AzAngVar0', 'f_AzAngVar1', 'f_ElAngVar'):
+        raw[name] = rng.randint(0, 2000, n)
+    # Most detections have no Pdh0 flag set
+    raw['f_Pdh0'] = np.where(rng.uniform(size=n) < 0.1, 1 << rng.randint(0, 7, n), 0)
+    raw['f_SNR'] = rng.randint(50, 200, n)
+    return raw.tobytes()
+
+# Split a scan's detections over its packets, filling each packet before the next one
+def SplitDetections(detections, packets):
+    counts = []
+    for i in range(packets):
+        counts.append(max(0, min(MAX_DETECTIONS_PER_PACKET, detections - i * MAX_DETECTIONS_PER_PACKET)))
+    return counts
+
+# Generates the datagrams of one radar: a NEAR0-2 and a FAR0-1 scan per cycle, and status messages.
+# All packets of a scan share TimeStamp, MeasureCounter and CycleCounter, their DetInPack add up
+# to the scan's NofDet, and SQC counts up per message type. The E2E CRC of every payload is
+# computed with the Data ID dataId (see validate.py).
+class RadarSimulator(object):
+    def __init__(self, nearDetections = 100, farDetections = 60, cycleTime = CYCLE_TIME, seed = None,
+                 serialNumber = b'ARS430-SIM', dataId = None):
+        self.nearDetections = min(nearDetections, MAX_DETECTIONS_PER_PACKET * len(NEAR_HEADERS))
+        self.farDetections = min(farDetections, MAX_DETECTIONS_PER_PACKET * len(FAR_HEADERS))
+        self.cycleTime = cycleTime
+        self.dataId = dataId
+        self.serialNumber = serialNumber[:SERIAL_NUMBER_LENGTH].ljust(SERIAL_NUMBER_LENGTH, b'\0')
+        rng = np.random.RandomState(seed)
+        self.variants = [RandomDetections(MAX_DETECTIONS_PER_PACKET, rng) for i in range(DETECTION_VARIANTS)]
+        self.cycle = 0
+        self.session = 0
+        self.sqc = {}
+
+    # Next sequence counter of a message type
+    def nextSqc(self, headerBytes):
+        sqc = self.sqc.get(headerBytes, -1) + 1 & 0xFF
+        self.sqc[headerBytes] = sqc
+        return sqc
+
+    def datagram(self, headerBytes, payload):
+        self.session = self.session + 1 & 0xFFFF
+        return Datagram(headerBytes, ProtectPayload(payload, self.dataId), self.session)
+
+    # Return the event packets of one scan
+    def scanPackets(self, headers, detections, now):
+        timeStamp = int((self.cycle * self.cycleTime * 1e6)) & 0xFFFFFFFF
+        packets = []
+        for i, (headerBytes, count) in enumerate(zip(headers, SplitDetections(detections, len(headers)))):
+            body = self.variants[(self.cycle + i) % len(self.variants)][:count * RADAR_DETECTION_PACKAGE_LENGTH]
+            payloadLength = EVENT_STRUCT.size + len(body)
+            # Vambig 60 m/s, center frequency 77 GHz
+            header = EVENT_STRUCT.pack(0, payloadLength, self.nextSqc(headerBytes), self.cycle & 0xFF,
+                                       int(now * 1e9), timeStamp, self.cycle & 0xFFFFFFFF,
+                                       self.cycle & 0xFFFFFFFF, detections, int(60.0 / 200 * 65534), 77, count)
+            packets.append(self.datagram(headerBytes, header + body))
+        return packets
+
+    # Return the datagrams of the next cycle: NEAR0-2, then FAR0-1. now is the UTC time stamp
+    # (seconds) of the cycle; the current time is used if it is None.
+    def scan(self, now = None):
+        if now is None:
+            now = time.time()
+        packets = self.scanPackets(NEAR_HEADERS, self.nearDetections, now)
+        packets += self.scanPackets(FAR_HEADERS, self.farDetections, now)
+        self.cycle += 1
+        return packets
+
+    # Return a status datagram
+    def status(self, now = None):
+        if now is None:
+            now = time.time()
+        payload = STATUS_STRUCT.pack(0, STATUS_STRUCT.size, self.nextSqc(STATUS_HEADER_BYTES),
+                                     430, 431, 432, self.serialNumber,
+                                     1, 0, 0, 0, 2, 0, 0, 0,
+                                     int(now * 1e9), int((self.cycle * self.cycleTime * 1e6)) & 0xFFFFFFFF,
+                                     int(2000000000 / 0.931322575049159),
+                                     1, 0, 0, 0, 0, 0, 0, 0,
+                                     2500, 700)
+        return self.datagram(STATUS_HEADER_BYTES, payload)
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,191 @@
+# Multi-target tracker over the collected frames of a radar. Every track is a constant-velocity
+# Kalman filter of its position and velocity in the radar's x-y plane. Detections are associated
+# with the predicted tracks through a uniform grid of cells as wide as the gate (see grid.py), so a
+# track is only compared with the detections in the 3x3 cells around it instead of with all of
+# them. Prediction, association and update each run on all tracks at once with NumPy.
+
+import numpy as np
+
+from ars430_codec.geometry import LineOfSight
+from ars430_codec.grid import NeighbourPairs
+
+# Largest distance (m) between a predicted track and the detection which updates it
+TRACK_GATE = 2.0
+# A track is reported once it was updated this many times
+TRACK_CONFIRM_HITS = 3
+# A track is deleted after this many frames in a row without a detection
+TRACK_MAX_MISSES = 3
+# Standard deviations of the acceleration of a target (m/s^2), of the measured position of a
+# detection (m), and of the velocity of a new track along its line of sight (m/s)
+TRACK_ACCELERATION_NOISE = 2.0
+TRACK_POSITION_NOISE = 0.5
+TRACK_VELOCITY_NOISE = 10.0
+# The radar's TimeStamp is a 32-bit microsecond counter, and track IDs are 32-bit too
+TIMESTAMP_MODULUS = 1 << 32
+TRACK_ID_MODULUS = 1 << 32
+
+# A track as reported (and published as a PointCloud2): position and velocity in the radar frame
+# (z is always 0), the track ID and the number of detections which updated it
+TRACK_DTYPE = np.dtype({
+    'names': ['x', 'y', 'z', 'vx', 'vy', 'id', 'hits'],
+    'formats': ['<f4', '<f4', '<f4', '<f4', '<f4', '<u4', '<u2'],
+    'offsets': [0, 4, 8, 12, 16, 20, 24],
+    'itemsize': 28,
+})
+
+# Associate the (m, 2) predicted track positions with the (n, 2) detection positions which are at
+# most gate metres away (found with grid.NeighbourPairs). The nearest pairs are taken first
+# (greedily), and every track and detection is used at most once. Returns the (trackIndices,
+# detectionIndices) of the associated pairs.
+def Associate(tracks, detections, gate):
+    pairTracks, pairDetections, distances = NeighbourPairs(tracks, detections, gate)
+    if len(pairTracks) == 0:
+        return pairTracks, pairDetections
+    byDistance = np.argsort(distances, kind='mergesort')
+    pairTracks = pairTracks[byDistance]
+    pairDetections = pairDetections[byDistance]
+
+    # In every round, take the nearest pair of every detection, and of those the nearest of every
+    # track. The nearest remaining pair is always taken, so every round takes at least one pair.
+    trackUsed = np.zeros(len(tracks), dtype=bool)
+    detectionUsed = np.zeros(len(detections), dtype=bool)
+    trackIndices = []
+    detectionIndices = []
+    while len(pairTracks):
+        nearest = np.sort(np.unique(pairDetections, return_index=True)[1])
+        taken = nearest[np.unique(pairTracks[nearest], return_index=True)[1]]
+        trackIndices.append(pairTracks[taken])
+        detectionIndices.append(pairDetections[taken])
+        trackUsed[pairTracks[taken]] = True
+        detectionUsed[pairDetections[taken]] = True
+        free = ~(trackUsed[pairTracks] | detectionUsed[pairDetections])
+        pairTracks = pairTracks[free]
+        pairDetections = pairDetections[free]
+    return np.concatenate(trackIndices), np.concatenate(detectionIndices)
+
+# Tracks the targets seen by one radar. update() is called with every collected frame (NEAR and
+# FAR) of the radar, in the order they were collected.
+class MultiTargetTracker(object):
+    def __init__(self, gate = TRACK_GATE, confirmHits = TRACK_CONFIRM_HITS, maxMisses = TRACK_MAX_MISSES,
+                 accelerationNoise = TRACK_ACCELERATION_NOISE, positionNoise = TRACK_POSITION_NOISE,
+                 velocityNoise = TRACK_VELOCITY_NOISE):
+        self.gate = gate
+        self.confirmHits = confirmHits
+        self.maxMisses = maxMisses
+        self.accelerationNoise = accelerationNoise
+        self.velocityNoise = velocityNoise
+        # Measurement noise of a position
+        self.measurementNoise = np.eye(2) * positionNoise ** 2
+        # State (x, y, vx, vy) and its covariance of every track
+        self.states = np.zeros((0, 4))
+        self.covariances = np.zeros((0, 4, 4))
+        self.ids = np.zeros(0, dtype=np.uint32)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self.nextId = 0
+        # TimeStamp (us) of the last frame
+        self.lastTimeStamp = None
+
+    def __len__(self):
+        return len(self.states)
+
+    # Update the tracks with the detections of a collected EventFrame
+    def updateFrame(self, frame):
+        dt = 0.0
+        if self.lastTimeStamp is not None:
+            step = (frame.TimeStamp - self.lastTimeStamp) % TIMESTAMP_MODULUS
+            # A frame older than the last one (e.g. a late FAR frame) is not predicted back
+            if step < TIMESTAMP_MODULUS // 2:
+                dt = step * 1e-6
+                self.lastTimeStamp = frame.TimeStamp
+        else:
+            self.lastTimeStamp = frame.TimeStamp
+        detections = frame.DetectionList
+        # Same positions as geometry.DetectionsToXYZ, projected on the x-y plane
+        direction = LineOfSight(detections)[:, :2].astype(np.float64)
+        positions = direction * detections['Range'][:, None]
+        # The radial velocity is the only part of a new target's velocity which is known
+        velocities = direction * detections['RelativeRadialVelocity'][:, None]
+        self.update(positions, velocities, dt)
+
+    # Predict all tracks dt seconds ahead, associate them with the (n, 2) detection positions and
+    # update them, then delete the lost tracks and start new ones from the detections which are
+    # left, with the (n, 2) initial velocities.
+    def update(self, positions, velocities, dt):
+        self.predict(dt)
+        trackIndices, detectionIndices = Associate(self.states[:, :2], positions, self.gate)
+        self.correct(trackIndices, positions[detectionIndices])
+
+        missed = np.ones(len(self.states), dtype=bool)
+        missed[trackIndices] = False
+        self.hits[trackIndices] += 1
+        self.misses[trackIndices] = 0
+        self.misses[missed] += 1
+        kept = self.misses <= self.maxMisses
+        if not kept.all():
+            self.states, self.covariances = self.states[kept], self.covariances[kept]
+            self.ids, self.hits, self.misses = self.ids[kept], self.hits[kept], self.misses[kept]
+
+        unused = np.ones(len(positions), dtype=bool)
+        unused[detectionIndices] = False
+        self.start(positions[unused], velocities[unused])
+
+    # Move every track dt seconds ahead at constant velocity
+    def predict(self, dt):
+        if dt <= 0 or len(self.states) == 0:
+            return
+        transition = np.array([[1.0, 0.0, dt, 0.0], [0.0, 1.0, 0.0, dt], [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]])
+        # Noise of an acceleration which is constant over dt (discrete white noise model)
+        a, b, c = dt ** 4 / 4, dt ** 3 / 2, dt ** 2
+        noise = np.array([[a, 0.0, b, 0.0], [0.0, a, 0.0, b], [b, 0.0, c, 0.0], [0.0, b, 0.0, c]]) * self.accelerationNoise ** 2
+        self.states = self.states.dot(transition.T)
+        self.covariances = np.matmul(np.matmul(transition, self.covariances), transition.T) + noise
+
+    # Kalman update of the tracks trackIndices with the measured positions, all at once. The
+    # position is measured directly, so H P is the first two rows of P, P H^T its first two columns.
+    def correct(self, trackIndices, positions):
+        if len(trackIndices) == 0:
+            return
+        states = self.states[trackIndices]
+        covariances = self.covariances[trackIndices]
+        residuals = positions - states[:, :2]
+        innovation = covariances[:, :2, :2] + self.measurementNoise
+        # Inverse of every 2x2 innovation covariance
+        a, b = innovation[:, 0, 0], innovation[:, 0, 1]
+        c, d = innovation[:, 1, 0], innovation[:, 1, 1]
+        inverse = np.empty_like(innovation)
+        inverse[:, 0, 0], inverse[:, 0, 1], inverse[:, 1, 0], inverse[:, 1, 1] = d, -b, -c, a
+        inverse /= (a * d - b * c)[:, None, None]
+        gains = np.matmul(covariances[:, :, :2], inverse)
+        self.states[trackIndices] = states + np.matmul(gains, residuals[:, :, None])[:, :, 0]
+        self.covariances[trackIndices] = covariances - np.matmul(gains, covariances[:, :2, :])
+
+    # Start a track at each of the (n, 2) positions, with the (n, 2) initial velocities
+    def start(self, positions, velocities):
+        count = len(positions)
+        if count == 0:
+            return
+        states = np.hstack((positions, velocities))
+        covariances = np.zeros((count, 4, 4))
+        covariances[:, 0, 0] = covariances[:, 1, 1] = self.measurementNoise[0, 0]
+        covariances[:, 2, 2] = covariances[:, 3, 3] = self.velocityNoise ** 2
+        ids = (self.nextId + np.arange(count)) % TRACK_ID_MODULUS
+        self.nextId = (self.nextId + count) % TRACK_ID_MODULUS
+        self.states = np.vstack((self.states, states))
+        self.covariances = np.concatenate((self.covariances, covariances))
+        self.ids = np.concatenate((self.ids, ids.astype(np.uint32)))
+        self.hits = np.concatenate((self.hits, np.ones(count, dtype=np.int64)))
+        self.misses = np.concatenate((self.misses, np.zeros(count, dtype=np.int64)))
+
+    # Return the confirmed tracks as a TRACK_DTYPE array
+    def tracks(self):
+        confirmed = self.hits >= self.confirmHits
+        states = self.states[confirmed]
+        tracks = np.zeros(len(states), dtype=TRACK_DTYPE)
+        tracks['x'], tracks['y'] = states[:, 0], states[:, 1]
+        tracks['vx'], tracks['vy'] = states[:, 2], states[:, 3]
+        tracks['id'] = self.ids[confirmed]
+        tracks['hits'] = np.minimum(self.hits[confirmed], np.iinfo(np.uint16).max)
+        return tracks
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
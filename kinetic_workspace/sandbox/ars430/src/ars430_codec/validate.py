@@ -0,0 +1,116 @@
+# Checks that a datagram is an intact ARS430 status or event message before it is decoded, so a
+# corrupted or truncated datagram is dropped instead of being published as if it were valid.
+#
+# The status and event payloads start with an AUTOSAR E2E profile 6 header: CRC, Length and
+# Counter (the CRC, Len and SQC fields). The CRC is a CRC-16/CCITT-FALSE (polynomial 0x1021,
+# start value 0xFFFF) over the payload after the CRC field, up to Length bytes, followed by the
+# high and the low byte of the Data ID which the radar is configured with (if one is given).
+# binascii.crc_hqx computes this CRC with a precomputed table in C.
+
+import binascii
+import struct
+from collections import OrderedDict
+
+from ars430_codec.codec import (HEADER_LEN, HEADER_STRUCT, HEADER_TYPES, STATUS_STRUCT, EVENT_STRUCT,
+                                RADAR_DETECTION_START, RADAR_DETECTION_PACKAGE_LENGTH, Headers)
+
+# Reasons for rejecting a datagram: shorter than its header or its own contents, an unknown
+# header ID, a SOME/IP length which does not match the datagram, an E2E Length which does not fit
+# the payload, and a wrong E2E CRC
+REJECT_REASONS = ('truncated', 'header', 'length', 'e2e_length', 'crc')
+# Start value of the E2E CRC
+CRC_START = 0xFFFF
+# E2E CRC and Length at the start of the payload
+E2E_STRUCT = struct.Struct('!HH')
+# DetInPack, the last byte of EVENT_STRUCT
+DET_IN_PACK_STRUCT = struct.Struct('!B')
+DET_IN_PACK_OFFSET = HEADER_LEN + EVENT_STRUCT.size - 1
+# Length of the SOME/IP header after the length field, which the SOME/IP length counts
+SOMEIP_LENGTH_OFFSET = 8
+
+# Return a view of data[start:end] which is not a copy. On Python 2 the datagrams may be
+# old-style buffers (see codec.DatagramView), which memoryview does not accept.
+try:
+    _buffer = buffer
+    def DataSlice(data, start, end):
+        return _buffer(data, start, end - start)
+except NameError:
+    def DataSlice(data, start, end):
+        return memoryview(data)[start:end]
+
+# The E2E CRC of the E2E-protected payload at [start, end) of data, with the given Data ID
+def E2ECrc(data, start, end, dataId = None):
+    crc = binascii.crc_hqx(DataSlice(data, start + 2, end), CRC_START)
+    if dataId is not None:
+        crc = binascii.crc_hqx(struct.pack('!H', dataId), crc)
+    return crc
+
+# Check a datagram. Returns None if it is valid, otherwise the reason (see REJECT_REASONS) it is
+# not. The length checks make sure it can be decoded; if checkCrc is true, the E2E Length and CRC
+# of the payload are checked too.
+def Validate(udpData, checkCrc = True, dataId = None):
+    size = len(udpData)
+    if size < HEADER_LEN:
+        return 'truncated'
+    headerID, someipLength = HEADER_STRUCT.unpack_from(udpData, 0)
+    headerType = HEADER_TYPES.get(headerID)
+    if headerType is None:
+        return 'header'
+    if someipLength != size - SOMEIP_LENGTH_OFFSET:
+        return 'length'
+
+    # The payload must hold everything the decoder reads
+    payload = size - HEADER_LEN
+    if headerType is Headers.STATUS:
+        if payload < STATUS_STRUCT.size:
+            return 'truncated'
+    elif payload < EVENT_STRUCT.size:
+        return 'truncated'
+    elif payload < RADAR_DETECTION_START + \
+            DET_IN_PACK_STRUCT.unpack_from(udpData, DET_IN_PACK_OFFSET)[0] * RADAR_DETECTION_PACKAGE_LENGTH:
+        return 'truncated'
+
+    if checkCrc:
+        crc, e2eLength = E2E_STRUCT.unpack_from(udpData, HEADER_LEN)
+        if e2eLength > payload or e2eLength < E2E_STRUCT.size:
+            return 'e2e_length'
+        if E2ECrc(udpData, HEADER_LEN, HEADER_LEN + e2eLength, dataId) != crc:
+            return 'crc'
+    return None
+
+# Check a batch of datagrams. Returns the list of Validate results.
+def ValidateBatch(datagrams, checkCrc = True, dataId = None):
+    return [Validate(udpData, checkCrc, dataId) for udpData in datagrams]
+
+# Checks the datagrams of one radar and counts the rejected ones per reason
+class DatagramValidator(object):
+    def __init__(self, checkCrc = True, dataId = None):
+        self.checkCrc = checkCrc
+        self.dataId = dataId
+        self.accepted = 0
+        self.rejects = dict((reason, 0) for reason in REJECT_REASONS)
+        # Rejects up to the last snapshot
+        self.reported = dict(self.rejects)
+
+    # Return the reason a datagram is rejected, or None if it is valid, and count it
+    def check(self, udpData):
+        reason = Validate(udpData, self.checkCrc, self.dataId)
+        if reason is None:
+            self.accepted += 1
+        else:
+            self.rejects[reason] += 1
+        return reason
+
+    # Return true for every valid datagram of a batch
+    def checkBatch(self, datagrams):
+        return [self.check(udpData) is None for udpData in datagrams]
+
+    # Return an OrderedDict of 'rejected <reason>' -> datagrams rejected since the last snapshot
+    def snapshot(self):
+        values = OrderedDict()
+        for reason in REJECT_REASONS:
+            values['rejected ' + reason] = self.rejects[reason] - self.reported[reason]
+        self.reported = dict(self.rejects)
+        return values
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -1,8 +0,0 @@
-#!/usr/bin/env python
-
-def myfunc():
-    print("Hi from My Func")
-
-myfunc()
-
-# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# Capture the raw UDP datagrams of a device to a compact capture file (see rosudp.capture),
+# instead of recording the UDPMsgs of rosudp/31122 into a bag. Does not need ROS, but can be
+# started with rosrun:
+#   rosrun rosudp capture_udp.py radar.cap --host-ip 192.168.1.30
+
+###########
+# Imports #
+###########
+import argparse
+import os
+import sys
+import time
+
+# Run from the source tree as well as from an installed package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from rosudp.connection import init_udp_connection, ReceiveBufferPool, recv_batch, kernel_drops, RECV_TIMEOUT, RCVBUF_SIZE
+from rosudp.capture import CaptureWriter, BLOCK_SIZE, FLUSH_INTERVAL
+
+# Number of datagrams to drain from the socket per wakeup
+BATCH_SIZE = 32
+# Seconds between two progress reports
+REPORT_INTERVAL = 10.0
+
+# Append every datagram received on sock to writer until interrupted. The datagrams of a batch
+# share one receive time, unless timestamps is true: then every datagram is stored with its
+# kernel receive time.
+def capture_from(sock, writer, batchSize, timeout, timestamps = False):
+    sock.setblocking(0)
+    pool = ReceiveBufferPool(batchSize, timestamps = timestamps)
+    lastReport = time.time()
+    drops = kernel_drops(sock, pool)
+    while True:
+        count = recv_batch(sock, pool, timeout)
+        for i in range(count):
+            writer.write(pool.views[i][:pool.sizes[i]], pool.addrs[i][0], pool.addrs[i][1], pool.stamps[i])
+        writer.poll()
+        now = time.time()
+        if now - lastReport >= REPORT_INTERVAL:
+            lastReport = now
+            print('%d datagrams, %d bytes written, %d dropped by the socket' %
+                  (writer.datagrams, writer.bytesWritten, kernel_drops(sock, pool) - drops))
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Capture raw UDP datagrams to a file')
+    parser.add_argument('file', help = 'capture file; an existing capture is appended to')
+    parser.add_argument('--host-ip', default = '192.168.1.30', help = 'address of the interface the device sends to')
+    parser.add_argument('--mcast-port', type = int, default = 31122)
+    parser.add_argument('--mcast-grp', default = '225.0.0.1')
+    parser.add_argument('--no-compress', action = 'store_true', help = 'store the blocks uncompressed')
+    parser.add_argument('--block-size', type = int, default = BLOCK_SIZE, help = 'bytes of records per block')
+    parser.add_argument('--flush-interval', type = float, default = FLUSH_INTERVAL,
+                        help = 'seconds after which a partly filled block is written')
+    parser.add_argument('--batch-size', type = int, default = BATCH_SIZE)
+    parser.add_argument('--rcvbuf', type = int, default = RCVBUF_SIZE,
+                        help = 'socket receive buffer in bytes; 0 keeps the system default')
+    parser.add_argument('--kernel-timestamps', action = 'store_true',
+                        help = 'store the kernel receive time of every datagram')
+    # rosrun and roslaunch may add remapping arguments
+    args = parser.parse_args([arg for arg in sys.argv[1:] if ':=' not in arg])
+
+    sock = init_udp_connection(args.host_ip, args.mcast_port, args.mcast_grp, True, args.rcvbuf,
+                               args.kernel_timestamps)
+    writer = CaptureWriter(args.file, not args.no_compress, args.block_size, args.flush_interval)
+    try:
+        capture_from(sock, writer, args.batch_size, RECV_TIMEOUT, args.kernel_timestamps)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        sock.close()
+        print('%d datagrams, %d bytes written to %s' % (writer.datagrams, writer.bytesWritten, args.file))
+
+if __name__ == '__main__':
+    main()
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
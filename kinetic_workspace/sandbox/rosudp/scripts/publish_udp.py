@@ -11,6 +11,8 @@ from rosudp.msg import *
 import socket
 import struct
 import binascii
+# The socket helpers are shared with nodes that read the radar directly (see ars430.py)
+from rosudp.connection import init_udp_connection, ReceiveBufferPool, recv_batch, kernel_drops, BUF_SIZE, RECV_TIMEOUT
 
 # Print if desired
 DEBUG=False;
@@ -22,35 +24,33 @@ MCAST_GRP = '225.0.0.1'
 MCAST_PORT = 31122
 # Listen to all multicast groups if true, otherwise listen only to MCAST_GRP
 IS_ALL_GROUPS = False;
-BUF_SIZE = 2048
+# Number of datagrams to drain from the socket per wakeup. 1 reads one datagram per
+# blocking recvfrom call, as before.
+BATCH_SIZE = 1
+# Seconds between two checks of the datagrams the kernel dropped
+DROP_CHECK_INTERVAL = 1.0
 
-# Initialize a connection to the UDP object on the given port, which is
-# sent to the interface on this device with STATIC IP address given by hostIP.
-def init_udp_connection(hostIP, mcastPort, mcastGrp, isAllGroups = IS_ALL_GROUPS):
-    # Connect to the socket with the given data
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 32) 
-    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
-    if isAllGroups or mcastGrp == None:
-        # On this port, receive all multicast groups
-        sock.bind(('', MCAST_PORT))
-    else:
-        # On this port, listen only to mcastGrp
-        sock.bind((mcastGrp, mcastPort))
-
-    # Set the host information for the socket and listen to the right port
-    sock.setsockopt(socket.SOL_IP, socket.IP_MULTICAST_IF, socket.inet_aton(hostIP))
-    sock.setsockopt(socket.SOL_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(mcastGrp) + socket.inet_aton(hostIP))
-    return sock
-
-# Given a connected socket, read data from UDP an dpublish to the topic
+# Given a connected socket, read data from UDP an dpublish to the topic.
+# If batchSize > 1, the socket is drained batchSize datagrams at a time (see recv_batch).
+# If timestamps is true, the header of every UDPMsg is stamped with the kernel receive time of
+# its datagram (the socket must have been set up for it, see init_udp_connection).
 # TODO: pass in the port as a parameter or read it from rospy
-def publish_from(sock):
+def publish_from(sock, batchSize = BATCH_SIZE, timeout = RECV_TIMEOUT, timestamps = False):
     # TODO: Change the publisher topic to contain the IP address or port
     # TODO: Determine if a queue-size of 10 is correct, or if we need more
     pub = rospy.Publisher('rosudp/' + str(MCAST_PORT), UDPMsg, queue_size = 10)
 
+    if batchSize > 1 or timestamps:
+        publish_batches_from(sock, pub, batchSize, timeout, timestamps)
+    else:
+        publish_each_from(sock, pub)
+
+    # Close the socket connection
+    rospy.loginfo('Closing a connection to port ' + str(MCAST_PORT))
+    sock.close()
+
+# Read one datagram per blocking recvfrom call and publish it to pub
+def publish_each_from(sock, pub):
     # TODO: Determine what the rate is of the device and take that as an input
     rate = rospy.Rate(50) #Hz
 
@@ -59,8 +59,10 @@ def publish_from(sock):
             # TODO: Make bufSize an input from ROS or make it suff. big
             data, addr = sock.recvfrom(BUF_SIZE)
             # Generate the message from the buffer
-	    msg = UDPMsg()
-	    msg.timestamp = rospy.get_time()
+            msg = UDPMsg()
+            msg.timestamp = rospy.get_time()
+            # Receivers measure the latency of the topic from the header stamp
+            msg.header.stamp = rospy.Time.now()
             msg.ip = str(addr[0])
             msg.port = addr[1]
             msg.data = data
@@ -80,9 +82,44 @@ def publish_from(sock):
         # Sleep so ROS can do other things and so this runs at given rate
 #        rate.sleep()
 
-    # Close the socket connection
-    rospy.loginfo('Closing a connection to port ' + str(MCAST_PORT))
-    sock.close()
+# Drain the socket batchSize datagrams at a time into preallocated buffers and publish
+# every datagram to pub. All datagrams of a batch share one timestamp; the header stamps are
+# the kernel receive times if timestamps is true. Warns when the kernel dropped datagrams
+# because this node did not read them fast enough.
+def publish_batches_from(sock, pub, batchSize, timeout, timestamps = False):
+    sock.setblocking(0)
+    pool = ReceiveBufferPool(batchSize, timestamps = timestamps)
+    drops = kernel_drops(sock, pool)
+    lastCheck = rospy.get_time()
+
+    while not rospy.is_shutdown():
+        try:
+            count = recv_batch(sock, pool, timeout)
+            timestamp = rospy.get_time()
+            if timestamp - lastCheck >= DROP_CHECK_INTERVAL:
+                lastCheck = timestamp
+                total = kernel_drops(sock, pool)
+                if total != drops:
+                    rospy.logwarn('The socket dropped %d datagrams; raise ~rcvbuf or ~batch_size' % (total - drops))
+                    drops = total
+            for i in range(count):
+                # Generate the message from the buffer
+                msg = UDPMsg()
+                msg.timestamp = timestamp
+                # Receivers measure the latency of the topic from the header stamp
+                msg.header.stamp = rospy.Time.from_sec(pool.stamps[i])
+                msg.ip = str(pool.addrs[i][0])
+                msg.port = pool.addrs[i][1]
+                msg.data = pool.data(i)
+                if DEBUG:
+                    print(binascii.hexlify(msg.data))
+                # Publish our data
+                pub.publish(msg)
+        # Handle errors gracefully
+        except socket.error as e:
+            rospy.logerr(e)
+        except Exception, err:
+            rospy.logerr(err)
 
 # Main functionality
 if __name__ == '__main__':
@@ -103,9 +140,17 @@ if __name__ == '__main__':
 #        
 #    rospy.loginfo('Initializing UDP at %s, on port %s, MCAST_GRP of %s, and the debug param is %s' % (IP,MCAST_PORT,MCAST_GRP,str(DEBUG)))
 #
-    sock = init_udp_connection('192.168.1.30', MCAST_PORT, MCAST_GRP, True)
+    # Number of datagrams to read per wakeup, and how long to wait for them
+    batchSize = int(rospy.get_param('~batch_size', BATCH_SIZE))
+    timeout = float(rospy.get_param('~recv_timeout', RECV_TIMEOUT))
+    # Socket receive buffer in bytes (0 keeps the system default), and whether to stamp every
+    # datagram with its kernel receive time
+    rcvbuf = int(rospy.get_param('~rcvbuf', 0))
+    timestamps = rospy.get_param('~kernel_timestamps', False)
+
+    sock = init_udp_connection('192.168.1.30', MCAST_PORT, MCAST_GRP, True, rcvbuf, timestamps)
     try:
-        publish_from(sock)
+        publish_from(sock, batchSize, timeout, timestamps)
     except rospy.ROSInterruptException:
         pass
 
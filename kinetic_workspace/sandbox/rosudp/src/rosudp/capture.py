@@ -0,0 +1,278 @@
+# Compact capture files of raw UDP datagrams. This module does not depend on ROS.
+#
+# A capture file starts with a FILE_STRUCT header and is followed by blocks. Every block is a
+# BLOCK_STRUCT header and the block's records, zlib-compressed if the file is compressed. A record
+# is a RECORD_STRUCT header (receive time in nanoseconds, source IPv4 address, source port,
+# datagram length) followed by the datagram. Blocks are only appended, so a capture which was
+# cut short loses at most its last block.
+#
+# Next to the capture, <capture>.idx holds one INDEX_STRUCT entry per block (first and last
+# receive time, file offset and record count of the block), so readers can seek by time without
+# reading the capture.
+
+import bisect
+import mmap
+import os
+import socket
+import struct
+import sys
+import time
+import zlib
+
+CAPTURE_MAGIC = b'RUDPCAP1'
+INDEX_SUFFIX = '.idx'
+# Magic, flags
+FILE_STRUCT = struct.Struct('<8sL4x')
+FLAG_COMPRESSED = 1
+# Magic, stored (possibly compressed) length, raw length, record count, first and last receive time
+BLOCK_MAGIC = b'BLK1'
+BLOCK_STRUCT = struct.Struct('<4sLLLQQ')
+# Receive time (ns), source IPv4 address, source port, datagram length
+RECORD_STRUCT = struct.Struct('<Q4sHH')
+# First and last receive time (ns), file offset of the block header, record count
+INDEX_STRUCT = struct.Struct('<QQQL4x')
+
+# Raw bytes of records collected before a block is written
+BLOCK_SIZE = 1 << 20
+# Seconds after which a partly filled block is written anyway
+FLUSH_INTERVAL = 1.0
+# zlib level; 1 is fast and already removes the zero padding of most datagrams
+COMPRESS_LEVEL = 1
+
+# Path of the time index of a capture
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+# Appends datagrams to a capture file and its index. An existing capture is appended to, and
+# keeps the compression it was created with. Before appending, a block which was cut short is
+# dropped, and an index which does not list every block of the capture (because it was lost, or
+# the writer stopped between writing a block and its entry) is rebuilt from the block headers.
+class CaptureWriter:
+    def __init__(self, path, compress = True, blockSize = BLOCK_SIZE, flushInterval = FLUSH_INTERVAL,
+                 level = COMPRESS_LEVEL):
+        self.path = path
+        self.blockSize = blockSize
+        self.flushInterval = flushInterval
+        self.level = level
+        if os.path.exists(path) and os.path.getsize(path) >= FILE_STRUCT.size:
+            with open(path, 'rb') as f:
+                magic, flags = FILE_STRUCT.unpack(f.read(FILE_STRUCT.size))
+            if magic != CAPTURE_MAGIC:
+                raise ValueError('%s is not a capture file' % path)
+            self.compress = bool(flags & FLAG_COMPRESSED)
+            reader = CaptureReader(path)
+            blocks, end, indexed = reader.blocks, reader.blocks_end(), reader.indexed
+            reader.close()
+            self.file = open(path, 'r+b')
+            self.file.truncate(end)
+            self.file.seek(end)
+            if not indexed:
+                with open(index_path(path), 'wb') as index:
+                    for first, last, offset, count in blocks:
+                        index.write(INDEX_STRUCT.pack(first, last, offset, count))
+        else:
+            self.compress = compress
+            self.file = open(path, 'wb')
+            self.file.write(FILE_STRUCT.pack(CAPTURE_MAGIC, FLAG_COMPRESSED if compress else 0))
+            # An index left from an older capture of the same name does not belong to this one
+            open(index_path(path), 'wb').close()
+        self.index = open(index_path(path), 'ab')
+        self.block = bytearray()
+        self.records = 0
+        self.firstTime = 0
+        self.lastTime = 0
+        self.lastFlush = time.time()
+        # Source addresses already packed into 4 bytes
+        self.addrs = {}
+        # Datagrams and bytes written to the file so far
+        self.datagrams = 0
+        self.bytesWritten = 0
+
+    # Append a datagram received from (ip, port). stamp is the receive time in seconds;
+    # the current time is used if it is None.
+    def write(self, data, ip, port, stamp = None):
+        if stamp is None:
+            stamp = time.time()
+        ns = int(stamp * 1e9)
+        ipBytes = self.addrs.get(ip)
+        if ipBytes is None:
+            ipBytes = self.addrs[ip] = socket.inet_aton(ip)
+        if not self.records:
+            self.firstTime = ns
+        self.lastTime = ns
+        self.records += 1
+        self.block += RECORD_STRUCT.pack(ns, ipBytes, port, len(data))
+        self.block += data
+        if len(self.block) >= self.blockSize:
+            self.flush()
+
+    # Write the block if it is full or has waited for flushInterval seconds. Returns true if a
+    # block was written. Call this when no datagrams arrive, so a quiet capture is still written.
+    def poll(self):
+        if self.records and time.time() - self.lastFlush >= self.flushInterval:
+            self.flush()
+            return True
+        return False
+
+    # Write the collected records as a block, and add it to the index
+    def flush(self):
+        self.lastFlush = time.time()
+        if not self.records:
+            return
+        raw = bytes(self.block)
+        stored = zlib.compress(raw, self.level) if self.compress else raw
+        offset = self.file.tell()
+        self.file.write(BLOCK_STRUCT.pack(BLOCK_MAGIC, len(stored), len(raw), self.records,
+                                          self.firstTime, self.lastTime))
+        self.file.write(stored)
+        self.file.flush()
+        self.index.write(INDEX_STRUCT.pack(self.firstTime, self.lastTime, offset, self.records))
+        self.index.flush()
+        self.datagrams += self.records
+        self.bytesWritten += BLOCK_STRUCT.size + len(stored)
+        del self.block[:]
+        self.records = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.index.close()
+
+# Reads a capture file through a memory map. Blocks are found through the index, so reading can
+# start at any time without reading what comes before it. The index is only used if it lists
+# every block of the file; otherwise (there is none, or it is incomplete) the block headers are
+# scanned. The datagrams of uncompressed captures are not copied.
+class CaptureReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, flags = FILE_STRUCT.unpack_from(self.mm, 0)
+        if magic != CAPTURE_MAGIC:
+            raise ValueError('%s is not a capture file' % path)
+        self.compressed = bool(flags & FLAG_COMPRESSED)
+        self.view = memoryview(self.mm) if sys.version_info[0] >= 3 else None
+        # (first time, last time, offset, record count) of every complete block
+        self.blocks = self.read_index() if os.path.exists(index_path(path)) else None
+        # Whether the blocks came from the index
+        self.indexed = self.blocks is not None and self.covers(self.blocks)
+        if not self.indexed:
+            self.blocks = self.scan_blocks()
+        self.firstTimes = [block[0] for block in self.blocks]
+        # Source addresses already converted to strings
+        self.addrs = {}
+
+    def read_index(self):
+        with open(index_path(self.path), 'rb') as f:
+            data = f.read()
+        blocks = [INDEX_STRUCT.unpack_from(data, offset)
+                  for offset in range(0, len(data) - INDEX_STRUCT.size + 1, INDEX_STRUCT.size)]
+        # Ignore entries of blocks which did not make it into the capture
+        return [block for block in blocks if self.block_end(block[2]) <= len(self.mm)]
+
+    # Return true if blocks are back to back from the file header to the end of the file
+    def covers(self, blocks):
+        offset = FILE_STRUCT.size
+        for block in blocks:
+            if block[2] != offset:
+                return False
+            offset = self.block_end(offset)
+        return offset == len(self.mm)
+
+    # Offset of the end of the last complete block (or of the file header, if there is none)
+    def blocks_end(self):
+        return self.block_end(self.blocks[-1][2]) if self.blocks else FILE_STRUCT.size
+
+    # Find the blocks by reading their headers, for captures without a complete index
+    def scan_blocks(self):
+        blocks = []
+        offset = FILE_STRUCT.size
+        while offset + BLOCK_STRUCT.size <= len(self.mm):
+            magic, stored, raw, count, first, last = BLOCK_STRUCT.unpack_from(self.mm, offset)
+            if magic != BLOCK_MAGIC or self.block_end(offset) > len(self.mm):
+                break
+            blocks.append((first, last, offset, count))
+            offset = self.block_end(offset)
+        return blocks
+
+    # Offset of the end of the block at offset
+    def block_end(self, offset):
+        if offset + BLOCK_STRUCT.size > len(self.mm):
+            return offset + BLOCK_STRUCT.size
+        return offset + BLOCK_STRUCT.size + BLOCK_STRUCT.unpack_from(self.mm, offset)[1]
+
+    # Receive time (s) of the first and of the last datagram
+    def start_time(self):
+        return self.blocks[0][0] * 1e-9 if self.blocks else 0.0
+
+    def end_time(self):
+        return self.blocks[-1][1] * 1e-9 if self.blocks else 0.0
+
+    def __len__(self):
+        return sum(block[3] for block in self.blocks)
+
+    # The records of the block at offset, as a buffer and the offset of the first record in it.
+    # Uncompressed records are read in place from the memory map.
+    def block_records(self, offset):
+        magic, stored, raw, count, first, last = BLOCK_STRUCT.unpack_from(self.mm, offset)
+        start = offset + BLOCK_STRUCT.size
+        if self.compressed:
+            data = zlib.decompress(self.mm[start:start + stored])
+            return (memoryview(data) if self.view is not None else data), 0
+        return (self.view if self.view is not None else self.mm), start
+
+    # Yield (time, ip, port, data) of every datagram received between start and end (in seconds,
+    # None for no limit). data is a read-only view of the datagram, not a copy.
+    def records(self, start = None, end = None):
+        startNs = int(start * 1e9) if start is not None else 0
+        endNs = int(end * 1e9) if end is not None else None
+        # The last block which starts before startNs may still hold datagrams after it
+        first = max(0, bisect.bisect_right(self.firstTimes, startNs) - 1)
+        for blockFirst, blockLast, offset, count in self.blocks[first:]:
+            if endNs is not None and blockFirst > endNs:
+                return
+            if blockLast < startNs:
+                continue
+            data, pos = self.block_records(offset)
+            for i in range(count):
+                ns, ipBytes, port, length = RECORD_STRUCT.unpack_from(data, pos)
+                pos += RECORD_STRUCT.size
+                if ns >= startNs:
+                    if endNs is not None and ns > endNs:
+                        return
+                    ip = self.addrs.get(ipBytes)
+                    if ip is None:
+                        ip = self.addrs[ipBytes] = socket.inet_ntoa(ipBytes)
+                    if self.view is not None:
+                        yield ns * 1e-9, ip, port, data[pos:pos + length]
+                    else:
+                        yield ns * 1e-9, ip, port, buffer(data, pos, length)
+                pos += length
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        try:
+            self.mm.close()
+        except BufferError:
+            # A datagram returned by records is still alive; the mapping goes away with it
+            pass
+        self.file.close()
+
+# Yield the records from records (see CaptureReader.records) at speed times the rate at which
+# they were received. A speed of 0 yields them as fast as possible.
+def paced(records, speed = 1.0):
+    startWall = None
+    for record in records:
+        if speed > 0:
+            if startWall is None:
+                startWall = time.time()
+                startStamp = record[0]
+            delay = (record[0] - startStamp) / speed - (time.time() - startWall)
+            # Sleeping for less than a millisecond is not accurate anyway
+            if delay > 0.001:
+                time.sleep(delay)
+        yield record
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
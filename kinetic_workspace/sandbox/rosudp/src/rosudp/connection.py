@@ -0,0 +1,203 @@
+# Socket helpers for receiving UDP datagrams. This module does not depend on ROS, so it is
+# shared by the rosudp node and by nodes which read a UDP device directly.
+
+import socket
+import select
+import errno
+import fcntl
+import os
+import struct
+import time
+
+# Size of one receive buffer, in bytes
+BUF_SIZE = 2048
+# Seconds to wait for the first datagram of a batch before checking for shutdown
+RECV_TIMEOUT = 0.1
+# Socket receive buffer to ask for when a larger one is wanted, in bytes. Without CAP_NET_ADMIN
+# the kernel caps it at net.core.rmem_max, so raise that too (sysctl -w net.core.rmem_max=...).
+RCVBUF_SIZE = 8 << 20
+
+# Linux socket options which Python's socket module does not export (asm-generic values, as on
+# x86 and ARM). SO_TIMESTAMPNS attaches the kernel receive time of every datagram, SO_RXQ_OVFL
+# the number of datagrams the socket dropped because its receive buffer was full.
+SO_RCVBUFFORCE = 33
+SO_TIMESTAMPNS = 35
+SO_RXQ_OVFL = 40
+# ioctl which returns the kernel receive time of the last datagram read, for Python 2, whose
+# sockets have no recvmsg to read the ancillary data with
+SIOCGSTAMPNS = 0x8907
+TIMESPEC_STRUCT = struct.Struct('@ll')
+EMPTY_TIMESPEC = b'\0' * TIMESPEC_STRUCT.size
+OVERFLOW_STRUCT = struct.Struct('@I')
+# Room for the ancillary data of SO_TIMESTAMPNS and SO_RXQ_OVFL
+ANCILLARY_SIZE = 64
+HAS_RECVMSG = hasattr(socket.socket, 'recvmsg_into')
+
+# Initialize a connection to the UDP object on the given port, which is
+# sent to the interface on this device with STATIC IP address given by hostIP.
+# rcvbuf and timestamps are passed to configure_receive.
+def init_udp_connection(hostIP, mcastPort, mcastGrp, isAllGroups = False, rcvbuf = 0, timestamps = False):
+    # Connect to the socket with the given data
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 32)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+    if isAllGroups or mcastGrp == None:
+        # On this port, receive all multicast groups
+        sock.bind(('', mcastPort))
+    else:
+        # On this port, listen only to mcastGrp
+        sock.bind((mcastGrp, mcastPort))
+
+    # Set the host information for the socket and listen to the right port
+    sock.setsockopt(socket.SOL_IP, socket.IP_MULTICAST_IF, socket.inet_aton(hostIP))
+    sock.setsockopt(socket.SOL_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(mcastGrp) + socket.inet_aton(hostIP))
+    configure_receive(sock, rcvbuf, timestamps)
+    return sock
+
+# Ask for a receive buffer of rcvbuf bytes (0 keeps the system default), and if timestamps is
+# true, have the kernel stamp every datagram with its receive time and report the datagrams the
+# socket dropped (read by recv_batch into a pool with timestamps). Returns the receive buffer
+# size the kernel granted, which Linux reports as twice the usable size.
+def configure_receive(sock, rcvbuf = 0, timestamps = False):
+    if rcvbuf > 0:
+        try:
+            # Not capped by net.core.rmem_max, but needs CAP_NET_ADMIN
+            sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, rcvbuf)
+        except socket.error:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    if timestamps and HAS_RECVMSG:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+    elif timestamps:
+        # The first SIOCGSTAMPNS turns on timestamps. It only works while SO_TIMESTAMPNS is off,
+        # since the kernel does not keep the time of the last datagram for that ioctl otherwise.
+        datagram_stamp(sock)
+    return sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+
+# Kernel receive time (seconds) of the last datagram read from sock, with SIOCGSTAMPNS.
+# Returns None if there is none.
+def datagram_stamp(sock):
+    try:
+        sec, nsec = TIMESPEC_STRUCT.unpack(fcntl.ioctl(sock.fileno(), SIOCGSTAMPNS, EMPTY_TIMESPEC))
+    except IOError:
+        return None
+    return sec + nsec * 1e-9
+
+# Number of datagrams the kernel dropped on sock because its receive buffer was full, from
+# /proc/net/udp. Returns None if it cannot be read (not Linux, or the socket is not listed).
+def socket_drops(sock):
+    inode = str(os.fstat(sock.fileno()).st_ino)
+    try:
+        with open('/proc/net/udp') as f:
+            for line in f:
+                fields = line.split()
+                # The inode is the 10th column, the drop counter the last one
+                if len(fields) >= 13 and fields[9] == inode:
+                    return int(fields[-1])
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+# Number of datagrams sock has dropped so far: the SO_RXQ_OVFL count read into pool if the kernel
+# reported one, otherwise the count in /proc/net/udp (0 if that cannot be read either)
+def kernel_drops(sock, pool):
+    if pool.drops:
+        return pool.drops
+    return socket_drops(sock) or 0
+
+# Create a socket which sends multicast datagrams on the loopback interface from sourceIP, which
+# must be a loopback address (127.x.x.x). Nodes listening with init_udp_connection('127.0.0.1', ...)
+# receive them from sourceIP, so several devices can be simulated on one host.
+def init_loopback_sender(sourceIP, ttl = 0):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.bind((sourceIP, 0))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton('127.0.0.1'))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+    return sock
+
+# Pool of preallocated receive buffers, so draining a batch of datagrams does not
+# allocate a new string per recvfrom call. If timestamps is true, recv_batch also reads the
+# kernel receive time of every datagram, and the socket's drop counter, which the socket must
+# have been configured for (see configure_receive).
+class ReceiveBufferPool:
+    def __init__(self, count, bufSize = BUF_SIZE, timestamps = False):
+        self.buffers = [bytearray(bufSize) for i in range(count)]
+        # memoryviews are created once; slicing them does not copy the data
+        self.views = [memoryview(buf) for buf in self.buffers]
+        # Number of bytes and sender address of each datagram in the last batch
+        self.sizes = [0] * count
+        self.addrs = [None] * count
+        # Receive time (seconds) of each datagram in the last batch: the kernel's if timestamps
+        # is true, otherwise the time the batch was read
+        self.stamps = [0.0] * count
+        self.timestamps = timestamps
+        # Datagrams the socket has dropped so far, as last reported by SO_RXQ_OVFL. The kernel
+        # only reports it once the socket dropped a datagram, and Python 2 cannot read it.
+        self.drops = 0
+
+    def __len__(self):
+        return len(self.buffers)
+
+    # Return a copy of the idx-th datagram of the last batch as a string
+    def data(self, idx):
+        return self.views[idx][:self.sizes[idx]].tobytes()
+
+# Wait up to timeout seconds for the non-blocking socket sock to become readable, then read
+# datagrams into pool with recvfrom_into until the socket is empty or the pool is full.
+# Returns the number of datagrams read (0 on timeout).
+def recv_batch(sock, pool, timeout = RECV_TIMEOUT):
+    readable, _, _ = select.select([sock], [], [], timeout)
+    if not readable:
+        return 0
+    if pool.timestamps:
+        return recv_batch_stamped(sock, pool)
+    count = 0
+    while count < len(pool):
+        try:
+            pool.sizes[count], pool.addrs[count] = sock.recvfrom_into(pool.buffers[count])
+        except socket.error as e:
+            # The socket is drained
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                break
+            raise
+        count += 1
+    stamp = time.time()
+    for i in range(count):
+        pool.stamps[i] = stamp
+    return count
+
+# Read datagrams like recv_batch, with the kernel receive time of each of them. With recvmsg the
+# time and the drop counter come with the datagram; Python 2 asks for the time with an ioctl.
+def recv_batch_stamped(sock, pool):
+    count = 0
+    while count < len(pool):
+        try:
+            if HAS_RECVMSG:
+                size, ancillary, flags, addr = sock.recvmsg_into([pool.buffers[count]], ANCILLARY_SIZE)
+                pool.sizes[count], pool.addrs[count] = size, addr
+                pool.stamps[count] = 0.0
+                for level, kind, data in ancillary:
+                    if level != socket.SOL_SOCKET:
+                        continue
+                    if kind == SO_TIMESTAMPNS:
+                        sec, nsec = TIMESPEC_STRUCT.unpack_from(data)
+                        pool.stamps[count] = sec + nsec * 1e-9
+                    elif kind == SO_RXQ_OVFL:
+                        pool.drops = OVERFLOW_STRUCT.unpack_from(data)[0]
+                if not pool.stamps[count]:
+                    # The socket was not configured for timestamps
+                    pool.stamps[count] = time.time()
+            else:
+                pool.sizes[count], pool.addrs[count] = sock.recvfrom_into(pool.buffers[count])
+                pool.stamps[count] = datagram_stamp(sock) or time.time()
+        except socket.error as e:
+            # The socket is drained
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                break
+            raise
+        count += 1
+    return count
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4
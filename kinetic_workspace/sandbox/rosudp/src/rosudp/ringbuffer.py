@@ -0,0 +1,157 @@
+# Shared-memory ring buffer of UDP datagrams, for handing datagrams from a receiving process
+# to a decoding process without pickling them through a queue. This module does not depend on ROS.
+#
+# The ring lives in a file (in /dev/shm when available) which both processes map, so it also
+# works between processes which were not forked from each other. It has a single producer and a
+# single consumer: the producer only writes the head counter, the consumer only writes the tail
+# counter, and a slot is only reused after the consumer released it.
+
+import mmap
+import os
+import socket
+import struct
+import sys
+import tempfile
+import time
+
+from rosudp.connection import BUF_SIZE
+
+# Number of datagrams a ring holds by default
+RING_SLOTS = 1024
+# Seconds a consumer sleeps between checks of an empty ring
+POLL_INTERVAL = 0.0005
+
+RING_MAGIC = 0x52554450
+# Layout of the ring file. The counters are a cache line apart, so the producer and the
+# consumer do not write to the same line.
+RING_HEADER_STRUCT = struct.Struct('<LLL')
+COUNTER_STRUCT = struct.Struct('<Q')
+HEAD_OFFSET = 64
+TAIL_OFFSET = 128
+DROPS_OFFSET = 192
+META_OFFSET = 256
+# Per slot: datagram length, sender IPv4 address and receive time (seconds, 0 if unknown)
+META_STRUCT = struct.Struct('<L4sd')
+
+# Directory for ring files. /dev/shm keeps them in memory.
+def ring_dir():
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+class DatagramRing:
+    # Open the ring in the file at path. If create is true, the file is created (or truncated)
+    # with room for slots datagrams of up to slotSize bytes; otherwise its size is read from it.
+    def __init__(self, path, slots = RING_SLOTS, slotSize = BUF_SIZE, create = False):
+        self.path = path
+        self.owner = create
+        if create:
+            dataOffset = DatagramRing.data_offset(slots)
+            with open(path, 'wb') as f:
+                f.truncate(dataOffset + slots * slotSize)
+        self.file = open(path, 'r+b')
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        if create:
+            RING_HEADER_STRUCT.pack_into(self.mm, 0, RING_MAGIC, slots, slotSize)
+        magic, self.slots, self.slotSize = RING_HEADER_STRUCT.unpack_from(self.mm, 0)
+        if magic != RING_MAGIC:
+            raise ValueError('%s is not a datagram ring' % path)
+        self.dataOffset = DatagramRing.data_offset(self.slots)
+        # Producer and consumer keep their own counter locally, and only read the other one
+        # from shared memory when the ring looks full or empty
+        self.head = self.read_counter(HEAD_OFFSET)
+        self.tail = self.read_counter(TAIL_OFFSET)
+        self.view = memoryview(self.mm) if sys.version_info[0] >= 3 else None
+        # Sender addresses already converted to strings
+        self.addrs = {}
+
+    # Offset of the first data slot for a ring with the given number of slots
+    @staticmethod
+    def data_offset(slots):
+        return (META_OFFSET + slots * META_STRUCT.size + 63) // 64 * 64
+
+    def read_counter(self, offset):
+        return COUNTER_STRUCT.unpack_from(self.mm, offset)[0]
+
+    def write_counter(self, offset, value):
+        COUNTER_STRUCT.pack_into(self.mm, offset, value)
+
+    # Number of datagrams dropped by push because the ring was full
+    def drops(self):
+        return self.read_counter(DROPS_OFFSET)
+
+    # Producer: copy a datagram from sender ip, received at stamp, into the ring. data may be any
+    # buffer (bytes, bytearray, or a memoryview of a ReceiveBufferPool buffer). Returns False
+    # (and counts a drop) if the ring is full or the datagram does not fit in a slot.
+    def push(self, data, ip, countDrop = True, stamp = 0.0):
+        length = len(data)
+        if self.head - self.tail >= self.slots:
+            self.tail = self.read_counter(TAIL_OFFSET)
+        if self.head - self.tail >= self.slots or length > self.slotSize:
+            if countDrop:
+                self.write_counter(DROPS_OFFSET, self.drops() + 1)
+            return False
+        idx = self.head % self.slots
+        start = self.dataOffset + idx * self.slotSize
+        if self.view is not None:
+            self.view[start:start + length] = data
+        else:
+            # Python 2 only assigns a str to an mmap slice
+            self.mm[start:start + length] = data if isinstance(data, str) else \
+                data.tobytes() if isinstance(data, memoryview) else str(data)
+        META_STRUCT.pack_into(self.mm, META_OFFSET + idx * META_STRUCT.size, length, socket.inet_aton(ip), stamp)
+        # Publishing the new head is the last write, so the consumer never sees a partial slot
+        self.head += 1
+        self.write_counter(HEAD_OFFSET, self.head)
+        return True
+
+    # Consumer: number of datagrams waiting in the ring
+    def available(self):
+        self.head = self.read_counter(HEAD_OFFSET)
+        return self.head - self.tail
+
+    # Consumer: wait up to timeout seconds for datagrams. Returns the number waiting.
+    def wait(self, timeout):
+        count = self.available()
+        deadline = time.time() + timeout
+        while count == 0 and time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            count = self.available()
+        return count
+
+    # Consumer: return (ip, data) of the i-th waiting datagram. data is a read-only view of the
+    # slot, which is only valid until the datagram is released.
+    def get(self, i):
+        idx = (self.tail + i) % self.slots
+        length, ipBytes, stamp = META_STRUCT.unpack_from(self.mm, META_OFFSET + idx * META_STRUCT.size)
+        ip = self.addrs.get(ipBytes)
+        if ip is None:
+            ip = self.addrs[ipBytes] = socket.inet_ntoa(ipBytes)
+        start = self.dataOffset + idx * self.slotSize
+        if self.view is not None:
+            return ip, self.view[start:start + length]
+        return ip, buffer(self.mm, start, length)
+
+    # Consumer: receive time which the i-th waiting datagram was pushed with
+    def stamp(self, i):
+        idx = (self.tail + i) % self.slots
+        return META_STRUCT.unpack_from(self.mm, META_OFFSET + idx * META_STRUCT.size)[2]
+
+    # Consumer: hand the oldest count datagrams back to the producer
+    def release(self, count):
+        self.tail += count
+        self.write_counter(TAIL_OFFSET, self.tail)
+
+    # Unmap the ring. The process which created it also removes its file.
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        try:
+            self.mm.close()
+        except BufferError:
+            # A view returned by get is still alive; the mapping goes away with it
+            pass
+        self.file.close()
+        if self.owner and os.path.exists(self.path):
+            os.remove(self.path)
+
+# vim: tabstop=8 expandtab shiftwidth=4 softtabstop=4